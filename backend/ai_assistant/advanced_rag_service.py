@@ -16,6 +16,12 @@ from .models import DocumentChunk, UploadedFile, QueryHistory
 from .improved_rag_service import ImprovedRAGService
 from .hybrid_search import hybrid_search_engine, query_processor
 from .reranker import advanced_reranker, context_optimizer
+from .context_packer import context_packer
+from .cache_codec import cache_codec
+from .llm_streaming import cached_token_stream, stream_ollama_chat, stream_rag_pipeline
+from .async_rag import async_ollama_client, async_rag_pipeline
+from .single_flight import single_flight
+from .semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +56,7 @@ class AdvancedRAGService(ImprovedRAGService):
             cache_key = f"advanced_search_{query_hash}_{top_k}_{self.similarity_threshold}"
             
             # Try cache first
-            cached_results = cache.get(cache_key)
+            cached_results = cache_codec.get_results(cache_key)
             if cached_results is not None:
                 logger.info(f"Using cached advanced search results for: {query[:30]}...")
                 return cached_results
@@ -72,31 +78,22 @@ class AdvancedRAGService(ImprovedRAGService):
             )
             
             # Step 2: Vector Search (get more candidates for hybrid)
+            # Expanded and original query are embedded in one batch and searched in one
+            # round-trip, then fused - so the original query still rescues an expansion
+            # that matches nothing, without a second serial search
             vector_candidates = 30 if self.use_hybrid_search else self.top_k_candidates
-            vector_results = self.search_relevant_documents_with_scoring(
-                expanded_query, top_k=vector_candidates
+            vector_results = self.search_query_variants_with_scoring(
+                [expanded_query, query], top_k=vector_candidates
             )
             
-            # FIX: If expanded query fails, fallback to original query
             if not vector_results:
-                logger.warning(
-                    f"Expanded query '{expanded_query[:50]}...' returned no results, "
-                    f"trying original query without expansion"
-                )
-                # Fallback to original query without expansion
-                vector_results = self.search_relevant_documents_with_scoring(
-                    query, top_k=vector_candidates
-                )
-                if not vector_results:
-                    logger.error(f"Both expanded and original query returned no results for: {query[:50]}...")
+                logger.warning(f"Both expanded and original query returned no vector results for: {query[:50]}...")
+                if not self.use_hybrid_search:
                     # Don't cache empty results
                     return []
-                else:
-                    logger.info(f"Original query succeeded with {len(vector_results)} results")
-                    expansion_applied = False  # Mark as if expansion wasn't used
             
-            # Step 3: Hybrid Search (combine vector + BM25)
-            if self.use_hybrid_search and len(vector_results) > 1:
+            # Step 3: Hybrid Search (combine vector + BM25; full-text hits can rank without vector results)
+            if self.use_hybrid_search:
                 hybrid_results = hybrid_search_engine.hybrid_search(
                     query, vector_results, top_k=top_k * 2  # Get more for reranking
                 )
@@ -107,7 +104,7 @@ class AdvancedRAGService(ImprovedRAGService):
             
             # Step 4: Advanced Reranking
             if self.use_reranking and len(hybrid_results) > 1:
-                reranked_results = advanced_reranker.advanced_rerank(query, hybrid_results)
+                reranked_results = advanced_reranker.advanced_rerank(query, hybrid_results, top_k=top_k)
                 logger.info(f"Advanced reranking: {len(reranked_results)} results")
             else:
                 reranked_results = hybrid_results
@@ -123,7 +120,7 @@ class AdvancedRAGService(ImprovedRAGService):
             
             # FIX: Only cache results if we have any (don't cache empty results)
             if final_results:
-                cache.set(cache_key, final_results, self.hybrid_cache_ttl)
+                cache_codec.set_results(cache_key, final_results, self.hybrid_cache_ttl)
                 avg_final_score = sum(r.get('final_rerank_score', r.get('hybrid_score', 0)) 
                                     for r in final_results) / len(final_results)
                 logger.info(f"Advanced search complete: {len(final_results)} results, "
@@ -144,16 +141,7 @@ class AdvancedRAGService(ImprovedRAGService):
             return "I don't know."
         
         try:
-            # Determine query type
-            query_type = documents[0].get('query_type', 'general')
-            
-            # Generate optimized context
-            optimized_context = context_optimizer.optimize_context(query, documents)
-            
-            # Generate enhanced prompt
-            enhanced_prompt = context_optimizer.generate_enhanced_prompt(
-                query, optimized_context, query_type
-            )
+            enhanced_prompt, query_type = self.build_advanced_prompt(query, documents)
             
             # Generate response with enhanced parameters
             response = self.ollama_generate_advanced(enhanced_prompt, query_type)
@@ -168,6 +156,25 @@ class AdvancedRAGService(ImprovedRAGService):
             # Fallback to standard response generation
             return self.generate_enhanced_response(query, documents)
     
+    def build_advanced_prompt(self, query: str, documents: List[Dict]):
+        """Optimized-context prompt for generate_advanced_response, with its query type"""
+        # Determine query type
+        query_type = documents[0].get('query_type', 'general')
+        
+        # Generate optimized context in the window left by the prompt and the generation
+        options = self._advanced_options(query_type)
+        token_budget = context_packer.context_budget(
+            options['num_ctx'], options['num_predict'],
+            context_optimizer.generate_enhanced_prompt(query, "", query_type)
+        )
+        optimized_context = context_optimizer.optimize_context(query, documents, token_budget)
+        
+        # Generate enhanced prompt
+        enhanced_prompt = context_optimizer.generate_enhanced_prompt(
+            query, optimized_context, query_type
+        )
+        return enhanced_prompt, query_type
+    
     def clean_response_formatting(self, response: str) -> str:
         """Remove unwanted markdown formatting and symbols from response"""
         import re
@@ -206,6 +213,43 @@ class AdvancedRAGService(ImprovedRAGService):
             logger.debug(f"Using cached advanced response: {prompt_hash[:8]}...")
             return cached_response
         
+        try:
+            response = requests.post(
+                f"{self.ollama_url}/api/chat",
+                json=self._advanced_payload(prompt, query_type, model),
+                timeout=getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+            response.raise_for_status()
+            response_text = response.json()["message"]["content"]
+            
+            # Cache the response
+            cache.set(cache_key, response_text, self.response_cache_ttl)
+            logger.debug(f"Generated and cached advanced response: {prompt_hash[:8]}...")
+            
+            return response_text
+            
+        except Exception as e:
+            logger.error(f"Error in advanced generation: {e}")
+            raise
+    
+    def stream_ollama_generate_advanced(self, prompt: str, query_type: str = 'general', model: str = None):
+        """Streaming ollama_generate_advanced: yields response pieces, shares its cache"""
+        if model is None:
+            model = self.model_name
+        
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return cached_token_stream(
+            f"advanced_response_{model}_{query_type}_{prompt_hash}",
+            self.response_cache_ttl,
+            lambda: stream_ollama_chat(
+                self.ollama_url,
+                self._advanced_payload(prompt, query_type, model),
+                getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+        )
+    
+    def _advanced_options(self, query_type: str) -> Dict:
+        """Ollama options for a query type (num_predict also sizes the context budget)"""
         # Query-type specific parameters
         type_params = {
             'procedural': {
@@ -242,109 +286,38 @@ class AdvancedRAGService(ImprovedRAGService):
         
         params = type_params.get(query_type, type_params['general'])
         
-        try:
-            response = requests.post(
-                f"{self.ollama_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ],
-                    "stream": False,
-                    "options": {
-                        **params,
-                        "top_k": 40,
-                        "num_ctx": 4096
-                    }
-                },
-                timeout=getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
-            )
-            response.raise_for_status()
-            response_text = response.json()["message"]["content"]
-            
-            # Cache the response
-            cache.set(cache_key, response_text, self.response_cache_ttl)
-            logger.debug(f"Generated and cached advanced response: {prompt_hash[:8]}...")
-            
-            return response_text
-            
-        except Exception as e:
-            logger.error(f"Error in advanced generation: {e}")
-            raise
+        return {
+            **params,
+            "top_k": 40,
+            "num_ctx": 4096
+        }
+    
+    def _advanced_payload(self, prompt: str, query_type: str, model: str) -> Dict:
+        """/api/chat request body with query-type specific sampling"""
+        return {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False,
+            "options": self._advanced_options(query_type)
+        }
     
     def query_with_advanced_rag(self, query: str, top_k: int = 8, user=None) -> Dict:
-        """Complete advanced RAG pipeline"""
+        """Complete advanced RAG pipeline; concurrent identical queries share one computation"""
         try:
             # Create cache key
             query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
             cache_key = f"advanced_rag_{query_hash}_{top_k}"
             
-            # Try cache first
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Using cached advanced RAG result: {query[:30]}...")
-                return cached_result
-            
-            # Step 1: Advanced search with hybrid and reranking
-            relevant_docs = self.search_with_hybrid_and_reranking(query, top_k)
-            
-            if not relevant_docs:
-                response = "I don't know."
-                result = {
-                    "response": response,
-                    "sources": [],
-                    "query": query,
-                    "search_method": "advanced_rag",
-                    "search_stats": {
-                        "total_results": 0,
-                        "query_type": "unknown"
-                    }
-                }
-            else:
-                # Step 2: Generate advanced response
-                response = self.generate_advanced_response(query, relevant_docs)
-                
-                # Calculate search statistics
-                query_type = relevant_docs[0].get('query_type', 'general')
-                avg_final_score = sum(r.get('final_rerank_score', r.get('hybrid_score', 0)) 
-                                    for r in relevant_docs) / len(relevant_docs)
-                
-                result = {
-                    "response": response,
-                    "sources": relevant_docs,
-                    "query": query,
-                    "search_method": "advanced_rag",
-                    "search_stats": {
-                        "total_results": len(relevant_docs),
-                        "query_type": query_type,
-                        "avg_final_score": avg_final_score,
-                        "hybrid_search": self.use_hybrid_search,
-                        "reranking": self.use_reranking,
-                        "query_expansion": self.use_query_expansion
-                    }
-                }
-            
-            # FIX: Only cache result if we have sources (don't cache "I don't know" responses)
-            if relevant_docs:  # Only cache if we found sources
-                cache.set(cache_key, result, self.response_cache_ttl)
-                logger.info(f"Cached advanced RAG result: {len(relevant_docs)} sources")
-            else:
-                logger.warning("Not caching empty advanced RAG result (no sources found)")
-            
-            # Save to history with advanced metadata
-            if user:
-                QueryHistory.objects.create(
-                    query=query,
-                    response=response,
-                    sources=relevant_docs,
-                    query_type='advanced_rag',
-                    user=user
-                )
-            
-            logger.info(f"Advanced RAG complete: {len(relevant_docs)} sources, "
-                       f"query type: {result['search_stats'].get('query_type', 'unknown')}")
-            
-            return result
+            return single_flight.run(
+                cache_key,
+                self.response_cache_ttl,
+                compute=lambda: self._compute_advanced_rag(query, top_k, user),
+                # FIX: Only cache result if we have sources (don't cache "I don't know" responses)
+                cacheable=lambda result: bool(result['sources']),
+                revalidate=lambda: self._compute_advanced_rag(query, top_k),
+            )
             
         except Exception as e:
             logger.error(f"Error in advanced RAG: {e}")
@@ -356,6 +329,125 @@ class AdvancedRAGService(ImprovedRAGService):
                 "search_stats": {"error": str(e)}
             }
     
+    def _compute_advanced_rag(self, query: str, top_k: int, user=None) -> Dict:
+        """query_with_advanced_rag on a cache miss"""
+        # Step 1: Advanced search with hybrid and reranking
+        relevant_docs = self.search_with_hybrid_and_reranking(query, top_k)
+        
+        if not relevant_docs:
+            result = self._advanced_result(query, relevant_docs, "I don't know.")
+            logger.warning("Not caching empty advanced RAG result (no sources found)")
+        else:
+            # Step 2: Generate advanced response (or reuse the answer to an equivalent query)
+            result = semantic_cache.get_or_generate(
+                'advanced_rag', f"{self.model_name}:top_k={top_k}", query, relevant_docs,
+                lambda: self._advanced_result(query, relevant_docs, self.generate_advanced_response(query, relevant_docs))
+            )
+        response = result['response']
+        
+        # Save to history with advanced metadata
+        if user:
+            QueryHistory.objects.create(
+                query=query,
+                response=response,
+                sources=relevant_docs,
+                query_type='advanced_rag',
+                user=user
+            )
+        
+        logger.info(f"Advanced RAG complete: {len(relevant_docs)} sources, "
+                   f"query type: {result['search_stats'].get('query_type', 'unknown')}")
+        
+        return result
+    
+    def _advanced_result(self, query: str, relevant_docs: List[Dict], response: str) -> Dict:
+        if not relevant_docs:
+            search_stats = {
+                "total_results": 0,
+                "query_type": "unknown"
+            }
+        else:
+            # Calculate search statistics
+            query_type = relevant_docs[0].get('query_type', 'general')
+            avg_final_score = sum(r.get('final_rerank_score', r.get('hybrid_score', 0)) 
+                                for r in relevant_docs) / len(relevant_docs)
+            search_stats = {
+                "total_results": len(relevant_docs),
+                "query_type": query_type,
+                "avg_final_score": avg_final_score,
+                "hybrid_search": self.use_hybrid_search,
+                "reranking": self.use_reranking,
+                "query_expansion": self.use_query_expansion
+            }
+        return {
+            "response": response,
+            "sources": relevant_docs,
+            "query": query,
+            "search_method": "advanced_rag",
+            "search_stats": search_stats
+        }
+    
+    def _stream_advanced_answer(self, query: str, documents: List[Dict]):
+        enhanced_prompt, query_type = self.build_advanced_prompt(query, documents)
+        return self.stream_ollama_generate_advanced(enhanced_prompt, query_type)
+    
+    def stream_query_with_advanced_rag(self, query: str, top_k: int = 8, user=None):
+        """query_with_advanced_rag as (event, data) pairs: sources, then tokens, then the result"""
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return stream_rag_pipeline(
+            query,
+            user,
+            cache_key=f"advanced_rag_{query_hash}_{top_k}",
+            cache_ttl=self.response_cache_ttl,
+            history_type='advanced_rag',
+            search=lambda: self.search_with_hybrid_and_reranking(query, top_k),
+            stream_answer=lambda docs: self._stream_advanced_answer(query, docs),
+            build_result=lambda docs, response: self._advanced_result(query, docs, response),
+            finalize=self.clean_response_formatting,
+            cache_empty=False,  # Same as query_with_advanced_rag: don't cache "I don't know"
+        )
+    
+    async def agenerate_advanced(self, prompt: str, query_type: str = 'general') -> str:
+        """ollama_generate_advanced on the event loop, sharing its cache"""
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return await async_ollama_client.cached_chat(
+            f"advanced_response_{self.model_name}_{query_type}_{prompt_hash}",
+            self.response_cache_ttl,
+            self._advanced_payload(prompt, query_type, self.model_name),
+            getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+        )
+    
+    async def aquery_with_advanced_rag(self, query: str, top_k: int = 8, user=None) -> Dict:
+        """query_with_advanced_rag on the async request path (non-blocking generation)"""
+        async def generate(prepared):
+            enhanced_prompt, query_type = prepared
+            response = await self.agenerate_advanced(enhanced_prompt, query_type)
+            return self.clean_response_formatting(response)
+        
+        try:
+            query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+            return await async_rag_pipeline(
+                query,
+                user,
+                cache_key=f"advanced_rag_{query_hash}_{top_k}",
+                cache_ttl=self.response_cache_ttl,
+                history_type='advanced_rag',
+                search=lambda: self.search_with_hybrid_and_reranking(query, top_k),
+                prepare=lambda docs: self.build_advanced_prompt(query, docs),
+                generate=generate,
+                build_result=lambda docs, response: self._advanced_result(query, docs, response),
+                cache_empty=False,
+            )
+        except Exception as e:
+            logger.error(f"Error in async advanced RAG: {e}")
+            return {
+                "response": f"Error processing query: {str(e)}",
+                "sources": [],
+                "query": query,
+                "search_method": "error",
+                "search_stats": {"error": str(e)}
+            }
+    
     def get_search_analytics(self) -> Dict:
         """Get analytics about search performance"""
         try:
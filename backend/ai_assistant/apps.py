@@ -7,4 +7,23 @@ class AiAssistantConfig(AppConfig):
     
     def ready(self):
         """Import signals when app is ready"""
-        import ai_assistant.signals  # noqa
\ No newline at end of file
+        import ai_assistant.signals  # noqa
+        
+        from django.conf import settings
+        
+        # Shared-vector dedup hand-off; a delete receiver disables cheap chunk deletes, so only when needed
+        if getattr(settings, 'CHUNK_DEDUP_SHARED_VECTORS', False):
+            from django.db.models.signals import pre_delete
+            from .models import DocumentChunk
+            from .signals import keep_shared_vector
+            pre_delete.connect(keep_shared_vector, sender=DocumentChunk, dispatch_uid='keep_shared_vector')
+        
+        # Load the cross-encoder once per worker, off the startup path
+        if getattr(settings, 'CROSS_ENCODER_PRELOAD', False):
+            import threading
+            from .reranker import advanced_reranker
+            threading.Thread(
+                target=advanced_reranker.cross_encoder.warm_up,
+                name='cross-encoder-warm-up',
+                daemon=True,
+            ).start()
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""
+Async RAG Request Path
+
+The RAG views are sync DRF functions: each in-flight generation holds a
+worker thread on requests.post for up to OLLAMA_REQUEST_TIMEOUT seconds, so
+a process serves at most as many generations as it has threads. The async
+variants (views/async_rag_views.py) wait on Ollama without a thread:
+- AsyncOllamaClient keeps a pooled httpx.AsyncClient per event loop
+  (keep-alive connections to Ollama, OLLAMA_ASYNC_MAX_CONNECTIONS in flight)
+- async_rag_pipeline() runs a RAG tier: retrieval and prompt building (ORM,
+  pgvector SQL, embeddings) in one hop to a retrieval thread, generation on
+  the event loop, cache and QueryHistory through Django's async cache/ORM API
+- run_in_retrieval_thread() is that hop. sync_to_async's default
+  (thread_sensitive=True) runs every call on the one shared sync thread, so
+  concurrent requests would retrieve one at a time; retrieval instead runs
+  on a pool of ASYNC_RETRIEVAL_THREADS threads, which also bounds the
+  database connections it holds (one per thread, released after each call
+  as Django does at the end of a request)
+
+Served by an ASGI server (anylab/asgi.py, e.g. uvicorn) the process holds
+one event loop and one connection pool. Under WSGI (runserver, gunicorn
+sync workers) async views still work, but every request runs in its own
+loop with its own client, so there is no pooling and no thread saving.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from .models import QueryHistory
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+_retrieval_executor = None
+_retrieval_executor_lock = threading.Lock()
+
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    global _retrieval_executor
+
+    with _retrieval_executor_lock:
+        if _retrieval_executor is None:
+            _retrieval_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_RETRIEVAL_THREADS', 8),
+                thread_name_prefix='async-retrieval',
+            )
+        return _retrieval_executor
+
+
+def _call_with_db(func, *args, **kwargs):
+    """func in a retrieval thread, with request-style database connection handling"""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_retrieval_thread(func, *args, **kwargs):
+    """Await a sync (ORM, pgvector, embedding) call on the bounded retrieval pool"""
+    return await sync_to_async(_call_with_db, thread_sensitive=False, executor=get_retrieval_executor())(
+        func, *args, **kwargs
+    )
+
+
+class AsyncOllamaClient:
+    """Non-blocking /api/chat client with a connection pool per event loop"""
+
+    def __init__(self, ollama_url: str = None):
+        self.ollama_url = ollama_url or getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
+        self.timeout = getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+        self.max_connections = getattr(settings, 'OLLAMA_ASYNC_MAX_CONNECTIONS', 256)
+        self.max_keepalive_connections = getattr(settings, 'OLLAMA_ASYNC_MAX_KEEPALIVE', 32)
+        # An AsyncClient is bound to the loop it was first used on
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.ollama_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def chat(self, payload: Dict, timeout: Optional[float] = None) -> str:
+        """Content of a non-streamed /api/chat response"""
+        response = await self.get_client().post(
+            '/api/chat',
+            json=dict(payload, stream=False),
+            timeout=timeout or self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    async def cached_chat(self, cache_key: str, cache_ttl: int, payload: Dict,
+                          timeout: Optional[float] = None) -> str:
+        """chat() behind the same response cache the sync generators use"""
+        cached_response = await cache.aget(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        response_text = await self.chat(payload, timeout)
+        await cache.aset(cache_key, response_text, cache_ttl)
+        return response_text
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+async def async_rag_pipeline(
+    query: str,
+    user,
+    cache_key: str,
+    cache_ttl: int,
+    history_type: str,
+    search: Callable[[], List[Dict]],
+    prepare: Callable[[List[Dict]], Any],
+    generate: Callable[[Any], Awaitable[str]],
+    build_result: Callable[[List[Dict], str], Dict],
+    empty_response: str = "I don't know.",
+    cache_empty: bool = True,
+) -> Dict:
+    """
+    Async counterpart of a query_with_*_rag pipeline. search() and
+    prepare(docs) (prompt building) run in a worker thread; generate(prepared)
+    awaits the model. Returns the same result dict as the sync pipeline.
+    """
+    cached_result = await cache.aget(cache_key)
+    if cached_result is not None:
+        logger.info(f"Using cached {history_type} result for query: {query[:30]}...")
+        return cached_result
+
+    def retrieve():
+        relevant_docs = search()
+        return relevant_docs, (prepare(relevant_docs) if relevant_docs else None)
+
+    relevant_docs, prepared = await run_in_retrieval_thread(retrieve)
+    if relevant_docs:
+        response = await generate(prepared)
+    else:
+        response = empty_response
+
+    result = build_result(relevant_docs, response)
+    if relevant_docs or cache_empty:
+        await single_flight.astore(cache_key, result, cache_ttl)
+
+    if user:
+        await QueryHistory.objects.acreate(
+            query=query,
+            response=response,
+            sources=relevant_docs,
+            query_type=history_type,
+            user=user
+        )
+
+    return result
+
+
+# Global instance
+async_ollama_client = AsyncOllamaClient()
@@ -6,7 +6,8 @@ BALANCED QUALITY AND PERFORMANCE RULES:
 2. 600 char chunks - balanced for semantic understanding and performance
 3. 120 char overlap (20%) - maintains context between chunks
 4. 2000 chunk limit - prevents server crashes on large documents
-5. Batch embedding - 50 chunks per API call for efficiency
+5. Batch embedding - adaptive batches (50 chunks to start) pipelined with DB writes
+6. Streaming - pages are extracted, chunked, embedded and written as they go
 
 This ensures ALL imported files automatically become:
 - Metadata ready
@@ -25,13 +26,45 @@ from django.utils import timezone
 from .models import UploadedFile, DocumentChunk, DocumentFile
 from .rag_service import EnhancedRAGService
 from .enhanced_chunking import semantic_chunker, advanced_chunker
-import requests
+from .chunk_writer import ChunkBulkWriter, chunk_content_hash
+from .ingest_pipeline import ChunkStream, ChunkWriterStage
+from .pdf_extraction import iter_page_texts
+from .chunk_dedup import chunk_deduplicator
+from .bm25_index import compute_token_stats
+from .embedding_client import embedding_client, EmbeddingError
 import zipfile
 import tempfile
 import shutil
+import time
 
 logger = logging.getLogger(__name__)
 
+class AdaptiveBatchSizer:
+    """
+    Picks the number of chunks per embedding request.
+    
+    Grows the batch while requests finish well under target_seconds, shrinks
+    it when they run over (or fail), and never lets one request carry more
+    than max_chars of text.
+    """
+    
+    def __init__(self, initial: int, minimum: int, maximum: int, target_seconds: float, max_chars: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(initial, maximum))
+        self.target_seconds = target_seconds
+        self.max_chars = max_chars
+    
+    def record(self, batch_size: int, elapsed: float):
+        """Adjust size from the latency of a completed batch"""
+        if elapsed > self.target_seconds:
+            self.shrink()
+        elif elapsed < self.target_seconds / 2 and batch_size >= self.size:
+            self.size = min(self.maximum, int(self.size * 1.5) + 1)
+    
+    def shrink(self):
+        self.size = max(self.minimum, self.size // 2)
+
 class AutomaticFileProcessor:
     """
     Automatically processes ALL uploaded files to ensure they are:
@@ -53,14 +86,25 @@ class AutomaticFileProcessor:
         self.MAX_CHUNKS_PER_DOC = 2000  # Hard limit prevents crashes
         self.EMBEDDING_MODEL = 'bge-m3'  # ONLY model - NO FALLBACKS
         self.EMBEDDING_DIMS = 1024     # BGE-M3 dimensions
-        self.BATCH_SIZE = 50            # Process 50 chunks per Ollama API call
+        self.BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_SIZE', 50)  # Initial chunks per embedding call
+        self.MIN_BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_MIN_SIZE', 8)
+        self.MAX_BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_MAX_SIZE', 256)
+        self.BATCH_TARGET_SECONDS = getattr(settings, 'EMBEDDING_BATCH_TARGET_SECONDS', 4.0)
+        self.BATCH_MAX_CHARS = getattr(settings, 'EMBEDDING_BATCH_MAX_CHARS', 150000)  # Request payload cap
+        # Streaming pipeline: chunks buffered ahead of embedding, embedded batches waiting to be written
+        self.PIPELINE_BUFFER_CHUNKS = getattr(settings, 'INGEST_PIPELINE_BUFFER_CHUNKS', 256)
+        self.PIPELINE_PENDING_BATCHES = getattr(settings, 'INGEST_PIPELINE_PENDING_BATCHES', 2)
         
     def process_file_fully(self, uploaded_file_id: int, max_retries: int = 3):
         """
         Complete automatic processing workflow with retry logic:
-        Upload → Extract Metadata → Generate Chunks (max 2000) → Batch Embeddings (50 per call) → Ready
+        Upload → Extract Metadata → Stream Chunks (max 2000) → Batch Embeddings (adaptive) → Ready
         
         RETRY MECHANISM: Up to 3 attempts for quality assurance
+        Retries are resumable: metadata extracted by an earlier attempt is kept,
+        and embedding restarts at the first chunk not yet committed (see
+        _resume_position), so already embedded chunks are neither re-embedded
+        nor duplicated
         """
         uploaded_file = UploadedFile.objects.get(id=uploaded_file_id)
         
@@ -85,41 +129,45 @@ class AutomaticFileProcessor:
                 uploaded_file.processing_started_at = timezone.now()
                 uploaded_file.save()
                 
-                # Step 2: Extract ALL metadata
-                metadata = self._extract_all_metadata(uploaded_file)
-                
-                # VALIDATION: Check metadata completeness
-                if not self._validate_metadata_completeness(metadata, uploaded_file):
-                    raise Exception("Metadata extraction incomplete")
+                # Step 2: Extract ALL metadata (kept from an earlier attempt if already done)
+                if uploaded_file.metadata_extracted:
+                    logger.info(f"Metadata already extracted for {uploaded_file.filename}, skipping")
+                else:
+                    metadata = self._extract_all_metadata(uploaded_file)
+                    
+                    # VALIDATION: Check metadata completeness
+                    if not self._validate_metadata_completeness(metadata, uploaded_file):
+                        raise Exception("Metadata extraction incomplete")
                 
                 uploaded_file.metadata_extracted = True
                 uploaded_file.processing_status = 'chunking'
                 uploaded_file.save()
                 
-                # Step 3: Generate chunks (UNLIMITED for quality)
-                chunks_data = self._generate_chunks(uploaded_file)
+                # Step 3+4: Stream chunks (UNLIMITED for quality) straight into
+                # embedding (BGE-M3 ONLY, NO FALLBACKS) and storage, page by page
+                file_path = self._get_file_path(uploaded_file)
+                uploaded_file.processing_status = 'embedding'
+                uploaded_file.save()
+                
+                chunk_count, embedding_count = self._generate_embeddings(
+                    uploaded_file, self._iter_chunks(uploaded_file, file_path)
+                )
                 
                 # VALIDATION: Check chunks were created
-                if not chunks_data or len(chunks_data) == 0:
+                if chunk_count == 0:
                     raise Exception("No chunks generated from file")
                 
                 uploaded_file.chunks_created = True
-                uploaded_file.chunk_count = len(chunks_data)
-                uploaded_file.processing_status = 'embedding'
-                uploaded_file.save()
-                
-                logger.info(f"Created {len(chunks_data)} chunks for {uploaded_file.filename}")
-                
-                # Step 4: Generate embeddings (BGE-M3 ONLY, NO FALLBACKS)
-                embedding_count = self._generate_embeddings(uploaded_file, chunks_data)
+                uploaded_file.chunk_count = chunk_count
+                self._record_coverage(uploaded_file, chunk_count)
                 
                 # VALIDATION: Check embeddings were created and match chunk count
                 if embedding_count == 0:
                     raise Exception("No embeddings generated")
                 
-                if embedding_count != len(chunks_data):
+                if embedding_count != chunk_count:
                     logger.warning(
-                        f"Embedding count ({embedding_count}) doesn't match chunk count ({len(chunks_data)}) "
+                        f"Embedding count ({embedding_count}) doesn't match chunk count ({chunk_count}) "
                         f"for {uploaded_file.filename}"
                     )
                 
@@ -148,7 +196,7 @@ class AutomaticFileProcessor:
                 
                 return {
                     'success': True,
-                    'chunk_count': len(chunks_data),
+                    'chunk_count': chunk_count,
                     'embedding_count': embedding_count,
                     'status': 'ready',
                     'attempts': attempt
@@ -382,56 +430,56 @@ class AutomaticFileProcessor:
             return {}
     
     def _generate_chunks(self, uploaded_file: UploadedFile) -> list:
-        """Generate chunks with UNLIMITED approach for maximum quality"""
+        """Generate all chunks of a file as a list (see _iter_chunks)"""
         try:
             file_path = self._get_file_path(uploaded_file)
             
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}")
             
-            file_ext = Path(uploaded_file.filename).suffix.lower()
-            chunks_data = []
+            chunks_data = list(self._iter_chunks(uploaded_file, file_path))
+            self._record_coverage(uploaded_file, len(chunks_data))
+            return chunks_data
             
+        except Exception as e:
+            logger.error(f"Chunking error: {e}")
+            raise
+    
+    def _iter_chunks(self, uploaded_file: UploadedFile, file_path: str):
+        """
+        Yield chunks with UNLIMITED approach for maximum quality
+        
+        PDFs are extracted and chunked one page at a time, so chunks can be
+        embedded while later pages are still being read. Empty chunks are
+        skipped; chunk_index counts the chunks yielded. Runs in the
+        ChunkStream producer thread, so it must not touch the database.
+        """
+        file_ext = Path(uploaded_file.filename).suffix.lower()
+        chunk_index = 0
+        
+        def make_chunk(content, page_number):
+            return {
+                'content': content,
+                'page_number': page_number,
+                'chunk_index': chunk_index,
+                # Computed once here and stored with each chunk
+                'content_hash': chunk_content_hash(content),
+                'token_stats': compute_token_stats(content),
+            }
+        
+        def sections():
+            """(text, page_number, chunk_with_sentences) per page/section of the file"""
             # PDF processing with unlimited chunks
+            # (large PDFs are extracted by parallel page-range workers, in page order)
             if file_ext == '.pdf':
-                doc = fitz.open(file_path)
-                
-                for page_num in range(len(doc)):
-                    try:
-                        page = doc[page_num]
-                        text = page.get_text()
-                        
-                        if text.strip():
-                            # Use advanced chunker with NO limits
-                            page_chunks = semantic_chunker.chunk_by_sentences(text, page_number=page_num + 1)
-                            
-                            for chunk in page_chunks:
-                                chunks_data.append({
-                                    'content': chunk.content,
-                                    'page_number': chunk.page_number,
-                                    'chunk_index': len(chunks_data)
-                                })
-                    except Exception as e:
-                        logger.warning(f"Error processing PDF page {page_num + 1}: {e}")
-                        continue
-                
-                doc.close()
+                for page_number, text in iter_page_texts(file_path):
+                    yield text, page_number, True
             
             # Text file processing
             elif file_ext in ['.txt', '.rtf', '.html', '.mhtml', '.md']:
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
-                
-                if content.strip():
-                    # Use advanced chunker with NO limits
-                    content_chunks = semantic_chunker.chunk_by_sentences(content, page_number=1)
-                    
-                    for chunk in content_chunks:
-                        chunks_data.append({
-                            'content': chunk.content,
-                            'page_number': chunk.page_number,
-                            'chunk_index': len(chunks_data)
-                        })
+                yield content, 1, True
             
             # Word Document processing (.docx)
             elif file_ext in ['.docx', '.doc']:
@@ -440,39 +488,22 @@ class AutomaticFileProcessor:
                     doc = Document(file_path)
                     
                     for para_idx, paragraph in enumerate(doc.paragraphs):
-                        if paragraph.text.strip():
-                            # Use advanced chunker with NO limits
-                            para_chunks = semantic_chunker.chunk_by_sentences(
-                                paragraph.text, 
-                                page_number=para_idx + 1
-                            )
-                            
-                            for chunk in para_chunks:
-                                chunks_data.append({
-                                    'content': chunk.content,
-                                    'page_number': chunk.page_number,
-                                    'chunk_index': len(chunks_data)
-                                })
+                        yield paragraph.text, para_idx + 1, True
                 except ImportError:
                     logger.warning("python-docx not available")
                 except Exception as e:
                     logger.warning(f"Error processing Word document: {e}")
             
-            # Excel Spreadsheet processing (.xlsx, .xls)
+            # Excel Spreadsheet processing (.xlsx, .xls) - one chunk per row
             elif file_ext in ['.xlsx', '.xls']:
                 try:
                     import openpyxl
                     workbook = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
                     
                     for sheet_idx, sheet in enumerate(workbook.worksheets):
-                        for row_idx, row in enumerate(sheet.iter_rows(values_only=True)):
+                        for row in sheet.iter_rows(values_only=True):
                             row_text = ' '.join(str(cell) if cell else '' for cell in row if cell)
-                            if row_text.strip():
-                                chunks_data.append({
-                                    'content': row_text,
-                                    'page_number': sheet_idx + 1,
-                                    'chunk_index': len(chunks_data)
-                                })
+                            yield row_text, sheet_idx + 1, False
                 except ImportError:
                     logger.warning("openpyxl not available")
                 except Exception as e:
@@ -485,157 +516,234 @@ class AutomaticFileProcessor:
                     prs = Presentation(file_path)
                     
                     for slide_idx, slide in enumerate(prs.slides):
-                        slide_text = []
-                        for shape in slide.shapes:
-                            if hasattr(shape, "text"):
-                                slide_text.append(shape.text)
-                        
-                        slide_content = '\n'.join(slide_text)
-                        if slide_content.strip():
-                            # Use advanced chunker with NO limits
-                            slide_chunks = semantic_chunker.chunk_by_sentences(
-                                slide_content,
-                                page_number=slide_idx + 1
-                            )
-                            
-                            for chunk in slide_chunks:
-                                chunks_data.append({
-                                    'content': chunk.content,
-                                    'page_number': chunk.page_number,
-                                    'chunk_index': len(chunks_data)
-                                })
+                        slide_text = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+                        yield '\n'.join(slide_text), slide_idx + 1, True
                 except ImportError:
                     logger.warning("python-pptx not available")
                 except Exception as e:
                     logger.warning(f"Error processing PowerPoint document: {e}")
+        
+        for text, page_number, use_chunker in sections():
+            if not text.strip():
+                continue
             
-            chunks_count = len(chunks_data)
-            logger.info(f"Generated {chunks_count} chunks from {uploaded_file.filename}")
-            
-            # Track truncation status
-            if chunks_count >= self.MAX_CHUNKS_PER_DOC:
-                uploaded_file.is_truncated = True
-                # Calculate coverage based on chunk count vs. limit
-                uploaded_file.processing_coverage = min(100.0, (self.MAX_CHUNKS_PER_DOC / chunks_count) * 100)
-                logger.warning(
-                    f"Document '{uploaded_file.filename}' hit the {self.MAX_CHUNKS_PER_DOC} chunk limit. "
-                    f"Document was truncated (coverage: {uploaded_file.processing_coverage:.1f}%) - only first {self.MAX_CHUNKS_PER_DOC} chunks will be processed. "
-                    f"Consider splitting the document into smaller files."
-                )
-                uploaded_file.save()
-            else:
-                uploaded_file.is_truncated = False
-                uploaded_file.processing_coverage = 100.0
-                uploaded_file.save()
+            if not use_chunker:
+                yield make_chunk(text, page_number)
+                chunk_index += 1
+                continue
             
-            return chunks_data
+            try:
+                # Use advanced chunker with NO limits
+                page_chunks = semantic_chunker.chunk_by_sentences(text, page_number=page_number)
+            except Exception as e:
+                logger.warning(f"Error chunking page {page_number} of {uploaded_file.filename}: {e}")
+                continue
             
-        except Exception as e:
-            logger.error(f"Chunking error: {e}")
-            raise
+            for chunk in page_chunks:
+                if chunk.content.strip():
+                    yield make_chunk(chunk.content, chunk.page_number)
+                    chunk_index += 1
     
-    def _generate_embeddings(self, uploaded_file: UploadedFile, chunks_data: list) -> int:
+    def _record_coverage(self, uploaded_file: UploadedFile, chunks_count: int):
+        """Track truncation status for the final chunk count"""
+        logger.info(f"Generated {chunks_count} chunks from {uploaded_file.filename}")
+        
+        if chunks_count >= self.MAX_CHUNKS_PER_DOC:
+            uploaded_file.is_truncated = True
+            # Calculate coverage based on chunk count vs. limit
+            uploaded_file.processing_coverage = min(100.0, (self.MAX_CHUNKS_PER_DOC / chunks_count) * 100)
+            logger.warning(
+                f"Document '{uploaded_file.filename}' hit the {self.MAX_CHUNKS_PER_DOC} chunk limit. "
+                f"Document was truncated (coverage: {uploaded_file.processing_coverage:.1f}%) - only first {self.MAX_CHUNKS_PER_DOC} chunks will be processed. "
+                f"Consider splitting the document into smaller files."
+            )
+        else:
+            uploaded_file.is_truncated = False
+            uploaded_file.processing_coverage = 100.0
+        uploaded_file.save()
+    
+    def _generate_embeddings(self, uploaded_file: UploadedFile, chunks) -> tuple:
         """
-        Generate embeddings using BGE-M3 ONLY with batch processing
-        Processes 50 chunks at a time for efficiency
+        Generate embeddings using BGE-M3 ONLY, streaming chunks into storage
+        
+        chunks may be a list or a generator (_iter_chunks). It is consumed
+        through a bounded ChunkStream and embedded in micro-batches whose size
+        adapts to observed latency and payload size; embedded batches go to a
+        ChunkWriterStage, so extraction, embedding and writing overlap and
+        chunks become searchable batch by batch. Bounded queues between the
+        stages keep memory flat for very large documents.
+        
+        Embeddings are stored L2-normalised so one cosine index serves every search mode
+        
+        Idempotent: chunks committed by an earlier attempt are reused and the
+        checkpoint (uploaded_file.last_committed_chunk_index) advances in the
+        same transaction as each batch
+        
+        Returns (chunk_count, embedding_count)
         """
-        embedding_count = 0
+        def save_checkpoint(created):
+            uploaded_file.last_committed_chunk_index = created[-1].chunk_index
+            UploadedFile.objects.filter(id=uploaded_file.id).update(
+                last_committed_chunk_index=uploaded_file.last_committed_chunk_index
+            )
+        
+        stream = ChunkStream(
+            (chunk for chunk in chunks if chunk['content'].strip()),
+            max_buffered=self.PIPELINE_BUFFER_CHUNKS
+        )
+        writer_stage = ChunkWriterStage(
+            ChunkBulkWriter(batch_size=self.MAX_BATCH_SIZE, on_commit=save_checkpoint),
+            max_pending_batches=self.PIPELINE_PENDING_BATCHES
+        )
         
         try:
-            # Filter out empty chunks
-            valid_chunks = [chunk for chunk in chunks_data if chunk['content'].strip()]
-            
-            # Process in batches of 50
-            batch_size = self.BATCH_SIZE
-            total_batches = (len(valid_chunks) + batch_size - 1) // batch_size
-            
-            logger.info(f"Processing {len(valid_chunks)} chunks in {total_batches} batches for {uploaded_file.filename}")
-            
-            for batch_idx in range(0, len(valid_chunks), batch_size):
-                batch = valid_chunks[batch_idx:batch_idx + batch_size]
-                current_batch = batch_idx // batch_size + 1
-                
-                logger.info(f"Processing batch {current_batch}/{total_batches} ({len(batch)} chunks)")
-                
-                # Extract batch content for API call
-                batch_texts = [chunk['content'] for chunk in batch]
-                
-                # Get batch embeddings from Ollama
-                batch_embeddings = self._get_bge_m3_embeddings_batch(batch_texts)
-                
-                # Store each embedding in database
-                for chunk_data, embedding in zip(batch, batch_embeddings):
-                    DocumentChunk.objects.create(
-                        uploaded_file=uploaded_file,
-                        content=chunk_data['content'],
-                        embedding=embedding,
-                        page_number=chunk_data.get('page_number', 1),
-                        chunk_index=embedding_count
+            # Resume after the chunks an earlier attempt already committed
+            embedding_count = self._resume_position(uploaded_file, stream)
+            
+            sizer = AdaptiveBatchSizer(
+                initial=self.BATCH_SIZE,
+                minimum=self.MIN_BATCH_SIZE,
+                maximum=self.MAX_BATCH_SIZE,
+                target_seconds=self.BATCH_TARGET_SECONDS,
+                max_chars=self.BATCH_MAX_CHARS,
+            )
+            
+            logger.info(f"Streaming chunks of {uploaded_file.filename} into adaptive embedding batches")
+            
+            batch_number = 0
+            while True:
+                batch = stream.take(sizer.size, sizer.max_chars)
+                if not batch:
+                    break
+                
+                started = time.monotonic()
+                try:
+                    # Text embedded before (any document) reuses its stored vector
+                    batch_embeddings, canonical_ids = chunk_deduplicator.embed(
+                        [chunk['content'] for chunk in batch],
+                        self._get_bge_m3_embeddings_batch,
+                        hashes=[chunk.get('content_hash') or chunk_content_hash(chunk['content']) for chunk in batch],
+                        batch_size=len(batch)
                     )
+                except Exception as e:
+                    # Large batches that time out are retried smaller
+                    if len(batch) <= sizer.minimum:
+                        raise
+                    sizer.shrink()
+                    logger.warning(f"Batch of {len(batch)} chunks failed ({e}), retrying with {sizer.size}")
+                    stream.push_back(batch)
+                    continue
+                elapsed = time.monotonic() - started
+                
+                sizer.record(len(batch), elapsed)
+                batch_number += 1
+                
+                # Stored in one transaction by the writer thread (embeddings L2-normalised by the writer)
+                rows = []
+                for chunk_data, embedding, canonical_id in zip(batch, batch_embeddings, canonical_ids):
+                    rows.append({
+                        'uploaded_file': uploaded_file,
+                        'content': chunk_data['content'],
+                        'embedding': embedding,
+                        'page_number': chunk_data.get('page_number', 1),
+                        'chunk_index': embedding_count,
+                        'content_hash': chunk_data.get('content_hash'),
+                        'canonical_chunk_id': canonical_id,
+                        'token_stats': chunk_data.get('token_stats'),
+                    })
                     embedding_count += 1
-                    
-                    # Log progress every 100 chunks
-                    if embedding_count % 100 == 0:
-                        logger.info(f"Generated {embedding_count}/{len(valid_chunks)} embeddings for {uploaded_file.filename}")
+                writer_stage.put(rows)
+                
+                logger.info(
+                    f"Embedded batch {batch_number} ({len(batch)} chunks in {elapsed:.2f}s), "
+                    f"{embedding_count} embeddings so far for {uploaded_file.filename}, next batch size {sizer.size}"
+                )
+            
+            writer_stage.stop()
+            writer_stage.raise_if_failed()
             
             logger.info(f"Total embeddings created: {embedding_count}")
-            return embedding_count
+            return stream.produced, embedding_count
             
         except Exception as e:
             logger.error(f"Embedding generation error: {e}")
             raise
+        finally:
+            stream.close()
+            writer_stage.stop()
+    
+    def _resume_position(self, uploaded_file: UploadedFile, stream: ChunkStream) -> int:
+        """
+        Number of leading chunks already committed for this file by an earlier attempt.
+        
+        Consumes the stream while each chunk's chunk_index and content hash
+        match a stored chunk; everything from the first mismatch onwards
+        (partial or stale rows) is deleted so it is re-embedded exactly once.
+        """
+        stored = list(
+            DocumentChunk.objects.filter(uploaded_file=uploaded_file).values_list('chunk_index', 'content_hash')
+        )
+        stored_hashes = dict(stored)
+        
+        resume_at = 0
+        # Rows duplicated by pre-checkpoint retries cannot be trusted; start over
+        if stored and len(stored_hashes) == len(stored):
+            while True:
+                chunk = stream.next()
+                if chunk is None:
+                    break
+                content_hash = chunk.get('content_hash') or chunk_content_hash(chunk['content'])
+                if stored_hashes.get(resume_at) != content_hash:
+                    stream.push_back([chunk])
+                    break
+                resume_at += 1
+        
+        deleted = len(stored) - resume_at
+        if deleted:
+            stale = DocumentChunk.objects.filter(uploaded_file=uploaded_file)
+            if resume_at:
+                stale = stale.filter(chunk_index__gte=resume_at)
+            stale.delete()
+        
+        UploadedFile.objects.filter(id=uploaded_file.id).update(last_committed_chunk_index=resume_at - 1)
+        uploaded_file.last_committed_chunk_index = resume_at - 1
+        
+        if resume_at or deleted:
+            logger.info(
+                f"Resuming {uploaded_file.filename} at chunk {resume_at} "
+                f"({deleted} stale chunk rows removed)"
+            )
+        return resume_at
+    
+    def _fit_dimensions(self, embedding: list) -> list:
+        """Ensure 1024 dimensions (BGE-M3)"""
+        if len(embedding) != self.EMBEDDING_DIMS:
+            if len(embedding) < self.EMBEDDING_DIMS:
+                # Pad with zeros
+                embedding = list(embedding) + [0.0] * (self.EMBEDDING_DIMS - len(embedding))
+            else:
+                # Truncate
+                embedding = embedding[:self.EMBEDDING_DIMS]
+        return embedding
     
     def _get_bge_m3_embedding(self, text: str) -> list:
         """
         Get embedding from BGE-M3 ONLY
         NO FALLBACKS - Quality requirement
         """
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                response = requests.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={
-                        "model": self.EMBEDDING_MODEL,
-                        "prompt": text
-                    },
-                    timeout=60  # Longer timeout for quality
-                )
-                response.raise_for_status()
-                embedding = response.json()["embedding"]
-                
-                # Ensure 1024 dimensions (BGE-M3)
-                if len(embedding) != self.EMBEDDING_DIMS:
-                    if len(embedding) < self.EMBEDDING_DIMS:
-                        # Pad with zeros
-                        embedding = list(embedding) + [0.0] * (self.EMBEDDING_DIMS - len(embedding))
-                    else:
-                        # Truncate
-                        embedding = embedding[:self.EMBEDDING_DIMS]
-                
-                return embedding
-                
-            except requests.exceptions.Timeout:
-                retry_count += 1
-                logger.warning(f"BGE-M3 timeout (attempt {retry_count}/{max_retries})")
-                if retry_count >= max_retries:
-                    raise Exception("BGE-M3 embedding timeout after multiple retries")
-                    
-            except Exception as e:
-                logger.error(f"BGE-M3 embedding error: {e}")
-                raise Exception(f"BGE-M3 embedding failed: {str(e)}")
-        
-        raise Exception("Failed to get BGE-M3 embedding after all retries")
+        try:
+            return self._fit_dimensions(embedding_client.embed_one(text))
+        except EmbeddingError as e:
+            logger.error(f"BGE-M3 embedding error: {e}")
+            raise Exception(f"BGE-M3 embedding failed: {str(e)}")
     
     def _get_bge_m3_embeddings_batch(self, texts: list) -> list:
         """
         Get batch embeddings from BGE-M3
-        Processes multiple texts in a single API call for efficiency
+        Sends all texts in a single request through the shared embedding client
         
         Args:
-            texts: List of text strings to embed (up to BATCH_SIZE)
+            texts: List of text strings to embed (up to MAX_BATCH_SIZE)
         
         Returns:
             List of embeddings corresponding to input texts
@@ -644,70 +752,18 @@ class AutomaticFileProcessor:
             return []
         
         # Limit batch size to prevent API overload
-        if len(texts) > self.BATCH_SIZE:
-            logger.warning(f"Batch size {len(texts)} exceeds limit {self.BATCH_SIZE}, truncating")
-            texts = texts[:self.BATCH_SIZE]
+        if len(texts) > self.MAX_BATCH_SIZE:
+            logger.warning(f"Batch size {len(texts)} exceeds limit {self.MAX_BATCH_SIZE}, truncating")
+            texts = texts[:self.MAX_BATCH_SIZE]
         
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                # Ollama batch API: send single text (for now, batch coming later)
-                # For now, call individual API for each text (but process in batches)
-                embeddings = []
-                for text in texts:
-                    response = requests.post(
-                        f"{self.ollama_url}/api/embeddings",
-                        json={
-                            "model": self.EMBEDDING_MODEL,
-                            "prompt": text
-                        },
-                        timeout=120  # Longer timeout for batch processing
-                    )
-                    response.raise_for_status()
-                    
-                    result = response.json()
-                    embedding = result.get("embedding")
-                    embeddings.append(embedding)
-                
-                if len(embeddings) != len(texts):
-                    logger.warning(f"Received {len(embeddings)} embeddings for {len(texts)} texts")
-                
-                # Normalize each embedding to 1024 dimensions
-                normalized_embeddings = []
-                for embedding in embeddings:
-                    if len(embedding) != self.EMBEDDING_DIMS:
-                        if len(embedding) < self.EMBEDDING_DIMS:
-                            embedding = list(embedding) + [0.0] * (self.EMBEDDING_DIMS - len(embedding))
-                        else:
-                            embedding = embedding[:self.EMBEDDING_DIMS]
-                    normalized_embeddings.append(embedding)
-                
-                return normalized_embeddings
-                
-            except requests.exceptions.Timeout:
-                retry_count += 1
-                logger.warning(f"BGE-M3 batch timeout (attempt {retry_count}/{max_retries})")
-                if retry_count >= max_retries:
-                    raise Exception("BGE-M3 batch embedding timeout after multiple retries")
-                # Retry with exponential backoff
-                import time
-                time.sleep(2 ** retry_count)
-                
-            except requests.exceptions.RequestException as e:
-                retry_count += 1
-                logger.warning(f"BGE-M3 batch request error (attempt {retry_count}/{max_retries}): {e}")
-                if retry_count >= max_retries:
-                    raise Exception(f"BGE-M3 batch embedding failed: {str(e)}")
-                import time
-                time.sleep(2 ** retry_count)
-                
-            except Exception as e:
-                logger.error(f"BGE-M3 batch embedding error: {e}")
-                raise Exception(f"BGE-M3 batch embedding failed: {str(e)}")
+        try:
+            embeddings = embedding_client.embed(texts)
+        except EmbeddingError as e:
+            logger.error(f"BGE-M3 batch embedding error: {e}")
+            raise Exception(f"BGE-M3 batch embedding failed: {str(e)}")
         
-        raise Exception("Failed to get BGE-M3 batch embeddings after all retries")
+        # Normalize each embedding to 1024 dimensions
+        return [self._fit_dimensions(embedding) for embedding in embeddings]
     
     def _validate_metadata_completeness(self, metadata: dict, uploaded_file: UploadedFile) -> bool:
         """
@@ -0,0 +1,194 @@
+"""
+Persistent BM25 Inverted Index for DocumentChunk
+
+Postings (term -> chunk, tf) and chunk lengths live in PostgreSQL
+(BM25Posting / BM25ChunkLength) and are maintained incrementally:
+- chunks are indexed when they are created (post_save signal, or
+  index_chunks() for bulk paths)
+- postings and lengths are removed with their chunk (ON DELETE CASCADE)
+
+Scoring only reads the postings of the query terms for the candidate
+chunks, so nothing proportional to the corpus is loaded into Python.
+
+Per-chunk token stats (length + term counts) are computed once at ingest
+(compute_token_stats) and stored on DocumentChunk.token_stats, so neither
+indexing nor reranking has to re-tokenise chunk content.
+"""
+import re
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence
+import numpy as np
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Must fit BM25Posting.term
+MAX_TERM_LENGTH = 64
+
+# Corpus-wide N / avg doc length only drift slowly, so they are cached briefly
+CORPUS_STATS_CACHE_KEY = "bm25_index_corpus_stats"
+CORPUS_STATS_CACHE_TTL = 300
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphabetic terms of 2+ letters (the BM25 vocabulary)"""
+    words = re.findall(r'\b[a-zA-Z]{2,}\b', (text or '').lower())
+    return [word for word in words if len(word) <= MAX_TERM_LENGTH]
+
+
+def compute_token_stats(text: str) -> Dict:
+    """Token statistics stored with each chunk at ingest: length and term counts"""
+    terms = tokenize(text)
+    return {'length': len(terms), 'tf': dict(Counter(terms))}
+
+
+class BM25Index:
+    """Incrementally maintained inverted index with BM25 scoring"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1  # Term frequency saturation parameter
+        self.b = b    # Length normalization parameter
+
+    def index_chunks(self, chunks: Iterable, replace: bool = False) -> int:
+        """
+        Add postings for the given DocumentChunk instances.
+
+        With replace=True existing postings are deleted first (rebuilds);
+        otherwise already indexed chunks are skipped. Returns postings written.
+        """
+        from .models import BM25Posting, BM25ChunkLength
+
+        chunks = [chunk for chunk in chunks if chunk.pk]
+        if not chunks:
+            return 0
+
+        chunk_ids = [chunk.pk for chunk in chunks]
+        postings = []
+        lengths = []
+
+        with transaction.atomic():
+            if replace:
+                BM25Posting.objects.filter(chunk_id__in=chunk_ids).delete()
+                BM25ChunkLength.objects.filter(chunk_id__in=chunk_ids).delete()
+                indexed = set()
+            else:
+                indexed = set(
+                    BM25ChunkLength.objects.filter(chunk_id__in=chunk_ids).values_list('chunk_id', flat=True)
+                )
+
+            for chunk in chunks:
+                if chunk.pk in indexed:
+                    continue
+                # Chunks written by the ingest pipeline carry precomputed stats
+                stats = getattr(chunk, 'token_stats', None) or compute_token_stats(chunk.content)
+                lengths.append(BM25ChunkLength(chunk_id=chunk.pk, length=stats['length']))
+                postings.extend(
+                    BM25Posting(term=term, chunk_id=chunk.pk, tf=tf)
+                    for term, tf in stats['tf'].items()
+                )
+
+            BM25ChunkLength.objects.bulk_create(lengths, batch_size=1000)
+            BM25Posting.objects.bulk_create(postings, batch_size=5000)
+
+        if lengths:
+            cache.delete(CORPUS_STATS_CACHE_KEY)
+        return len(postings)
+
+    def get_token_stats(self, chunk_ids: Sequence[int]) -> Dict[int, Dict]:
+        """Precomputed token stats for the given chunks, computed on the fly if missing"""
+        from .models import DocumentChunk
+
+        stats = {}
+        missing = []
+        for chunk_id, token_stats in DocumentChunk.objects.filter(
+            id__in=list(chunk_ids)
+        ).values_list('id', 'token_stats'):
+            if token_stats:
+                stats[chunk_id] = token_stats
+            else:
+                missing.append(chunk_id)
+
+        # Chunks ingested before token stats existed
+        for chunk_id, content in DocumentChunk.objects.filter(id__in=missing).values_list('id', 'content'):
+            stats[chunk_id] = compute_token_stats(content)
+        return stats
+
+    def get_corpus_stats(self) -> Dict:
+        """Number of indexed chunks and their average length"""
+        stats = cache.get(CORPUS_STATS_CACHE_KEY)
+        if stats is not None:
+            return stats
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), COALESCE(AVG(length), 0) FROM ai_assistant_bm25chunklength;")
+            total_docs, avg_doc_length = cursor.fetchone()
+
+        stats = {'total_docs': int(total_docs), 'avg_doc_length': float(avg_doc_length)}
+        cache.set(CORPUS_STATS_CACHE_KEY, stats, CORPUS_STATS_CACHE_TTL)
+        return stats
+
+    def score_chunks(self, query_terms: Sequence[str], chunk_ids: Sequence[int]) -> Dict[int, float]:
+        """
+        BM25 score of each candidate chunk for the query terms.
+
+        One query reads the postings of the query terms restricted to the
+        candidates, plus each term's document frequency from the same index.
+        Chunks without any matching term (or not indexed) score 0.
+        """
+        scores = {chunk_id: 0.0 for chunk_id in chunk_ids}
+        terms = [term for term in dict.fromkeys(query_terms) if len(term) <= MAX_TERM_LENGTH]
+        if not terms or not scores:
+            return scores
+
+        stats = self.get_corpus_stats()
+        total_docs = stats['total_docs']
+        avg_doc_length = stats['avg_doc_length']
+        if not total_docs or not avg_doc_length:
+            return scores
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                WITH df AS (
+                    SELECT term, COUNT(*) AS df
+                    FROM ai_assistant_bm25posting
+                    WHERE term = ANY(%s)
+                    GROUP BY term
+                )
+                SELECT p.chunk_id, p.term, p.tf, df.df, l.length
+                FROM ai_assistant_bm25posting p
+                JOIN df ON df.term = p.term
+                JOIN ai_assistant_bm25chunklength l ON l.chunk_id = p.chunk_id
+                WHERE p.term = ANY(%s) AND p.chunk_id = ANY(%s);
+            """, [terms, terms, list(scores)])
+            rows = cursor.fetchall()
+
+        rows = [row for row in rows if row[4]]  # Empty chunks score 0
+        if not rows:
+            return scores
+
+        # Repeated query terms count once per occurrence, as before
+        query_term_counts = Counter(query_terms)
+
+        # Score every (chunk, term) posting in one vectorised pass
+        chunk_col, term_col, tf, df, doc_length = zip(*rows)
+        tf = np.array(tf, dtype=np.float64)
+        df = np.array(df, dtype=np.float64)
+        doc_length = np.array(doc_length, dtype=np.float64)
+        weights = np.array([query_term_counts[term] for term in term_col], dtype=np.float64)
+
+        idf = np.log((total_docs - df + 0.5) / (df + 0.5))
+        numerator = tf * (self.k1 + 1)
+        denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / avg_doc_length))
+        contributions = weights * idf * (numerator / denominator)
+
+        positions = {chunk_id: i for i, chunk_id in enumerate(scores)}
+        totals = np.zeros(len(scores))
+        np.add.at(totals, [positions[chunk_id] for chunk_id in chunk_col], contributions)
+
+        return dict(zip(scores, totals.tolist()))
+
+
+# Global instance
+bm25_index = BM25Index()
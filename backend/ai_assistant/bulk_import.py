@@ -0,0 +1,199 @@
+"""
+Parallel Bulk Import
+
+A bulk import used to run every file through one Celery task (or one
+signal-triggered task per file as records were created), leaving the other
+workers idle or racing the import transaction. A BulkImportJob instead:
+- orders its files smallest first, so most documents become searchable
+  early in a long import
+- deals them round-robin into BULK_IMPORT_CONCURRENCY lanes; each lane is a
+  chain of per-file tasks and the lanes run as one chord, so at most that
+  many files of the import are processed at once and the remaining workers
+  stay free for interactive uploads
+- aggregates progress (files and bytes done, failures, per-status counts)
+  in the job row, served by the bulk import progress endpoint
+
+Files of a job are created with processing_status='queued' so neither the
+upload signal nor process_pending_files dispatches them a second time. That
+makes the job responsible for them: if dispatching the chord fails the job
+and its queued files are marked failed, and a running job without progress
+for BULK_IMPORT_STALL_TIMEOUT seconds (longer than any single file task may
+run, so its lanes are gone) has its unfinished files - still queued, or
+left mid-processing by a killed task - dispatched again by
+resume_stalled_jobs (periodic task resume_stalled_bulk_imports).
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List, Sequence
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import BulkImportJob, UploadedFile
+
+logger = logging.getLogger(__name__)
+
+# File statuses of a job that no finished task has accounted for yet
+UNFINISHED_STATUSES = ('queued', 'metadata_extracting', 'chunking', 'embedding')
+
+
+def get_concurrency() -> int:
+    return max(1, getattr(settings, 'BULK_IMPORT_CONCURRENCY', 3))
+
+
+def build_lanes(file_ids: Sequence[int], concurrency: int) -> List[List[int]]:
+    """Deal ordered file ids round-robin, so every lane starts with small files"""
+    lanes = [list(file_ids[lane::concurrency]) for lane in range(concurrency)]
+    return [lane for lane in lanes if lane]
+
+
+def dispatch_job(job_id: int, file_ids: Sequence[int], concurrency: int):
+    """Send the files of a job to the workers as a chord of per-lane chains"""
+    from celery import chain, chord
+    from .tasks import process_bulk_import_file, finish_bulk_import
+
+    lanes = build_lanes(file_ids, concurrency)
+    header = [
+        chain(*[process_bulk_import_file.si(job_id, file_id) for file_id in lane])
+        for lane in lanes
+    ]
+    chord(header)(finish_bulk_import.si(job_id))
+    logger.info(f"Bulk import {job_id}: dispatched {len(file_ids)} files in {len(lanes)} lanes")
+
+
+def dispatch_or_fail(job_id: int, file_ids: Sequence[int], concurrency: int) -> bool:
+    """dispatch_job, marking the job and its unfinished files failed if it cannot be sent"""
+    try:
+        dispatch_job(job_id, file_ids, concurrency)
+        return True
+    except Exception as e:
+        logger.error(f"Bulk import {job_id}: dispatch failed: {e}", exc_info=True)
+        fail_job(job_id, file_ids, f"Bulk import dispatch failed: {e}")
+        return False
+
+
+def start_bulk_import(uploaded_file_ids: Sequence[int], user=None) -> BulkImportJob:
+    """
+    Create a BulkImportJob for the files and dispatch it once the current
+    transaction commits (so workers never see uncommitted files).
+    """
+    files = list(
+        UploadedFile.objects.filter(id__in=uploaded_file_ids)
+        .order_by('file_size', 'id')
+        .values_list('id', 'file_size')
+    )
+    file_ids = [file_id for file_id, _ in files]
+    concurrency = min(get_concurrency(), len(file_ids)) or 1
+
+    UploadedFile.objects.filter(id__in=file_ids, processing_status='pending').update(processing_status='queued')
+    job = BulkImportJob.objects.create(
+        created_by=user,
+        file_ids=file_ids,
+        total=len(file_ids),
+        total_bytes=sum(file_size for _, file_size in files),
+        concurrency=concurrency,
+    )
+
+    if not file_ids:
+        finish_job(job.id)
+        return job
+
+    transaction.on_commit(lambda: dispatch_or_fail(job.id, file_ids, concurrency))
+    return job
+
+
+def record_file_result(job_id: int, uploaded_file_id: int, success: bool):
+    """Count one finished file towards its job"""
+    file_size = UploadedFile.objects.filter(id=uploaded_file_id).values_list('file_size', flat=True).first() or 0
+    BulkImportJob.objects.filter(id=job_id).update(
+        completed=F('completed') + (1 if success else 0),
+        failed=F('failed') + (0 if success else 1),
+        processed_bytes=F('processed_bytes') + file_size,
+        updated_at=timezone.now(),
+    )
+
+
+def finish_job(job_id: int):
+    BulkImportJob.objects.filter(id=job_id).update(
+        status='completed', finished_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def fail_job(job_id: int, file_ids: Sequence[int], error: str):
+    """Mark the unfinished files of a job and the job itself failed"""
+    failed = UploadedFile.objects.filter(id__in=file_ids, processing_status__in=UNFINISHED_STATUSES).update(
+        processing_status='failed', processing_error=error
+    )
+    BulkImportJob.objects.filter(id=job_id).update(
+        status='failed',
+        failed=F('failed') + failed,
+        finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def resume_stalled_jobs() -> int:
+    """
+    Dispatch again the unfinished files of running jobs that made no
+    progress for BULK_IMPORT_STALL_TIMEOUT seconds (chord lost, e.g. broker
+    or worker restart, or a file task killed by the time limit). Files left
+    mid-processing are retried like queued ones; ingestion resumes from
+    their last committed chunk. A stalled job with no unfinished files only
+    missed its chord callback and is finished. Returns the number of files
+    dispatched.
+    """
+    timeout = getattr(settings, 'BULK_IMPORT_STALL_TIMEOUT', 7200)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    dispatched = 0
+
+    for job in BulkImportJob.objects.filter(status='running', updated_at__lt=cutoff):
+        unfinished = set(
+            UploadedFile.objects.filter(id__in=job.file_ids, processing_status__in=UNFINISHED_STATUSES)
+            .values_list('id', flat=True)
+        )
+        if not unfinished:
+            logger.warning(f"Bulk import {job.id}: stalled with no unfinished files, finishing it")
+            finish_job(job.id)
+            continue
+
+        # Keep the smallest-first order; restart the stall clock before dispatching
+        file_ids = [file_id for file_id in job.file_ids if file_id in unfinished]
+        BulkImportJob.objects.filter(id=job.id).update(updated_at=timezone.now())
+        logger.warning(f"Bulk import {job.id}: no progress for {timeout}s, dispatching {len(file_ids)} unfinished files again")
+        if dispatch_or_fail(job.id, file_ids, min(job.concurrency, len(file_ids))):
+            dispatched += len(file_ids)
+
+    return dispatched
+
+
+def get_progress(job: BulkImportJob) -> Dict:
+    """Aggregated progress of a job, including the current status of its files"""
+    status_counts = dict(
+        UploadedFile.objects.filter(id__in=job.file_ids)
+        .order_by()
+        .values_list('processing_status')
+        .annotate(count=Count('id'))
+    )
+    done = job.completed + job.failed
+    elapsed = ((job.finished_at or timezone.now()) - job.created_at).total_seconds()
+    eta_seconds = None
+    if job.status == 'running' and job.processed_bytes and elapsed > 0:
+        eta_seconds = round((job.total_bytes - job.processed_bytes) / (job.processed_bytes / elapsed))
+
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'completed': job.completed,
+        'failed': job.failed,
+        'remaining': job.total - done,
+        'percent': round(100.0 * done / job.total, 1) if job.total else 100.0,
+        'total_bytes': job.total_bytes,
+        'processed_bytes': job.processed_bytes,
+        'concurrency': job.concurrency,
+        'file_statuses': status_counts,
+        'elapsed_seconds': round(elapsed),
+        'eta_seconds': eta_seconds,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,168 @@
+"""
+Compact Cache Codec
+
+Cached search results used to be pickled as full result dicts (chunk
+content, filenames, URLs) and vectors as Python float lists. The codec
+stores them compactly instead:
+- search results as (chunk id, scores/metadata) tuples; the chunk fields
+  are rehydrated from the database (retrieval_core.fetch_chunk_rows) on a
+  hit, so chunk content is never duplicated into Redis
+- vectors as packed little-endian float32 bytes, or float16 with
+  CACHE_VECTOR_DTYPE='float16', tagged with their width
+
+Hit rate and (de)serialisation latency are tracked per key family
+(search_, search_scored_, advanced_search_, ...) in every process and
+reported by get_metrics(). Entry size costs an extra pickle, so it is only
+measured on every CACHE_SIZE_SAMPLE_EVERY-th write of a family (0 turns it
+off) and averaged over those sampled writes.
+"""
+import logging
+import pickle
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT = 'chunk_refs_v1'
+
+# Result fields rebuilt from the chunk row (retrieval_core.format_chunk_row)
+CHUNK_ROW_FIELDS = frozenset({
+    'id', 'content', 'uploaded_file_id', 'page_number', 'chunk_index', 'filename', 'title',
+    'file_hash', 'file_size', 'download_url', 'view_url', 'source_display',
+})
+
+VECTOR_DTYPES = {4: np.dtype('<f4'), 2: np.dtype('<f2')}
+
+# Cache keys are "<family>_<md5 hex>_<params>"
+KEY_FAMILY_PATTERN = re.compile(r'^(.*?)_[0-9a-f]{32}')
+
+
+def key_family(cache_key: str) -> str:
+    match = KEY_FAMILY_PATTERN.match(cache_key)
+    return match.group(1) if match else cache_key.split('_')[0]
+
+
+def _plain(value):
+    """numpy scalars -> Python numbers (smaller pickles, no numpy on load)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class CacheCodec:
+    """Encodes vectors and search results for the cache and records per-family metrics"""
+
+    def __init__(self):
+        dtype_name = getattr(settings, 'CACHE_VECTOR_DTYPE', 'float32')
+        self.vector_width = 2 if dtype_name == 'float16' else 4
+        self.size_sample_every = getattr(settings, 'CACHE_SIZE_SAMPLE_EVERY', 20)
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'sized': 0,
+            'bytes_total': 0,
+            'get_seconds_total': 0.0,
+            'set_seconds_total': 0.0,
+        })
+
+    # Vectors
+
+    def encode_vector(self, embedding: Sequence[float], width: Optional[int] = None) -> bytes:
+        """One width byte followed by the packed little-endian floats"""
+        width = width or self.vector_width
+        return bytes([width]) + np.asarray(embedding, dtype=VECTOR_DTYPES[width]).tobytes()
+
+    def decode_vector(self, data: bytes) -> List[float]:
+        data = bytes(data)
+        return np.frombuffer(data[1:], dtype=VECTOR_DTYPES[data[0]]).astype(np.float32).tolist()
+
+    # Search results
+
+    def encode_results(self, results: List[Dict]):
+        """(format, [(chunk id, extra fields), ...]), or the list itself if not chunk results"""
+        if not all(isinstance(result, dict) and isinstance(result.get('id'), int) for result in results):
+            return results
+        refs = [
+            (result['id'], {key: _plain(value) for key, value in result.items() if key not in CHUNK_ROW_FIELDS})
+            for result in results
+        ]
+        return (RESULTS_FORMAT, refs)
+
+    def decode_results(self, payload) -> List[Dict]:
+        """Rehydrate encoded results; chunks deleted since caching are dropped"""
+        if not (isinstance(payload, tuple) and payload and payload[0] == RESULTS_FORMAT):
+            return payload
+
+        from .retrieval_core import fetch_chunk_rows
+
+        refs = payload[1]
+        rows = fetch_chunk_rows([chunk_id for chunk_id, _ in refs])
+        results = []
+        for chunk_id, extra in refs:
+            row = rows.get(chunk_id)
+            if row is not None:
+                row.update(extra)
+                results.append(row)
+        return results
+
+    def get_results(self, cache_key: str) -> Optional[List[Dict]]:
+        """Cached search results for cache_key, or None"""
+        started = time.perf_counter()
+        payload = cache.get(cache_key)
+        results = self.decode_results(payload) if payload is not None else None
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            metrics = self._metrics[key_family(cache_key)]
+            metrics['hits' if results is not None else 'misses'] += 1
+            metrics['get_seconds_total'] += elapsed
+        return results
+
+    def set_results(self, cache_key: str, results: List[Dict], timeout: int):
+        started = time.perf_counter()
+        payload = self.encode_results(results)
+        cache.set(cache_key, payload, timeout)
+        elapsed = time.perf_counter() - started
+
+        family = key_family(cache_key)
+        with self._lock:
+            metrics = self._metrics[family]
+            metrics['sets'] += 1
+            metrics['set_seconds_total'] += elapsed
+            # The first write of a family and every size_sample_every-th after it
+            sample = self.size_sample_every > 0 and (metrics['sets'] - 1) % self.size_sample_every == 0
+
+        if sample:
+            # Same serialisation the cache backend applies, outside the timed path
+            size = len(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+            with self._lock:
+                metrics['sized'] += 1
+                metrics['bytes_total'] += size
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per key family: hit rate, sampled average entry size and latencies (this process)"""
+        with self._lock:
+            snapshot = {family: dict(metrics) for family, metrics in self._metrics.items()}
+
+        report = {}
+        for family, metrics in snapshot.items():
+            lookups = metrics['hits'] + metrics['misses']
+            sets = metrics['sets'] or 1
+            report[family] = {
+                **metrics,
+                'hit_rate': round(metrics['hits'] / lookups, 3) if lookups else 0.0,
+                'avg_entry_bytes': round(metrics['bytes_total'] / metrics['sized']) if metrics['sized'] else 0,
+                'avg_get_ms': round(metrics['get_seconds_total'] / lookups * 1000, 3) if lookups else 0.0,
+                'avg_set_ms': round(metrics['set_seconds_total'] / sets * 1000, 3),
+            }
+        return report
+
+
+# Global instance
+cache_codec = CacheCodec()
@@ -0,0 +1,117 @@
+"""
+Content-Addressed Chunk Deduplication
+
+Versioned manuals and SSB entries repeat a lot of text (legal notices,
+shared procedures). Every chunk carries content_hash, a SHA-256 of its
+normalised text, and identical text reuses the vector already stored for
+it instead of calling the embedding model again:
+- ChunkDeduplicator.embed() looks the hashes of a batch up in one indexed
+  query and only sends unseen (and batch-unique) texts to the model
+- with CHUNK_DEDUP_SHARED_VECTORS, duplicate rows also skip storing the
+  vector: they keep embedding NULL and reference the canonical chunk, which
+  shrinks the chunk table and the HNSW index. Vector search then returns
+  the canonical copy; duplicates stay reachable through lexical search.
+"""
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import transaction
+from .models import DocumentChunk
+from .chunk_writer import chunk_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkDeduplicator:
+    """Reuses stored embeddings for chunk text that has been embedded before"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'CHUNK_DEDUP_ENABLED', True)
+        self.shared_vectors = getattr(settings, 'CHUNK_DEDUP_SHARED_VECTORS', False)
+
+    def find_existing(self, hashes: Sequence[str]) -> Dict[str, Tuple[int, List[float]]]:
+        """content_hash -> (canonical chunk id, embedding) for hashes already embedded"""
+        if not hashes:
+            return {}
+
+        existing = {}
+        rows = DocumentChunk.objects.filter(
+            content_hash__in=set(hashes),
+            embedding__isnull=False,
+            canonical_chunk__isnull=True,
+        ).order_by('id').values_list('content_hash', 'id', 'embedding')
+        for content_hash, chunk_id, embedding in rows:
+            existing.setdefault(content_hash, (chunk_id, [float(x) for x in embedding]))
+        return existing
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        hashes: Optional[Sequence[str]] = None,
+        batch_size: int = 50,
+    ) -> Tuple[List[List[float]], List[Optional[int]]]:
+        """
+        Embeddings for texts, calling embed_batch only for unseen content.
+
+        Returns (embeddings, canonical chunk ids); the id is None where the
+        vector was freshly computed. embed_batch is called with at most
+        batch_size texts at a time.
+        """
+        if not self.enabled:
+            embeddings = []
+            for start in range(0, len(texts), batch_size):
+                embeddings.extend(embed_batch(list(texts[start:start + batch_size])))
+            return embeddings, [None] * len(texts)
+
+        hashes = list(hashes) if hashes is not None else [chunk_content_hash(text) for text in texts]
+        existing = self.find_existing(hashes)
+
+        # Unseen content, each distinct text embedded once
+        to_embed = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in existing and content_hash not in to_embed:
+                to_embed[content_hash] = text
+
+        fresh = {}
+        pending = list(to_embed.items())
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            vectors = embed_batch([text for _, text in batch])
+            fresh.update(zip((content_hash for content_hash, _ in batch), vectors))
+
+        embeddings = []
+        canonical_ids = []
+        for content_hash in hashes:
+            if content_hash in existing:
+                chunk_id, embedding = existing[content_hash]
+                embeddings.append(embedding)
+                canonical_ids.append(chunk_id)
+            else:
+                embeddings.append(fresh[content_hash])
+                canonical_ids.append(None)
+
+        reused = len(hashes) - len(to_embed)
+        if reused:
+            logger.info(f"Chunk dedup: reused {reused}/{len(hashes)} embeddings, embedded {len(to_embed)}")
+        return embeddings, canonical_ids
+
+    def promote_duplicate(self, chunk: DocumentChunk):
+        """
+        Before a canonical chunk is deleted, move its vector to one of its
+        duplicates and re-point the others, so they keep a vector.
+        """
+        duplicate_ids = list(chunk.duplicate_chunks.order_by('id').values_list('id', flat=True))
+        if not duplicate_ids or chunk.embedding is None:
+            return
+
+        new_canonical_id = duplicate_ids[0]
+        with transaction.atomic():
+            DocumentChunk.objects.filter(id=new_canonical_id).update(
+                embedding=chunk.embedding, canonical_chunk=None
+            )
+            DocumentChunk.objects.filter(id__in=duplicate_ids[1:]).update(canonical_chunk_id=new_canonical_id)
+
+
+# Global instance
+chunk_deduplicator = ChunkDeduplicator()
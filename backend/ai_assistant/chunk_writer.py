@@ -0,0 +1,94 @@
+"""
+Bulk DocumentChunk Writer
+
+Ingestion paths buffer chunk rows and persist each buffer with one
+multi-row INSERT (bulk_create) inside one transaction, instead of one
+autocommitted INSERT per chunk. bulk_create skips post_save signals, so the
+BM25 inverted index is updated explicitly in the same transaction.
+"""
+import hashlib
+import logging
+from typing import Callable, List, Optional
+from django.conf import settings
+from django.db import transaction
+from .models import DocumentChunk
+from .bm25_index import bm25_index, compute_token_stats
+from .vector_index import normalize_embedding
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_chunk_text(content: str) -> str:
+    """Whitespace-insensitive form of chunk text used for content addressing"""
+    return ' '.join(content.split())
+
+
+def chunk_content_hash(content: str) -> str:
+    """SHA-256 of normalised chunk content (DocumentChunk.content_hash)"""
+    return hashlib.sha256(normalize_chunk_text(content).encode('utf-8')).hexdigest()
+
+
+class ChunkBulkWriter:
+    """Buffers DocumentChunk rows and writes them in batched transactions
+
+    Usage:
+        with ChunkBulkWriter() as writer:
+            writer.add(uploaded_file=f, content=text, embedding=vec, ...)
+            writer.flush()  # optional: write now (e.g. once per embedding batch)
+    """
+
+    def __init__(self, batch_size: int = 500, on_commit: Optional[Callable[[List[DocumentChunk]], None]] = None):
+        self.batch_size = batch_size
+        # Called inside each write transaction with the created chunks (e.g. to
+        # advance an ingestion checkpoint atomically with the rows)
+        self.on_commit = on_commit
+        # Rows reusing another chunk's vector store a reference instead (chunk_dedup)
+        self.shared_vectors = getattr(settings, 'CHUNK_DEDUP_SHARED_VECTORS', False)
+        self.pending: List[DocumentChunk] = []
+        self.written_count = 0
+
+    def add(self, **fields):
+        """Buffer one chunk; embeddings are L2-normalised, content hash and token stats filled in
+
+        canonical_chunk_id (from chunk_dedup) is only kept with shared-vector
+        storage, in which case the row stores no embedding of its own.
+        """
+        canonical_chunk_id = fields.pop('canonical_chunk_id', None)
+        if canonical_chunk_id and self.shared_vectors:
+            fields['canonical_chunk_id'] = canonical_chunk_id
+            fields['embedding'] = None
+        if fields.get('embedding') is not None:
+            fields['embedding'] = normalize_embedding(fields['embedding'])
+        if not fields.get('content_hash'):
+            fields['content_hash'] = chunk_content_hash(fields.get('content', ''))
+        if fields.get('token_stats') is None:
+            fields['token_stats'] = compute_token_stats(fields.get('content', ''))
+        self.pending.append(DocumentChunk(**fields))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> List[DocumentChunk]:
+        """Write buffered chunks (and their BM25 postings) in one transaction"""
+        if not self.pending:
+            return []
+
+        chunks, self.pending = self.pending, []
+        with transaction.atomic():
+            created = DocumentChunk.objects.bulk_create(chunks, batch_size=self.batch_size)
+            bm25_index.index_chunks(created)
+            if self.on_commit:
+                self.on_commit(created)
+
+        self.written_count += len(created)
+        logger.debug(f"Bulk wrote {len(created)} chunks ({self.written_count} total)")
+        return created
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Only persist the tail of the buffer when the caller finished cleanly
+        if exc_type is None:
+            self.flush()
+        return False
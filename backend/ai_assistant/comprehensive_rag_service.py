@@ -5,7 +5,7 @@ Designed to provide exhaustive, detailed responses using all available informati
 import requests
 import hashlib
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from django.db import connection
 from django.conf import settings
 from django.core.cache import cache
@@ -13,80 +13,57 @@ from .models import DocumentChunk, UploadedFile, QueryHistory
 from .advanced_rag_service import AdvancedRAGService
 from .hybrid_search import hybrid_search_engine, query_processor
 from .reranker import advanced_reranker
+from .context_packer import context_packer, document_score
+from .cache_codec import cache_codec
+from .llm_streaming import cached_token_stream, stream_ollama_chat, stream_rag_pipeline
+from .async_rag import async_ollama_client, async_rag_pipeline
+from .single_flight import single_flight
+from .semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
+NO_COMPREHENSIVE_ANSWER = "I don't have enough information in my knowledge base to provide a comprehensive answer to your question. Please try rephrasing your question or check if the relevant documents have been uploaded."
+
+
 class ComprehensiveContextOptimizer:
     """Optimizer for maximum information extraction and comprehensive context"""
     
-    def __init__(self, max_context_length: int = 12000):  # Increased from 4000
-        self.max_context_length = max_context_length
+    def __init__(self, max_context_tokens: int = 3072):
+        # Used when the caller does not pass the budget left by its num_ctx / num_predict
+        self.max_context_tokens = max_context_tokens
         self.min_sources_for_comprehensive = 3
+    
+    @staticmethod
+    def _format_document(doc: Dict, content: str) -> str:
+        page = doc.get('page_number', 1)
+        return f"[Page {page}, Relevance: {document_score(doc):.3f}]\n{content}"
+    
+    def _format_sections(self, items: List[Tuple[Dict, str]]) -> str:
+        """Packed chunks grouped into one section per source file (most relevant file first)"""
+        sections_by_file = {}
+        for doc, content in items:
+            sections_by_file.setdefault(doc.get('filename', 'Unknown'), []).append(self._format_document(doc, content))
         
-    def extract_all_relevant_information(self, query: str, documents: List[Dict]) -> Dict:
-        """Extract maximum information from all relevant sources"""
+        return "\n\n".join(
+            f"\n=== SOURCE: {filename} ===\n" + "\n\n".join(parts)
+            for filename, parts in sections_by_file.items()
+        )
+    
+    def extract_all_relevant_information(self, query: str, documents: List[Dict], token_budget: int = None) -> Dict:
+        """Extract maximum information from all relevant sources, at most token_budget tokens"""
         if not documents:
             return {"context": "", "source_count": 0, "total_info": 0}
         
-        # Group documents by source file for better organization
-        sources_by_file = {}
-        for doc in documents:
-            filename = doc.get('filename', 'Unknown')
-            if filename not in sources_by_file:
-                sources_by_file[filename] = []
-            sources_by_file[filename].append(doc)
-        
-        comprehensive_sections = []
-        total_characters = 0
-        sources_used = 0
-        
-        # Process each source file comprehensively
-        for filename, file_docs in sources_by_file.items():
-            if total_characters >= self.max_context_length:
-                break
-                
-            # Sort documents within each file by relevance
-            file_docs.sort(key=lambda x: x.get('final_rerank_score', x.get('hybrid_score', 0)), reverse=True)
-            
-            # Create comprehensive section for this source
-            section_parts = []
-            section_header = f"\n=== SOURCE: {filename} ===\n"
-            
-            for i, doc in enumerate(file_docs):
-                available_space = self.max_context_length - total_characters - len(section_header) - 100
-                if available_space <= 0:
-                    break
-                
-                content = doc.get('content', '')
-                page = doc.get('page_number', 1)
-                relevance = doc.get('final_rerank_score', doc.get('hybrid_score', 0))
-                
-                # Include more content per document for comprehensive answers
-                if len(content) > available_space:
-                    # Smart truncation - try to keep complete sections
-                    truncated = content[:available_space]
-                    # Look for natural break points
-                    for break_point in ['. ', '.\n', ':\n', '\n\n']:
-                        last_break = truncated.rfind(break_point)
-                        if last_break > available_space * 0.6:  # Keep at least 60% of content
-                            truncated = truncated[:last_break + len(break_point)]
-                            break
-                    content = truncated
-                
-                doc_part = f"[Page {page}, Relevance: {relevance:.3f}]\n{content}"
-                section_parts.append(doc_part)
-                total_characters += len(doc_part) + 10  # +10 for formatting
-                
-                if total_characters >= self.max_context_length:
-                    break
-            
-            if section_parts:
-                section_content = section_header + "\n\n".join(section_parts)
-                comprehensive_sections.append(section_content)
-                sources_used += 1
-        
-        # Combine all sections
-        comprehensive_context = "\n\n".join(comprehensive_sections)
+        # Best chunks first, overlapping ones once, then grouped by source file
+        packed = context_packer.pack(
+            'comprehensive',
+            documents,
+            token_budget or self.max_context_tokens,
+            render_item=self._format_document,
+            render_context=self._format_sections,
+        )
+        comprehensive_context = packed.text
+        sources_used = len({doc.get('filename', 'Unknown') for doc, _ in packed.items})
         
         logger.info(f"Comprehensive context: {sources_used} sources, {len(comprehensive_context)} characters")
         
@@ -94,7 +71,9 @@ class ComprehensiveContextOptimizer:
             "context": comprehensive_context,
             "source_count": sources_used,
             "total_info": len(comprehensive_context),
-            "sources_by_file": len(sources_by_file)
+            "sources_by_file": len({doc.get('filename', 'Unknown') for doc in documents}),
+            "token_budget": packed.budget_tokens,
+            "tokens_used": packed.used_tokens
         }
     
     def generate_comprehensive_prompt(self, query: str, context_info: Dict, query_type: str = 'general') -> str:
@@ -200,7 +179,7 @@ class ComprehensiveRAGService(AdvancedRAGService):
         self.similarity_threshold = 0.3  # Lowered from 0.4 for more inclusive results (accuracy first)
         
         # Use comprehensive context optimizer
-        self.comprehensive_optimizer = ComprehensiveContextOptimizer(max_context_length=12000)
+        self.comprehensive_optimizer = ComprehensiveContextOptimizer()
         
         # Enhanced cache settings for comprehensive responses
         self.comprehensive_cache_ttl = 7200  # 2 hours for comprehensive results
@@ -216,7 +195,7 @@ class ComprehensiveRAGService(AdvancedRAGService):
             cache_key = f"comprehensive_search_{query_hash}_{top_k}_{self.similarity_threshold}"
             
             # Try cache first
-            cached_results = cache.get(cache_key)
+            cached_results = cache_codec.get_results(cache_key)
             if cached_results is not None:
                 logger.info(f"Using cached comprehensive search results: {query[:30]}...")
                 return cached_results
@@ -235,22 +214,20 @@ class ComprehensiveRAGService(AdvancedRAGService):
             
             # Step 2: Cast a very wide net for maximum comprehensive coverage (Option 3+)
             # Retrieve 60 candidates for maximum recall - accuracy is priority
-            vector_results = self.search_relevant_documents_with_scoring(
-                expanded_query, top_k=self.comprehensive_candidates
+            # Expanded and original query share one batched embedding call and one SQL round-trip
+            vector_results = self.search_query_variants_with_scoring(
+                [expanded_query, query], top_k=self.comprehensive_candidates
             )
             
             logger.info(f"Retrieved {len(vector_results)} candidates out of {self.comprehensive_candidates} requested")
             
-            if not vector_results:
-                return []
-            
-            # Step 3: Hybrid search with more candidates
+            # Step 3: Hybrid search with more candidates (full-text hits rank even without vector results)
             hybrid_results = hybrid_search_engine.hybrid_search(
                 query, vector_results, top_k=top_k * 2  # Get more for comprehensive coverage
             )
             
             # Step 4: Advanced reranking but keep more results
-            reranked_results = advanced_reranker.advanced_rerank(query, hybrid_results)
+            reranked_results = advanced_reranker.advanced_rerank(query, hybrid_results, top_k=top_k)
             
             # Step 5: Select comprehensive set of results
             comprehensive_results = reranked_results[:top_k]
@@ -261,8 +238,9 @@ class ComprehensiveRAGService(AdvancedRAGService):
                 result['search_method'] = 'comprehensive_rag'
                 result['comprehensive_mode'] = True
             
-            # Cache results
-            cache.set(cache_key, comprehensive_results, self.comprehensive_cache_ttl)
+            # Cache results (not empty ones)
+            if comprehensive_results:
+                cache_codec.set_results(cache_key, comprehensive_results, self.comprehensive_cache_ttl)
             
             logger.info(f"Comprehensive search: {len(comprehensive_results)} results for maximum detail")
             
@@ -279,16 +257,7 @@ class ComprehensiveRAGService(AdvancedRAGService):
             return "I don't have enough information in my knowledge base to provide a comprehensive answer to your question."
         
         try:
-            # Extract comprehensive information from all sources
-            context_info = self.comprehensive_optimizer.extract_all_relevant_information(query, documents)
-            
-            # Determine query type for specialized handling
-            query_type = documents[0].get('query_type', 'general')
-            
-            # Generate comprehensive prompt
-            comprehensive_prompt = self.comprehensive_optimizer.generate_comprehensive_prompt(
-                query, context_info, query_type
-            )
+            comprehensive_prompt, query_type = self.build_comprehensive_prompt(query, documents)
             
             # Generate comprehensive response with enhanced parameters
             response = self.ollama_generate_comprehensive(comprehensive_prompt, query_type)
@@ -303,6 +272,25 @@ class ComprehensiveRAGService(AdvancedRAGService):
             # Fallback to advanced response generation
             return self.generate_advanced_response(query, documents)
     
+    def build_comprehensive_prompt(self, query: str, documents: List[Dict]):
+        """Prompt for generate_comprehensive_response, with its query type"""
+        # Determine query type for specialized handling
+        query_type = documents[0].get('query_type', 'general')
+        
+        # Extract comprehensive information from all sources, in the window left by the prompt and the generation
+        options = self._comprehensive_options(query_type)
+        token_budget = context_packer.context_budget(
+            options['num_ctx'], options['num_predict'],
+            self.comprehensive_optimizer.generate_comprehensive_prompt(query, {}, query_type)
+        )
+        context_info = self.comprehensive_optimizer.extract_all_relevant_information(query, documents, token_budget)
+        
+        # Generate comprehensive prompt
+        comprehensive_prompt = self.comprehensive_optimizer.generate_comprehensive_prompt(
+            query, context_info, query_type
+        )
+        return comprehensive_prompt, query_type
+    
     def clean_response_formatting(self, response: str) -> str:
         """Remove unwanted markdown formatting and symbols from response"""
         import re
@@ -341,6 +329,43 @@ class ComprehensiveRAGService(AdvancedRAGService):
             logger.debug(f"Using cached comprehensive response: {prompt_hash[:8]}...")
             return cached_response
         
+        try:
+            response = requests.post(
+                f"{self.ollama_url}/api/chat",
+                json=self._comprehensive_payload(prompt, query_type, model),
+                timeout=300  # Increased timeout for longer responses
+            )
+            response.raise_for_status()
+            response_text = response.json()["message"]["content"]
+            
+            # Cache the comprehensive response
+            cache.set(cache_key, response_text, self.comprehensive_cache_ttl)
+            logger.info(f"Generated comprehensive response: {len(response_text)} characters")
+            
+            return response_text
+            
+        except Exception as e:
+            logger.error(f"Error in comprehensive generation: {e}")
+            raise
+    
+    def stream_ollama_generate_comprehensive(self, prompt: str, query_type: str = 'general', model: str = None):
+        """Streaming ollama_generate_comprehensive: yields response pieces, shares its cache"""
+        if model is None:
+            model = self.model_name
+        
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return cached_token_stream(
+            f"comprehensive_response_{model}_{query_type}_{prompt_hash}",
+            self.comprehensive_cache_ttl,
+            lambda: stream_ollama_chat(
+                self.ollama_url,
+                self._comprehensive_payload(prompt, query_type, model),
+                300
+            )
+        )
+    
+    def _comprehensive_options(self, query_type: str) -> Dict:
+        """Ollama options for a query type (num_predict also sizes the context budget)"""
         # Ultra-conservative parameters for maximum accuracy - prevent hallucination
         comprehensive_params = {
             'procedural': {
@@ -385,39 +410,24 @@ class ComprehensiveRAGService(AdvancedRAGService):
             }
         }
         
-        params = comprehensive_params.get(query_type, comprehensive_params['general'])
-        
-        try:
-            response = requests.post(
-                f"{self.ollama_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ],
-                    "stream": False,
-                    "options": {
-                        **params
-                        # top_k is already in params dict
-                    }
-                },
-                timeout=300  # Increased timeout for longer responses
-            )
-            response.raise_for_status()
-            response_text = response.json()["message"]["content"]
-            
-            # Cache the comprehensive response
-            cache.set(cache_key, response_text, self.comprehensive_cache_ttl)
-            logger.info(f"Generated comprehensive response: {len(response_text)} characters")
-            
-            return response_text
-            
-        except Exception as e:
-            logger.error(f"Error in comprehensive generation: {e}")
-            raise
+        return comprehensive_params.get(query_type, comprehensive_params['general'])
+    
+    def _comprehensive_payload(self, prompt: str, query_type: str, model: str) -> Dict:
+        """/api/chat request body with query-type specific sampling"""
+        return {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False,
+            "options": {
+                **self._comprehensive_options(query_type)
+                # top_k is already in the options
+            }
+        }
     
     def query_with_comprehensive_rag(self, query: str, top_k: int = None, user=None) -> Dict:
-        """Complete comprehensive RAG pipeline for maximum detail"""
+        """Complete comprehensive RAG pipeline for maximum detail; concurrent identical queries share one computation"""
         if top_k is None:
             top_k = self.comprehensive_top_k
             
@@ -426,73 +436,12 @@ class ComprehensiveRAGService(AdvancedRAGService):
             query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
             cache_key = f"comprehensive_rag_{query_hash}_{top_k}"
             
-            # Try cache first
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Using cached comprehensive RAG result: {query[:30]}...")
-                return cached_result
-            
-            # Step 1: Comprehensive search for maximum information
-            relevant_docs = self.search_for_comprehensive_results(query, top_k)
-            
-            if not relevant_docs:
-                response = "I don't have enough information in my knowledge base to provide a comprehensive answer to your question. Please try rephrasing your question or check if the relevant documents have been uploaded."
-                result = {
-                    "response": response,
-                    "sources": [],
-                    "query": query,
-                    "search_method": "comprehensive_rag",
-                    "comprehensive_stats": {
-                        "total_results": 0,
-                        "query_type": "unknown",
-                        "comprehensive_mode": True
-                    }
-                }
-            else:
-                # Step 2: Generate comprehensive response
-                response = self.generate_comprehensive_response(query, relevant_docs)
-                
-                # Calculate comprehensive statistics
-                query_type = relevant_docs[0].get('query_type', 'general')
-                avg_score = sum(r.get('final_rerank_score', r.get('hybrid_score', 0)) 
-                              for r in relevant_docs) / len(relevant_docs)
-                
-                # Count unique sources
-                unique_sources = len(set(doc.get('filename', 'Unknown') for doc in relevant_docs))
-                
-                result = {
-                    "response": response,
-                    "sources": relevant_docs,
-                    "query": query,
-                    "search_method": "comprehensive_rag",
-                    "comprehensive_stats": {
-                        "total_results": len(relevant_docs),
-                        "unique_sources": unique_sources,
-                        "query_type": query_type,
-                        "avg_relevance_score": avg_score,
-                        "response_length": len(response),
-                        "comprehensive_mode": True,
-                        "context_characters": sum(len(doc.get('content', '')) for doc in relevant_docs)
-                    }
-                }
-            
-            # Cache result
-            cache.set(cache_key, result, self.comprehensive_cache_ttl)
-            
-            # Save to history with comprehensive metadata
-            if user:
-                QueryHistory.objects.create(
-                    query=query,
-                    response=response,
-                    sources=relevant_docs,
-                    query_type='comprehensive_rag',
-                    user=user
-                )
-            
-            logger.info(f"Comprehensive RAG complete: {len(relevant_docs)} sources, "
-                       f"{len(response)} chars, query type: {result['comprehensive_stats'].get('query_type')}")
-            
-            return result
+            return single_flight.run(
+                cache_key,
+                self.comprehensive_cache_ttl,
+                compute=lambda: self._compute_comprehensive_rag(query, top_k, user),
+                revalidate=lambda: self._compute_comprehensive_rag(query, top_k),
+            )
             
         except Exception as e:
             logger.error(f"Error in comprehensive RAG: {e}")
@@ -503,6 +452,138 @@ class ComprehensiveRAGService(AdvancedRAGService):
                 "search_method": "error",
                 "comprehensive_stats": {"error": str(e)}
             }
+    
+    def _compute_comprehensive_rag(self, query: str, top_k: int, user=None) -> Dict:
+        """query_with_comprehensive_rag on a cache miss"""
+        # Step 1: Comprehensive search for maximum information
+        relevant_docs = self.search_for_comprehensive_results(query, top_k)
+        
+        if not relevant_docs:
+            result = self._comprehensive_result(query, relevant_docs, NO_COMPREHENSIVE_ANSWER)
+        else:
+            # Step 2: Generate comprehensive response (or reuse the answer to an equivalent query)
+            result = semantic_cache.get_or_generate(
+                'comprehensive_rag', f"{self.model_name}:top_k={top_k}", query, relevant_docs,
+                lambda: self._comprehensive_result(
+                    query, relevant_docs, self.generate_comprehensive_response(query, relevant_docs)
+                )
+            )
+        response = result['response']
+        
+        # Save to history with comprehensive metadata
+        if user:
+            QueryHistory.objects.create(
+                query=query,
+                response=response,
+                sources=relevant_docs,
+                query_type='comprehensive_rag',
+                user=user
+            )
+        
+        logger.info(f"Comprehensive RAG complete: {len(relevant_docs)} sources, "
+                   f"{len(response)} chars, query type: {result['comprehensive_stats'].get('query_type')}")
+        
+        return result
+    
+    def _comprehensive_result(self, query: str, relevant_docs: List[Dict], response: str) -> Dict:
+        if not relevant_docs:
+            comprehensive_stats = {
+                "total_results": 0,
+                "query_type": "unknown",
+                "comprehensive_mode": True
+            }
+        else:
+            # Calculate comprehensive statistics
+            query_type = relevant_docs[0].get('query_type', 'general')
+            avg_score = sum(r.get('final_rerank_score', r.get('hybrid_score', 0)) 
+                          for r in relevant_docs) / len(relevant_docs)
+            
+            # Count unique sources
+            unique_sources = len(set(doc.get('filename', 'Unknown') for doc in relevant_docs))
+            
+            comprehensive_stats = {
+                "total_results": len(relevant_docs),
+                "unique_sources": unique_sources,
+                "query_type": query_type,
+                "avg_relevance_score": avg_score,
+                "response_length": len(response),
+                "comprehensive_mode": True,
+                "context_characters": sum(len(doc.get('content', '')) for doc in relevant_docs)
+            }
+        return {
+            "response": response,
+            "sources": relevant_docs,
+            "query": query,
+            "search_method": "comprehensive_rag",
+            "comprehensive_stats": comprehensive_stats
+        }
+    
+    def _stream_comprehensive_answer(self, query: str, documents: List[Dict]):
+        comprehensive_prompt, query_type = self.build_comprehensive_prompt(query, documents)
+        return self.stream_ollama_generate_comprehensive(comprehensive_prompt, query_type)
+    
+    def stream_query_with_comprehensive_rag(self, query: str, top_k: int = None, user=None):
+        """query_with_comprehensive_rag as (event, data) pairs: sources, then tokens, then the result"""
+        if top_k is None:
+            top_k = self.comprehensive_top_k
+        
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return stream_rag_pipeline(
+            query,
+            user,
+            cache_key=f"comprehensive_rag_{query_hash}_{top_k}",
+            cache_ttl=self.comprehensive_cache_ttl,
+            history_type='comprehensive_rag',
+            search=lambda: self.search_for_comprehensive_results(query, top_k),
+            stream_answer=lambda docs: self._stream_comprehensive_answer(query, docs),
+            build_result=lambda docs, response: self._comprehensive_result(query, docs, response),
+            finalize=self.clean_response_formatting,
+            empty_response=NO_COMPREHENSIVE_ANSWER,
+        )
+    
+    async def agenerate_comprehensive(self, prompt: str, query_type: str = 'general') -> str:
+        """ollama_generate_comprehensive on the event loop, sharing its cache"""
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return await async_ollama_client.cached_chat(
+            f"comprehensive_response_{self.model_name}_{query_type}_{prompt_hash}",
+            self.comprehensive_cache_ttl,
+            self._comprehensive_payload(prompt, query_type, self.model_name),
+            300  # Same as ollama_generate_comprehensive
+        )
+    
+    async def aquery_with_comprehensive_rag(self, query: str, top_k: int = None, user=None) -> Dict:
+        """query_with_comprehensive_rag on the async request path (non-blocking generation)"""
+        if top_k is None:
+            top_k = self.comprehensive_top_k
+        
+        async def generate(prepared):
+            comprehensive_prompt, query_type = prepared
+            response = await self.agenerate_comprehensive(comprehensive_prompt, query_type)
+            return self.clean_response_formatting(response)
+        
+        try:
+            query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+            return await async_rag_pipeline(
+                query,
+                user,
+                cache_key=f"comprehensive_rag_{query_hash}_{top_k}",
+                cache_ttl=self.comprehensive_cache_ttl,
+                history_type='comprehensive_rag',
+                search=lambda: self.search_for_comprehensive_results(query, top_k),
+                prepare=lambda docs: self.build_comprehensive_prompt(query, docs),
+                generate=generate,
+                build_result=lambda docs, response: self._comprehensive_result(query, docs, response),
+                empty_response=NO_COMPREHENSIVE_ANSWER,
+            )
+        except Exception as e:
+            logger.error(f"Error in async comprehensive RAG: {e}")
+            return {
+                "response": f"I apologize, but I encountered an error while processing your request for comprehensive information: {str(e)}",
+                "sources": [],
+                "query": query,
+                "search_method": "error",
+                "comprehensive_stats": {"error": str(e)}
+            }
 
 # Global comprehensive RAG service instance
 comprehensive_rag_service = ComprehensiveRAGService()
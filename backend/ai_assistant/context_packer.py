@@ -0,0 +1,269 @@
+"""
+Token-Budgeted Context Packing
+
+The context optimizers used to pack a fixed number of characters (4,000 for
+advanced RAG, 12,000 for comprehensive) regardless of the window the request
+actually gets: with num_ctx 8192 and num_predict 4000 a 12,000-character
+context plus the long instructions can overflow, and Ollama then drops the
+start of the prompt (the instructions) without telling anyone. ContextPacker
+fills a budget in real tokens instead:
+- tokens are counted with the served model's tokenizer (OLLAMA_TOKENIZER,
+  a Hugging Face tokenizer name or tokenizer.json path, loaded once per
+  process); without it a conservative characters-per-token estimate is used
+- the budget is num_ctx minus num_predict (the generation has to fit in the
+  same window) minus the prompt around the context and the chat template
+- chunks are taken greedily by relevance; chunks whose text is mostly
+  already packed (overlapping neighbours, the same passage in two files)
+  are skipped; the last chunk that does not fit whole is cut at a sentence
+  boundary
+- every pack reports its budget and the tokens used (logged, and per tier
+  in the performance stats)
+"""
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Characters per token assumed without the tokenizer (low, so the estimate overcounts)
+CHARS_PER_TOKEN_ESTIMATE = 3.0
+
+# Chat template tokens around the prompt (role markers, default system prompt)
+TEMPLATE_OVERHEAD_TOKENS = 64
+
+SHINGLE_SIZE = 5
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _cut_at_sentence(text: str, min_keep: float = 0.6) -> str:
+    """text up to its last sentence/section break, if that keeps at least min_keep of it"""
+    for break_point in ['. ', '.\n', ':\n', '\n\n']:
+        last_break = text.rfind(break_point)
+        if last_break > len(text) * min_keep:
+            return text[:last_break + len(break_point)].rstrip()
+    return text.rstrip() + "..."
+
+
+def document_score(doc: Dict) -> float:
+    """Best available relevance score of a retrieved chunk"""
+    return doc.get('final_rerank_score', doc.get('hybrid_score', doc.get('similarity', 0))) or 0
+
+
+@dataclass
+class PackedContext:
+    """Chunks chosen for a prompt: (document, possibly truncated content) in packing order"""
+    items: List[Tuple[Dict, str]]
+    text: str
+    budget_tokens: int
+    used_tokens: int
+    duplicates: int = 0
+    truncated: int = 0
+    dropped: int = 0
+    exact: bool = True  # Counted with the model's tokenizer
+
+
+class TokenCounter:
+    """Token counts with the served model's tokenizer (loaded once per process)"""
+
+    # Process-wide tokenizer state shared by every instance
+    _tokenizer = None
+    _load_failed_at = None
+    _load_lock = threading.Lock()
+
+    def __init__(self):
+        self.tokenizer_name = getattr(settings, 'OLLAMA_TOKENIZER', 'Qwen/Qwen2.5-7B-Instruct')
+        self.retry_after = getattr(settings, 'OLLAMA_TOKENIZER_RETRY_AFTER', 600)
+
+    def _load_tokenizer(self) -> bool:
+        cls = TokenCounter
+        if cls._tokenizer is not None:
+            return True
+
+        # Negative-load sentinel: an offline worker should not retry the download per request
+        if cls._load_failed_at is not None and time.monotonic() - cls._load_failed_at < self.retry_after:
+            return False
+
+        with cls._load_lock:
+            if cls._tokenizer is not None:
+                return True
+            try:
+                from tokenizers import Tokenizer
+
+                if self.tokenizer_name.endswith('.json'):
+                    cls._tokenizer = Tokenizer.from_file(self.tokenizer_name)
+                else:
+                    cls._tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+                cls._load_failed_at = None
+                logger.info(f"Loaded tokenizer for context packing: {self.tokenizer_name}")
+                return True
+            except Exception as e:
+                cls._load_failed_at = time.monotonic()
+                logger.warning(
+                    f"Could not load tokenizer {self.tokenizer_name}: {e} "
+                    f"(estimating {CHARS_PER_TOKEN_ESTIMATE} characters per token, next attempt in {self.retry_after}s)"
+                )
+                return False
+
+    @property
+    def exact(self) -> bool:
+        return self._load_tokenizer()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._load_tokenizer():
+            return len(TokenCounter._tokenizer.encode(text, add_special_tokens=False).ids)
+        return int(len(text) / CHARS_PER_TOKEN_ESTIMATE) + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text with at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self._load_tokenizer():
+            encoding = TokenCounter._tokenizer.encode(text, add_special_tokens=False)
+            if len(encoding.ids) <= max_tokens:
+                return text
+            return text[:encoding.offsets[max_tokens - 1][1]]
+        return text[:int(max_tokens * CHARS_PER_TOKEN_ESTIMATE)]
+
+
+class ContextPacker:
+    """Greedy, de-duplicating context packing within a token budget"""
+
+    def __init__(self, token_counter: TokenCounter = None):
+        self.token_counter = token_counter or TokenCounter()
+        self.duplicate_threshold = getattr(settings, 'CONTEXT_PACKER_DUPLICATE_THRESHOLD', 0.8)
+        self.min_chunk_tokens = getattr(settings, 'CONTEXT_PACKER_MIN_CHUNK_TOKENS', 64)
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: defaultdict(int))
+
+    def context_budget(self, num_ctx: int, num_predict: int, prompt_scaffold: str) -> int:
+        """Tokens left for the context: the window minus the generation and the prompt around the context"""
+        budget = num_ctx - num_predict - TEMPLATE_OVERHEAD_TOKENS - self.token_counter.count(prompt_scaffold)
+        if budget < self.min_chunk_tokens:
+            logger.warning(
+                f"Context budget of {budget} tokens (num_ctx {num_ctx}, num_predict {num_predict}) "
+                f"leaves no room for context; packing {self.min_chunk_tokens} tokens"
+            )
+            budget = self.min_chunk_tokens
+        return budget
+
+    def pack(
+        self,
+        name: str,
+        documents: List[Dict],
+        budget_tokens: int,
+        render_item: Callable[[Dict, str], str],
+        render_context: Callable[[List[Tuple[Dict, str]]], str],
+        score: Callable[[Dict], float] = document_score,
+    ) -> PackedContext:
+        """
+        Pack the best documents into budget_tokens. render_item(doc, content)
+        is one chunk as it appears in the context (used for its cost);
+        render_context(items) is the final context text, which is counted
+        again and trimmed from the lowest-scoring end if separators or
+        headers push it over the budget.
+        """
+        counter = self.token_counter
+        items = []
+        packed_shingles = set()
+        used = 0
+        duplicates = truncated = dropped = 0
+
+        for doc in sorted(documents, key=score, reverse=True):
+            content = (doc.get('content') or '').strip()
+            if not content:
+                continue
+
+            shingles = _shingles(content)
+            if shingles and len(shingles & packed_shingles) / len(shingles) >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+
+            remaining = budget_tokens - used
+            cost = counter.count(render_item(doc, content)) + 2  # Separator between chunks
+            if cost > remaining:
+                # Room for part of this chunk? Otherwise a smaller one further down may still fit
+                overhead = counter.count(render_item(doc, '')) + 2
+                if remaining - overhead < self.min_chunk_tokens:
+                    dropped += 1
+                    continue
+                content = _cut_at_sentence(counter.truncate(content, remaining - overhead - 1))
+                cost = counter.count(render_item(doc, content)) + 2
+                # Only the packed prefix can make later chunks duplicates
+                shingles = _shingles(content)
+                truncated += 1
+
+            items.append((doc, content))
+            packed_shingles |= shingles
+            used += cost
+
+        text = render_context(items)
+        used = counter.count(text)
+        while items and used > budget_tokens:
+            items.pop()
+            dropped += 1
+            text = render_context(items)
+            used = counter.count(text)
+
+        packed = PackedContext(
+            items=items,
+            text=text,
+            budget_tokens=budget_tokens,
+            used_tokens=used,
+            duplicates=duplicates,
+            truncated=truncated,
+            dropped=dropped,
+            exact=counter.exact,
+        )
+        self._record(name, packed)
+        logger.info(
+            f"Packed {name} context: {len(items)} chunks, {used}/{budget_tokens} tokens"
+            f"{'' if packed.exact else ' (estimated)'}, {duplicates} duplicate, "
+            f"{truncated} truncated, {dropped} dropped"
+        )
+        return packed
+
+    def _record(self, name: str, packed: PackedContext):
+        with self._lock:
+            metrics = self._metrics[name]
+            metrics['packs'] += 1
+            metrics['budget_tokens'] += packed.budget_tokens
+            metrics['used_tokens'] += packed.used_tokens
+            metrics['chunks'] += len(packed.items)
+            metrics['duplicates'] += packed.duplicates
+            metrics['truncated'] += packed.truncated
+            metrics['dropped'] += packed.dropped
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per context: packs, average budget and tokens used, skipped chunks (this process)"""
+        with self._lock:
+            report = {}
+            for name, metrics in self._metrics.items():
+                packs = metrics['packs']
+                report[name] = {
+                    'packs': packs,
+                    'avg_budget_tokens': round(metrics['budget_tokens'] / packs),
+                    'avg_used_tokens': round(metrics['used_tokens'] / packs),
+                    'avg_chunks': round(metrics['chunks'] / packs, 1),
+                    'duplicates': metrics['duplicates'],
+                    'truncated': metrics['truncated'],
+                    'dropped': metrics['dropped'],
+                }
+            return report
+
+
+# Global instance
+context_packer = ContextPacker()
@@ -0,0 +1,259 @@
+"""
+Bulk Embedding Backfill
+
+Re-embedding the corpus (model change, restore, add_embeddings --force) used
+to load every target chunk into memory and save() them one at a time. The
+backfill engine instead:
+- walks chunks in primary key order, one key range at a time, reading each
+  range through a server-side cursor (QuerySet.iterator) so memory stays
+  flat however large the table is
+- embeds EMBEDDING_BACKFILL_BATCH_SIZE chunks per request on a pool of
+  EMBEDDING_BACKFILL_WORKERS threads (the embedding server coalesces them)
+- writes each batch with COPY into a temporary table and a single
+  UPDATE ... FROM
+- keeps an EmbeddingBackfillCursor row with the highest chunk id below which
+  every batch is done, so an interrupted run resumes where it stopped
+
+Batches are completed in id order, so the cursor never moves past a batch
+that is still in flight. A --force run also never moves it past a failed
+batch and is not marked complete if any batch failed: failed chunks keep
+their old (non-NULL) vector, so only resuming the --force run redoes them.
+"""
+import io
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import DocumentChunk, EmbeddingBackfillCursor
+from .embedding_client import embedding_client
+from .vector_index import normalize_embedding
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSIONS = DocumentChunk._meta.get_field('embedding').dimensions
+
+
+def format_vector(embedding: Sequence[float]) -> str:
+    """pgvector text representation"""
+    return '[' + ','.join(repr(float(x)) for x in embedding) + ']'
+
+
+def fit_embedding_dimensions(embedding: Sequence[float]) -> List[float]:
+    """Pad or truncate to the DocumentChunk vector dimensions"""
+    embedding = list(embedding)
+    if len(embedding) < EMBEDDING_DIMENSIONS:
+        return embedding + [0.0] * (EMBEDDING_DIMENSIONS - len(embedding))
+    return embedding[:EMBEDDING_DIMENSIONS]
+
+
+def write_embeddings(rows: Sequence[Tuple[int, Sequence[float]]]) -> int:
+    """Bulk-update chunk embeddings (COPY + UPDATE ... FROM), returns rows updated"""
+    if not rows:
+        return 0
+
+    buffer = io.StringIO()
+    for chunk_id, embedding in rows:
+        buffer.write(f"{chunk_id}\t{format_vector(embedding)}\n")
+    buffer.seek(0)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE embedding_backfill_rows (id bigint PRIMARY KEY, embedding vector) ON COMMIT DROP;"
+            )
+            cursor.copy_expert("COPY embedding_backfill_rows (id, embedding) FROM STDIN", buffer)
+            cursor.execute("""
+                UPDATE ai_assistant_documentchunk dc
+                SET embedding = r.embedding
+                FROM embedding_backfill_rows r
+                WHERE dc.id = r.id;
+            """)
+            return cursor.rowcount
+
+
+class EmbeddingBackfill:
+    """Parallel, resumable (re-)embedding of document chunks"""
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        workers: int = None,
+        force: bool = False,
+        chunk_id: int = None,
+    ):
+        self.batch_size = max(1, batch_size or getattr(settings, 'EMBEDDING_BACKFILL_BATCH_SIZE', 256))
+        self.workers = max(1, workers or getattr(settings, 'EMBEDDING_BACKFILL_WORKERS', 4))
+        self.force = force
+        self.chunk_id = chunk_id
+        self.model_name = getattr(settings, 'EMBEDDING_SERVER_MODEL', 'bge-m3')
+        self.model_version = getattr(settings, 'EMBEDDING_MODEL_VERSION', '1')
+        # --force re-embeds everything and needs its own resume point
+        self.cursor_name = 'add_embeddings_force' if force else 'add_embeddings'
+
+    def get_queryset(self):
+        """Chunks this backfill targets"""
+        # Shared-vector duplicates use their canonical chunk's embedding
+        queryset = DocumentChunk.objects.filter(canonical_chunk__isnull=True)
+        if self.chunk_id:
+            queryset = queryset.filter(id=self.chunk_id)
+        if not self.force:
+            queryset = queryset.filter(embedding__isnull=True)
+        return queryset
+
+    def _is_stale(self, cursor: EmbeddingBackfillCursor) -> bool:
+        return (
+            cursor.completed_at is not None
+            or cursor.model_name != self.model_name
+            or cursor.model_version != self.model_version
+        )
+
+    def load_cursor(self, restart: bool = False) -> Optional[EmbeddingBackfillCursor]:
+        """
+        Resume point of the previous run. A finished run, a different model
+        version or restart=True start from the beginning; single-chunk runs
+        are not tracked.
+        """
+        if self.chunk_id:
+            return None
+
+        cursor, created = EmbeddingBackfillCursor.objects.get_or_create(
+            name=self.cursor_name,
+            defaults={'model_name': self.model_name, 'model_version': self.model_version},
+        )
+        if not created and (restart or self._is_stale(cursor)):
+            cursor.model_name = self.model_name
+            cursor.model_version = self.model_version
+            cursor.last_chunk_id = 0
+            cursor.processed = 0
+            cursor.errors = 0
+            cursor.started_at = timezone.now()
+            cursor.completed_at = None
+            cursor.save()
+        return cursor
+
+    def _iter_batches(self, queryset, start_after: int) -> Iterator[List[Tuple[int, str]]]:
+        """(id, content) batches in id order, one primary key range at a time"""
+        window = self.batch_size * self.workers * 4
+        last_id = start_after
+        while True:
+            rows = queryset.filter(id__gt=last_id).order_by('id').values_list('id', 'content')[:window]
+            batch = []
+            count = 0
+            for chunk_id, content in rows.iterator(chunk_size=self.batch_size):
+                batch.append((chunk_id, content))
+                last_id = chunk_id
+                count += 1
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            if count < window:
+                return
+
+    def _process_batch(self, batch: List[Tuple[int, str]]) -> Tuple[int, int]:
+        """Embed and write one batch in a worker thread, returns (written, failed)"""
+        try:
+            embeddings = embedding_client.embed([content for _, content in batch])
+            rows = [
+                (chunk_id, normalize_embedding(fit_embedding_dimensions(embedding)))
+                for (chunk_id, _), embedding in zip(batch, embeddings)
+            ]
+            return write_embeddings(rows), 0
+        except Exception as e:
+            logger.error(f"Embedding backfill failed for chunks {batch[0][0]}-{batch[-1][0]}: {e}")
+            return 0, len(batch)
+        finally:
+            connection.close()
+
+    def count_pending(self, restart: bool = False) -> Tuple[int, int]:
+        """(resume point, chunks left) for the next run, without touching the cursor"""
+        start_after = 0
+        if not self.chunk_id and not restart:
+            cursor = EmbeddingBackfillCursor.objects.filter(name=self.cursor_name).first()
+            if cursor is not None and not self._is_stale(cursor):
+                start_after = cursor.last_chunk_id
+        return start_after, self.get_queryset().filter(id__gt=start_after).count()
+
+    def run(
+        self,
+        restart: bool = False,
+        on_progress: Callable[[Dict], None] = None,
+        progress_interval: float = 5.0,
+    ) -> Dict:
+        """Backfill all target chunks; on_progress receives progress dicts while running"""
+        cursor = self.load_cursor(restart=restart)
+        start_after = cursor.last_chunk_id if cursor else 0
+        total = self.get_queryset().filter(id__gt=start_after).count()
+
+        state = {
+            'total': total,
+            'processed': 0,
+            'errors': 0,
+            'resumed_from': start_after,
+            'last_chunk_id': start_after,
+            'cursor_held': False,
+            'started': time.monotonic(),
+        }
+        last_report = state['started']
+        max_pending = self.workers * 2
+        pending = deque()
+
+        def complete(entry):
+            nonlocal last_report
+            last_id, future = entry
+            written, failed = future.result()
+            state['processed'] += written
+            state['errors'] += failed
+            state['last_chunk_id'] = last_id
+            if failed and self.force:
+                # Failed chunks keep their old vector; the next --force run resumes here
+                state['cursor_held'] = True
+            if cursor is not None:
+                if not state['cursor_held']:
+                    cursor.last_chunk_id = last_id
+                cursor.processed += written
+                cursor.errors += failed
+                cursor.save(update_fields=['last_chunk_id', 'processed', 'errors', 'updated_at'])
+
+            now = time.monotonic()
+            if on_progress and now - last_report >= progress_interval:
+                last_report = now
+                on_progress(self.get_progress(state))
+
+        queryset = self.get_queryset()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='embedding-backfill') as pool:
+            for batch in self._iter_batches(queryset, start_after):
+                pending.append((batch[-1][0], pool.submit(self._process_batch, batch)))
+                while pending and (len(pending) > max_pending or pending[0][1].done()):
+                    complete(pending.popleft())
+            while pending:
+                complete(pending.popleft())
+
+        if cursor is not None and not state['cursor_held']:
+            cursor.completed_at = timezone.now()
+            cursor.save(update_fields=['completed_at', 'updated_at'])
+
+        return self.get_progress(state)
+
+    def get_progress(self, state: Dict) -> Dict:
+        """Counts, throughput (chunks/s) and ETA for a run state"""
+        elapsed = time.monotonic() - state['started']
+        done = state['processed'] + state['errors']
+        rate = state['processed'] / elapsed if elapsed > 0 else 0.0
+        remaining = max(state['total'] - done, 0)
+        return {
+            'total': state['total'],
+            'processed': state['processed'],
+            'errors': state['errors'],
+            'remaining': remaining,
+            'resumed_from': state['resumed_from'],
+            'last_chunk_id': state['last_chunk_id'],
+            'elapsed_seconds': round(elapsed, 1),
+            'chunks_per_second': round(rate, 1),
+            'eta_seconds': round(remaining / rate) if rate > 0 else None,
+        }
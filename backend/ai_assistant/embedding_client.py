@@ -0,0 +1,150 @@
+"""
+Embedding Client - the single entry point for BGE-M3 embeddings
+
+All embedding callers (RAG services, the automatic file processor and the
+management commands) go through embedding_client. Requests are sent to the
+local embedding server (see embedding_server.py / run_embedding_server),
+which coalesces concurrent requests from web and Celery workers into
+micro-batches. If the server is not running, the client talks to Ollama's
+batched /api/embed endpoint directly, so nothing breaks when the server is
+disabled (EMBEDDING_SERVER_URL=''). Results are kept in the durable
+embedding store (embedding_store.py).
+"""
+import logging
+import threading
+import time
+from typing import List
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingError(Exception):
+    """Raised when embeddings cannot be produced"""
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """requests.Session with keep-alive connection pooling"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class OllamaEmbeddingBackend:
+    """Batched BGE-M3 embeddings from Ollama's /api/embed endpoint"""
+
+    def __init__(self, ollama_url: str = None, model: str = None, session: requests.Session = None):
+        self.ollama_url = ollama_url or getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
+        self.model = model or getattr(settings, 'EMBEDDING_SERVER_MODEL', 'bge-m3')
+        self.session = session or create_http_session()
+        self.timeout = getattr(settings, 'EMBEDDING_CLIENT_TIMEOUT', 120)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.session.post(
+            f"{self.ollama_url}/api/embed",
+            json={"model": self.model, "input": texts},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise EmbeddingError(f"Received {len(embeddings)} embeddings for {len(texts)} texts")
+        return embeddings
+
+
+class EmbeddingClient:
+    """Client for the local embedding server with direct-to-Ollama fallback"""
+
+    def __init__(self):
+        self.server_url = getattr(settings, 'EMBEDDING_SERVER_URL', 'http://127.0.0.1:8765').rstrip('/')
+        self.timeout = getattr(settings, 'EMBEDDING_CLIENT_TIMEOUT', 120)
+        self.max_retries = 3
+        # After a failed server call, skip the server for this long
+        self.server_retry_after = getattr(settings, 'EMBEDDING_SERVER_RETRY_AFTER', 30)
+        self._server_down_until = 0.0
+        self._lock = threading.Lock()
+        self.session = create_http_session()
+        self.direct_backend = OllamaEmbeddingBackend(session=self.session)
+
+    def _server_available(self) -> bool:
+        return bool(self.server_url) and time.monotonic() >= self._server_down_until
+
+    def _embed_via_server(self, texts: List[str]) -> List[List[float]]:
+        response = self.session.post(
+            f"{self.server_url}/embed",
+            json={"texts": texts},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise EmbeddingError(f"Received {len(embeddings)} embeddings for {len(texts)} texts")
+        return embeddings
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in input order; raises EmbeddingError on failure
+
+        Reads through the durable embedding store: only texts that were never
+        embedded by the current model version reach the model.
+        """
+        if not texts:
+            return []
+
+        from .embedding_store import embedding_store
+
+        try:
+            results = embedding_store.get_many(texts)
+        except Exception as e:
+            logger.warning(f"Embedding store lookup failed, embedding all texts: {e}")
+            results = [None] * len(texts)
+
+        misses = [idx for idx, embedding in enumerate(results) if embedding is None]
+        if not misses:
+            return results
+
+        miss_texts = [texts[idx] for idx in misses]
+        embeddings = self._embed_uncached(miss_texts)
+        for idx, embedding in zip(misses, embeddings):
+            results[idx] = embedding
+
+        try:
+            embedding_store.put_many(miss_texts, embeddings)
+        except Exception as e:
+            logger.warning(f"Failed to store {len(embeddings)} embeddings: {e}")
+        return results
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the model (server first, then Ollama directly)"""
+        if self._server_available():
+            try:
+                return self._embed_via_server(texts)
+            except requests.exceptions.ConnectionError as e:
+                with self._lock:
+                    self._server_down_until = time.monotonic() + self.server_retry_after
+                logger.warning(f"Embedding server unreachable, using Ollama directly for {self.server_retry_after}s: {e}")
+            except Exception as e:
+                logger.warning(f"Embedding server request failed, using Ollama directly: {e}")
+
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return self.direct_backend.embed(texts)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"BGE-M3 embedding attempt {attempt}/{self.max_retries} failed: {e}")
+                if attempt < self.max_retries:
+                    time.sleep(2 ** (attempt - 1))
+
+        raise EmbeddingError(f"BGE-M3 embedding failed after {self.max_retries} attempts: {last_error}")
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text"""
+        return self.embed([text])[0]
+
+
+# Global instance
+embedding_client = EmbeddingClient()
@@ -0,0 +1,214 @@
+"""
+Local Embedding Server
+
+A small localhost HTTP server that owns BGE-M3 inference for every Django
+and Celery process on the host:
+- POST /embed    {"texts": [...]} -> {"embeddings": [[...], ...], "model": ...}
+- GET  /metrics  throughput, batch size, latency and queue depth
+- GET  /health
+
+Concurrent requests are coalesced by MicroBatcher into dynamic micro-batches
+(up to max_batch_size texts, waiting at most max_wait_ms for more work) and
+sent to the backend in one call. Started with: manage.py run_embedding_server
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from .embedding_client import EmbeddingError, OllamaEmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+
+class SentenceTransformerBackend:
+    """BGE-M3 loaded in the server process with sentence-transformers"""
+
+    def __init__(self, model_name: str = 'BAAI/bge-m3', device: str = 'cpu'):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device=device)
+        self.model_name = model_name
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True)
+        return embeddings.tolist()
+
+
+class _PendingRequest:
+    """One caller's texts waiting in the batch queue"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Coalesces concurrent embedding requests into backend batches"""
+
+    def __init__(self, backend, max_batch_size: int = 64, max_wait_ms: int = 10, max_queue: int = 1000):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue(maxsize=max_queue)
+        self.started_at = time.monotonic()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'requests_total': 0,
+            'texts_total': 0,
+            'batches_total': 0,
+            'errors_total': 0,
+            'backend_seconds_total': 0.0,
+            'queue_wait_seconds_total': 0.0,
+            'last_batch_size': 0,
+            'last_batch_latency_ms': 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str], timeout: float = 120) -> List[List[float]]:
+        """Queue texts and block until their embeddings are ready"""
+        pending = _PendingRequest(texts)
+        try:
+            self.requests.put(pending, timeout=timeout)
+        except queue.Full:
+            raise EmbeddingError("Embedding queue is full")
+
+        if not pending.done.wait(timeout):
+            raise EmbeddingError(f"Embedding request timed out after {timeout}s")
+        if pending.error is not None:
+            raise EmbeddingError(str(pending.error))
+        return pending.embeddings
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        """Block for the first request, then gather more until full or max_wait passes"""
+        batch = [self.requests.get()]
+        text_count = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while text_count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            text_count += len(pending.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.monotonic()
+            texts = [text for pending in batch for text in pending.texts]
+
+            try:
+                embeddings = []
+                # Oversized requests are split so no backend call exceeds max_batch_size
+                for start in range(0, len(texts), self.max_batch_size):
+                    embeddings.extend(self.backend.embed(texts[start:start + self.max_batch_size]))
+
+                offset = 0
+                for pending in batch:
+                    pending.embeddings = embeddings[offset:offset + len(pending.texts)]
+                    offset += len(pending.texts)
+                error = None
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for pending in batch:
+                    pending.error = e
+                error = e
+
+            latency = time.monotonic() - started
+            with self._metrics_lock:
+                self._metrics['requests_total'] += len(batch)
+                self._metrics['texts_total'] += len(texts)
+                self._metrics['batches_total'] += 1
+                self._metrics['errors_total'] += 1 if error else 0
+                self._metrics['backend_seconds_total'] += latency
+                self._metrics['queue_wait_seconds_total'] += sum(started - p.enqueued_at for p in batch)
+                self._metrics['last_batch_size'] = len(texts)
+                self._metrics['last_batch_latency_ms'] = latency * 1000
+
+            for pending in batch:
+                pending.done.set()
+
+    def get_metrics(self) -> Dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        uptime = time.monotonic() - self.started_at
+        batches = metrics['batches_total'] or 1
+        requests_total = metrics['requests_total'] or 1
+        metrics.update({
+            'uptime_seconds': round(uptime, 1),
+            'queue_depth': self.requests.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'avg_batch_size': round(metrics['texts_total'] / batches, 2),
+            'avg_batch_latency_ms': round(metrics['backend_seconds_total'] / batches * 1000, 2),
+            'avg_queue_wait_ms': round(metrics['queue_wait_seconds_total'] / requests_total * 1000, 2),
+            'texts_per_second': round(metrics['texts_total'] / uptime, 2) if uptime > 0 else 0.0,
+        })
+        return metrics
+
+
+def create_embedding_server(host: str, port: int, batcher: MicroBatcher, model_name: str) -> ThreadingHTTPServer:
+    """HTTP server whose handler threads feed the shared MicroBatcher"""
+
+    class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send_json(200, batcher.get_metrics())
+            elif self.path == '/health':
+                self._send_json(200, {'status': 'ok', 'model': model_name})
+            else:
+                self._send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/embed':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                texts = json.loads(self.rfile.read(length)).get('texts')
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    self._send_json(400, {'error': "'texts' must be a list of strings"})
+                    return
+                embeddings = batcher.submit(texts) if texts else []
+                self._send_json(200, {'embeddings': embeddings, 'model': model_name})
+            except EmbeddingError as e:
+                self._send_json(503, {'error': str(e)})
+            except Exception as e:
+                logger.error(f"Embedding request failed: {e}")
+                self._send_json(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    server = ThreadingHTTPServer((host, port), EmbeddingRequestHandler)
+    server.daemon_threads = True
+    return server
+
+
+def create_backend(backend_name: str, model_name: str, device: str = 'cpu'):
+    """Backend that actually runs BGE-M3 inference"""
+    if backend_name == 'sentence-transformers':
+        return SentenceTransformerBackend(model_name, device=device)
+    if backend_name == 'ollama':
+        return OllamaEmbeddingBackend(model=model_name)
+    raise ValueError(f"Unknown embedding backend: {backend_name}")
@@ -0,0 +1,155 @@
+"""
+Durable Embedding Store
+
+Embeddings are deterministic for a given model, so they are kept for good
+instead of expiring from Redis after EMBEDDING_CACHE_TTL:
+- PostgreSQL (EmbeddingCacheEntry) holds one little-endian float32 vector
+  per (model name, model version, normalised text hash)
+- an in-process LRU (EMBEDDING_STORE_LRU_SIZE entries, packed by
+  cache_codec as float32 or CACHE_VECTOR_DTYPE='float16' bytes) sits in
+  front of it for hot texts such as popular queries
+
+EmbeddingClient.embed() reads through the store, so re-ingests
+(reprocess_pdfs, add_embeddings --force) and repeated queries only pay the
+model cost for text it has never seen. Bump EMBEDDING_MODEL_VERSION when the
+model behind EMBEDDING_SERVER_MODEL changes; old entries are then ignored
+(and can be removed with: manage.py embedding_store --prune).
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+import numpy as np
+from django.conf import settings
+from .chunk_writer import chunk_content_hash
+from .cache_codec import cache_codec
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def encode_vector(embedding: Sequence[float]) -> bytes:
+    return np.asarray(embedding, dtype=VECTOR_DTYPE).tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(bytes(data), dtype=VECTOR_DTYPE).tolist()
+
+
+class EmbeddingStore:
+    """PostgreSQL embedding store with an in-process LRU front tier"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'EMBEDDING_STORE_ENABLED', True)
+        self.model_name = getattr(settings, 'EMBEDDING_SERVER_MODEL', 'bge-m3')
+        self.model_version = getattr(settings, 'EMBEDDING_MODEL_VERSION', '1')
+        self.lru_size = getattr(settings, 'EMBEDDING_STORE_LRU_SIZE', 4096)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'writes': 0}
+
+    def _lru_get(self, text_hash: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._lru.get(text_hash)
+            if data is not None:
+                self._lru.move_to_end(text_hash)
+            return data
+
+    def _lru_put(self, text_hash: str, data: bytes):
+        if self.lru_size <= 0:
+            return
+        with self._lock:
+            self._lru[text_hash] = data
+            self._lru.move_to_end(text_hash)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Stored embedding of each text, None where it has not been embedded yet"""
+        from .models import EmbeddingCacheEntry
+
+        results = [None] * len(texts)
+        if not self.enabled or not texts:
+            return results
+
+        hashes = [chunk_content_hash(text) for text in texts]
+        missing = {}
+        for idx, text_hash in enumerate(hashes):
+            data = self._lru_get(text_hash)
+            if data is not None:
+                results[idx] = cache_codec.decode_vector(data)
+                self.stats['lru_hits'] += 1
+            else:
+                missing.setdefault(text_hash, []).append(idx)
+
+        if missing:
+            rows = EmbeddingCacheEntry.objects.filter(
+                model_name=self.model_name,
+                model_version=self.model_version,
+                text_hash__in=list(missing),
+            ).values_list('text_hash', 'vector')
+            for text_hash, data in rows:
+                vector = decode_vector(data)
+                self._lru_put(text_hash, cache_codec.encode_vector(vector))
+                for idx in missing.pop(text_hash):
+                    results[idx] = list(vector)
+                    self.stats['db_hits'] += 1
+            self.stats['misses'] += sum(len(indexes) for indexes in missing.values())
+
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store freshly computed embeddings (existing entries are left as they are)"""
+        from .models import EmbeddingCacheEntry
+
+        if not self.enabled or not texts:
+            return
+
+        entries = {}
+        for text, embedding in zip(texts, embeddings):
+            text_hash = chunk_content_hash(text)
+            data = encode_vector(embedding)
+            self._lru_put(text_hash, cache_codec.encode_vector(embedding))
+            entries[text_hash] = EmbeddingCacheEntry(
+                model_name=self.model_name,
+                model_version=self.model_version,
+                text_hash=text_hash,
+                dimensions=len(embedding),
+                vector=data,
+            )
+
+        EmbeddingCacheEntry.objects.bulk_create(list(entries.values()), batch_size=500, ignore_conflicts=True)
+        self.stats['writes'] += len(entries)
+
+    def get_status(self) -> dict:
+        from .models import EmbeddingCacheEntry
+
+        with self._lock:
+            lru_entries = len(self._lru)
+        return {
+            'model_name': self.model_name,
+            'model_version': self.model_version,
+            'entries': EmbeddingCacheEntry.objects.filter(
+                model_name=self.model_name, model_version=self.model_version
+            ).count(),
+            'stale_entries': EmbeddingCacheEntry.objects.exclude(
+                model_name=self.model_name, model_version=self.model_version
+            ).count(),
+            'lru_entries': lru_entries,
+            'lru_size': self.lru_size,
+            **self.stats,
+        }
+
+    def prune(self) -> int:
+        """Delete entries of other models / model versions"""
+        from .models import EmbeddingCacheEntry
+
+        deleted, _ = EmbeddingCacheEntry.objects.exclude(
+            model_name=self.model_name, model_version=self.model_version
+        ).delete()
+        return deleted
+
+
+# Global instance
+embedding_store = EmbeddingStore()
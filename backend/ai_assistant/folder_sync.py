@@ -0,0 +1,381 @@
+"""
+Incremental Folder Sync
+
+Re-scanning a watched folder used to walk and stat the whole tree and
+re-hash every file. A FolderManifest per root records each directory's
+mtime and each file's size, mtime, inode and content hash, so a rescan:
+- does not list directories whose mtime is unchanged (their files and
+  subdirectories are taken from the manifest; subdirectories are still
+  checked, one stat each)
+- only hashes files whose size/mtime/inode changed, and recognises renames
+  (same inode, size and mtime under a new path) without hashing at all
+- reports new, modified, moved and deleted files
+
+A directory's mtime changes when entries are added, removed or renamed in
+it, which covers copies, rsync and most editors (write to a temporary file,
+then rename). Files rewritten in place are only seen by a full scan
+(full=True), which lists and stats every directory.
+
+A root that cannot be accessed is an error, not an empty folder; a
+directory that cannot be listed (permissions, a flaky share) keeps its
+whole subtree from the manifest. check_deletions() refuses a scan that
+would delete most of a folder's files (an unmounted share that still
+exists as an empty mount point) unless the caller allows it.
+
+scan() does not touch the database; commit() stores the result, so a
+caller can apply the changes and store the manifest in one transaction.
+sync_folder() is the generic caller: it imports new and modified files
+through a BulkImportJob and deletes the records of removed files.
+"""
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import DocumentChunk, DocumentFile, FolderManifest, FolderManifestEntry, UploadedFile
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class FolderSyncError(Exception):
+    """The folder cannot be scanned, or its scan must not be applied"""
+
+
+def check_deletions(scan: Dict, allow_mass_delete: bool = False):
+    """
+    Raise FolderSyncError if the scan deletes more than
+    FOLDER_SYNC_MAX_DELETE_FRACTION of the known files (and at least
+    FOLDER_SYNC_MASS_DELETE_MIN of them), unless allow_mass_delete is set.
+    """
+    deleted = len(scan['deleted'])
+    known = scan['stats']['known']
+    max_fraction = getattr(settings, 'FOLDER_SYNC_MAX_DELETE_FRACTION', 0.5)
+    min_count = getattr(settings, 'FOLDER_SYNC_MASS_DELETE_MIN', 10)
+    if allow_mass_delete or deleted < min_count or deleted <= known * max_fraction:
+        return
+    raise FolderSyncError(
+        f"Scan would delete {deleted} of {known} known files; refusing "
+        f"(check that the folder is mounted, or allow mass deletion)"
+    )
+
+
+class FolderSync:
+    """Manifest-backed incremental scanner for one folder"""
+
+    def __init__(
+        self,
+        root: str,
+        extensions: Optional[Iterable[str]] = None,
+        recursive: bool = True,
+        hash_algorithm: str = 'sha256',
+    ):
+        self.root = os.path.abspath(root)
+        self.extensions = {ext.lower() for ext in extensions} if extensions else None
+        self.recursive = recursive
+        self.hash_algorithm = hash_algorithm
+
+    def _wanted(self, filename: str) -> bool:
+        return self.extensions is None or os.path.splitext(filename)[1].lower() in self.extensions
+
+    def hash_file(self, path: str) -> str:
+        digest = hashlib.new(self.hash_algorithm)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def absolute_path(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+
+    def get_manifest(self) -> FolderManifest:
+        manifest, _ = FolderManifest.objects.get_or_create(
+            root=self.root, defaults={'hash_algorithm': self.hash_algorithm}
+        )
+        if manifest.hash_algorithm != self.hash_algorithm:
+            raise ValueError(
+                f"Manifest for {self.root} uses {manifest.hash_algorithm}, not {self.hash_algorithm}"
+            )
+        return manifest
+
+    def get_entries(self, manifest: FolderManifest):
+        return manifest.entries.select_related('uploaded_file')
+
+    def scan(self, full: bool = False, hash_new: bool = True) -> Dict:
+        """
+        Compare the folder with its manifest.
+
+        Returns a dict with 'new', 'modified' and 'moved' (unsaved or updated
+        FolderManifestEntry objects; modified entries carry previous_hash,
+        moved entries old_path), 'deleted'
+        (stored entries), 'entries' (every current entry, by path) and scan
+        'stats'. hash_new=False leaves new files unhashed (for previews that
+        are not committed).
+        """
+        manifest = self.get_manifest()
+        known = {entry.path: entry for entry in self.get_entries(manifest)}
+        known_by_dir = defaultdict(list)
+        for path, entry in known.items():
+            known_by_dir[entry.directory].append(path)
+
+        old_dirs = {} if full else manifest.directories
+        new_dirs = {}
+        listed = {}  # path -> (size, mtime_ns, inode) for files of listed directories
+        carried = set()  # paths of files in unchanged directories
+        stats = {
+            'known': len(known),
+            'directories': 0,
+            'directories_listed': 0,
+            'directories_unreadable': 0,
+            'files_stat': 0,
+            'files_hashed': 0,
+        }
+
+        def carry_subtree(rel_dir: str):
+            """Keep everything the manifest knows below an unreadable directory"""
+            stats['directories_unreadable'] += 1
+            prefix = os.path.join(rel_dir, '') if rel_dir else ''
+            carried.update(path for path in known if path.startswith(prefix))
+            for directory, info in manifest.directories.items():
+                if directory == rel_dir or directory.startswith(prefix):
+                    new_dirs[directory] = info
+
+        pending_dirs = ['']
+        while pending_dirs:
+            rel_dir = pending_dirs.pop()
+            try:
+                dir_mtime_ns = os.stat(self.absolute_path(rel_dir)).st_mtime_ns
+            except OSError as e:
+                if not rel_dir:
+                    raise FolderSyncError(f"Cannot access {self.root}: {e}") from e
+                if isinstance(e, FileNotFoundError):
+                    continue  # Removed: its files are reported as deleted
+                logger.warning(f"Cannot stat {self.absolute_path(rel_dir)}: {e}")
+                carry_subtree(rel_dir)
+                continue
+            stats['directories'] += 1
+
+            previous = old_dirs.get(rel_dir)
+            if previous is not None and previous['mtime_ns'] == dir_mtime_ns:
+                # Same entries as last time: no listing, no file stats
+                new_dirs[rel_dir] = previous
+                carried.update(known_by_dir.get(rel_dir, []))
+                subdirs = previous['subdirs']
+            else:
+                stats['directories_listed'] += 1
+                subdirs = []
+                try:
+                    with os.scandir(self.absolute_path(rel_dir)) as it:
+                        for dir_entry in it:
+                            if dir_entry.is_dir(follow_symlinks=False):
+                                subdirs.append(dir_entry.name)
+                            elif dir_entry.is_file() and self._wanted(dir_entry.name):
+                                stat = dir_entry.stat()
+                                stats['files_stat'] += 1
+                                path = os.path.join(rel_dir, dir_entry.name)
+                                listed[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                except OSError as e:
+                    logger.warning(f"Cannot list {self.absolute_path(rel_dir)}: {e}")
+                    carry_subtree(rel_dir)
+                    continue
+                subdirs.sort()
+                new_dirs[rel_dir] = {'mtime_ns': dir_mtime_ns, 'subdirs': subdirs}
+
+            if self.recursive:
+                pending_dirs.extend(os.path.join(rel_dir, name) for name in subdirs)
+
+        deleted = {path: entry for path, entry in known.items() if path not in listed and path not in carried}
+        deleted_by_identity = {(entry.inode, entry.size, entry.mtime_ns): entry for entry in deleted.values()}
+
+        new, modified, moved = [], [], []
+        entries = {path: known[path] for path in carried}
+        for path, (size, mtime_ns, inode) in listed.items():
+            entry = known.get(path)
+            if entry is not None and (entry.size, entry.mtime_ns, entry.inode) == (size, mtime_ns, inode):
+                entries[path] = entry
+                continue
+
+            if entry is None:
+                previous = deleted_by_identity.pop((inode, size, mtime_ns), None)
+                if previous is not None and deleted.pop(previous.path, None) is not None:
+                    # Renamed: same file, new path - keep its hash and import
+                    previous.old_path = previous.path
+                    previous.path = path
+                    previous.directory = os.path.dirname(path)
+                    moved.append(previous)
+                    entries[path] = previous
+                    continue
+                if not hash_new:
+                    entry = FolderManifestEntry(
+                        manifest=manifest, path=path, directory=os.path.dirname(path), content_hash='',
+                        size=size, mtime_ns=mtime_ns, inode=inode,
+                    )
+                    new.append(entry)
+                    entries[path] = entry
+                    continue
+
+            try:
+                content_hash = self.hash_file(self.absolute_path(path))
+            except OSError as e:
+                logger.warning(f"Cannot hash {self.absolute_path(path)}: {e}")
+                if entry is not None:
+                    entries[path] = entry
+                continue
+            stats['files_hashed'] += 1
+
+            if entry is None:
+                entry = FolderManifestEntry(
+                    manifest=manifest, path=path, directory=os.path.dirname(path), content_hash=content_hash
+                )
+                new.append(entry)
+            elif entry.content_hash != content_hash:
+                entry.previous_hash = entry.content_hash
+                entry.content_hash = content_hash
+                modified.append(entry)
+            # else: touched but identical content, only the stat fields change
+            entry.size, entry.mtime_ns, entry.inode = size, mtime_ns, inode
+            entry._stat_changed = True
+            entries[path] = entry
+
+        stats.update({
+            'new': len(new),
+            'modified': len(modified),
+            'moved': len(moved),
+            'deleted': len(deleted),
+            'unchanged': len(entries) - len(new) - len(modified) - len(moved),
+        })
+        return {
+            'manifest': manifest,
+            'directories': new_dirs,
+            'entries': entries,
+            'new': new,
+            'modified': modified,
+            'moved': moved,
+            'deleted': list(deleted.values()),
+            'stats': stats,
+        }
+
+    def commit(self, scan: Dict):
+        """Store a scan result as the folder's manifest"""
+        manifest = scan['manifest']
+        new_ids = {id(entry) for entry in scan['new']}
+        changed = [
+            entry for entry in scan['entries'].values()
+            if id(entry) not in new_ids and (getattr(entry, '_stat_changed', False) or hasattr(entry, 'old_path'))
+        ]
+
+        with transaction.atomic():
+            if scan['deleted']:
+                FolderManifestEntry.objects.filter(id__in=[entry.id for entry in scan['deleted']]).delete()
+            FolderManifestEntry.objects.bulk_update(
+                changed,
+                ['path', 'directory', 'size', 'mtime_ns', 'inode', 'content_hash', 'uploaded_file'],
+                batch_size=500,
+            )
+            FolderManifestEntry.objects.bulk_create(scan['new'], batch_size=500)
+            manifest.directories = scan['directories']
+            manifest.file_count = len(scan['entries'])
+            manifest.last_scan_at = timezone.now()
+            manifest.save(update_fields=['directories', 'file_count', 'last_scan_at'])
+
+
+def delete_imported_file(uploaded_file: UploadedFile):
+    """Remove an imported file with its document records and chunks"""
+    DocumentChunk.objects.filter(document_file__uploaded_file=uploaded_file).delete()
+    DocumentFile.objects.filter(uploaded_file=uploaded_file).delete()
+    uploaded_file.delete()  # Chunks cascade
+
+
+def sync_folder(
+    root: str,
+    user=None,
+    extensions: Optional[Iterable[str]] = None,
+    full: bool = False,
+    allow_mass_delete: bool = False,
+) -> Dict:
+    """
+    Bring the imported copy of a folder up to date: new and modified files
+    are (re)imported through a BulkImportJob, removed files are deleted
+    together with their chunks, renamed files keep their import. Raises
+    FolderSyncError (changing nothing) if the root is inaccessible or the
+    scan would delete most of the folder (see check_deletions).
+    """
+    from .bulk_import import start_bulk_import
+
+    folder = FolderSync(root, extensions=extensions)
+    scan = folder.scan(full=full)
+    check_deletions(scan, allow_mass_delete)
+    summary = dict(scan['stats'], duplicates=0, skipped=0, bulk_import_job_id=None)
+    filename_length = UploadedFile._meta.get_field('filename').max_length
+    to_import = []
+
+    with transaction.atomic():
+        for entry in scan['deleted']:
+            if entry.uploaded_file_id:
+                delete_imported_file(entry.uploaded_file)
+
+        for entry in scan['moved']:
+            uploaded_file = entry.uploaded_file
+            if uploaded_file and uploaded_file.filename == folder.absolute_path(entry.old_path):
+                uploaded_file.filename = folder.absolute_path(entry.path)
+                uploaded_file.save(update_fields=['filename'])
+
+        for entry in scan['new'] + scan['modified']:
+            file_path = folder.absolute_path(entry.path)
+            existing = UploadedFile.objects.filter(file_hash=entry.content_hash).first()
+            uploaded_file = entry.uploaded_file
+
+            if existing is not None and existing.id != entry.uploaded_file_id:
+                # Same content is already imported from elsewhere
+                if uploaded_file is not None:
+                    delete_imported_file(uploaded_file)
+                entry.uploaded_file = None
+                summary['duplicates'] += 1
+                continue
+
+            if uploaded_file is None:
+                if len(file_path) > filename_length:
+                    logger.warning(f"Path too long to import, skipping: {file_path}")
+                    summary['skipped'] += 1
+                    continue
+                uploaded_file = UploadedFile.objects.create(
+                    filename=file_path,  # Full path, resolved by AutomaticFileProcessor._get_file_path
+                    file_hash=entry.content_hash,
+                    file_size=entry.size,
+                    uploaded_by=user,
+                    processing_status='queued',
+                )
+                entry.uploaded_file = uploaded_file
+            else:
+                # Modified: drop the old chunks and process the new content from scratch
+                DocumentChunk.objects.filter(uploaded_file=uploaded_file).delete()
+                uploaded_file.file_hash = entry.content_hash
+                uploaded_file.file_size = entry.size
+                uploaded_file.processing_status = 'queued'
+                uploaded_file.processing_error = None
+                uploaded_file.metadata_extracted = False
+                uploaded_file.chunks_created = False
+                uploaded_file.embeddings_created = False
+                uploaded_file.chunk_count = 0
+                uploaded_file.embedding_count = 0
+                uploaded_file.last_committed_chunk_index = -1
+                uploaded_file.save()
+            to_import.append(uploaded_file.id)
+
+        folder.commit(scan)
+
+        if to_import:
+            job = start_bulk_import(to_import, user=user)
+            summary['bulk_import_job_id'] = job.id
+
+    logger.info(
+        f"Folder sync {folder.root}: {summary['new']} new, {summary['modified']} modified, "
+        f"{summary['moved']} moved, {summary['deleted']} deleted, {summary['unchanged']} unchanged "
+        f"({summary['directories_listed']}/{summary['directories']} directories listed, "
+        f"{summary['files_hashed']} files hashed)"
+    )
+    return summary
@@ -1,113 +1,62 @@
 """
 Hybrid Search Implementation combining BM25 and Vector Similarity
 """
-import math
 import re
 import logging
 from typing import List, Dict, Tuple, Optional
-from collections import defaultdict, Counter
-from django.db import connection
-from django.core.cache import cache
-import hashlib
 import numpy as np
+from django.conf import settings
+from .bm25_index import BM25Index, tokenize
+from .retrieval_core import lexical_retriever
 
 logger = logging.getLogger(__name__)
 
+def minmax_normalize(scores) -> np.ndarray:
+    """Normalize a score vector to 0-1 (constant input maps to all ones)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    
+    min_score = scores.min()
+    score_range = scores.max() - min_score
+    
+    if score_range == 0:
+        return np.ones_like(scores)
+    
+    return (scores - min_score) / score_range
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first
+    
+    argpartition selects the top k in linear time; only those k are sorted.
+    """
+    k = max(0, min(k, scores.size))
+    if k == 0:
+        return np.array([], dtype=np.intp)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
 class BM25Scorer:
-    """BM25 (Best Matching 25) algorithm for keyword-based relevance scoring"""
+    """BM25 (Best Matching 25) algorithm for keyword-based relevance scoring
+    
+    Term statistics come from the persistent inverted index (bm25_index), so
+    scoring reads only the postings of the query terms for the candidates.
+    """
     
     def __init__(self, k1: float = 1.5, b: float = 0.75):
-        self.k1 = k1  # Term frequency saturation parameter
-        self.b = b    # Length normalization parameter
-        self.corpus_stats = None
-        self.doc_frequencies = None
-        self.avg_doc_length = 0
+        self.index = BM25Index(k1=k1, b=b)
         
     def preprocess_text(self, text: str) -> List[str]:
         """Preprocess text for BM25 scoring"""
-        # Convert to lowercase and extract words
-        text = text.lower()
-        # Remove punctuation and split on whitespace
-        words = re.findall(r'\b[a-zA-Z]{2,}\b', text)
-        return words
-    
-    def build_corpus_stats(self, documents: List[Dict]):
-        """Build corpus statistics for BM25 scoring"""
-        cache_key = "bm25_corpus_stats"
-        cached_stats = cache.get(cache_key)
-        
-        if cached_stats:
-            self.corpus_stats, self.doc_frequencies, self.avg_doc_length = cached_stats
-            return
-        
-        logger.info("Building BM25 corpus statistics...")
-        
-        # Document frequencies: how many documents contain each term
-        doc_frequencies = defaultdict(int)
-        doc_lengths = []
-        total_docs = len(documents)
-        
-        for doc in documents:
-            content = doc.get('content', '')
-            words = self.preprocess_text(content)
-            doc_lengths.append(len(words))
-            
-            # Count unique terms in this document
-            unique_terms = set(words)
-            for term in unique_terms:
-                doc_frequencies[term] += 1
-        
-        self.doc_frequencies = dict(doc_frequencies)
-        self.avg_doc_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0
-        self.corpus_stats = {
-            'total_docs': total_docs,
-            'doc_lengths': doc_lengths,
-            'avg_doc_length': self.avg_doc_length
-        }
-        
-        # Cache for 1 hour
-        cache.set(cache_key, (self.corpus_stats, self.doc_frequencies, self.avg_doc_length), 3600)
-        logger.info(f"Built BM25 stats: {total_docs} docs, avg length: {self.avg_doc_length:.1f}")
+        return tokenize(text)
     
-    def score_document(self, query_terms: List[str], document: Dict, doc_index: int) -> float:
-        """Calculate BM25 score for a document given query terms"""
-        if not self.corpus_stats:
-            return 0.0
-        
-        content = document.get('content', '')
-        doc_words = self.preprocess_text(content)
-        doc_length = len(doc_words)
-        
-        if doc_length == 0:
-            return 0.0
-        
-        # Count term frequencies in document
-        term_frequencies = Counter(doc_words)
-        total_docs = self.corpus_stats['total_docs']
-        
-        score = 0.0
-        for term in query_terms:
-            if term not in self.doc_frequencies:
-                continue
-                
-            # Term frequency in document
-            tf = term_frequencies.get(term, 0)
-            if tf == 0:
-                continue
-            
-            # Document frequency (how many docs contain this term)
-            df = self.doc_frequencies[term]
-            
-            # Inverse document frequency
-            idf = math.log((total_docs - df + 0.5) / (df + 0.5))
-            
-            # BM25 formula
-            numerator = tf * (self.k1 + 1)
-            denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-            
-            score += idf * (numerator / denominator)
-        
-        return score
+    def score_documents(self, query_terms: List[str], documents: List[Dict]) -> np.ndarray:
+        """Calculate BM25 scores for documents (in order) given query terms"""
+        chunk_scores = self.index.score_chunks(query_terms, [doc['id'] for doc in documents])
+        return np.array([chunk_scores.get(doc['id'], 0.0) for doc in documents], dtype=np.float64)
 
 class HybridSearchEngine:
     """Hybrid search combining BM25 and vector similarity"""
@@ -116,145 +65,77 @@ class HybridSearchEngine:
         self.vector_weight = vector_weight
         self.bm25_weight = bm25_weight
         self.bm25_scorer = BM25Scorer()
-        
-    def get_all_documents(self) -> List[Dict]:
-        """Retrieve all document chunks for BM25 corpus building"""
-        cache_key = "hybrid_search_documents"
-        cached_docs = cache.get(cache_key)
-        
-        if cached_docs:
-            return cached_docs
-        
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
-                       COALESCE(uf.filename, 'Unknown Document') as filename,
-                       COALESCE(uf.file_hash, '') as file_hash, 
-                       COALESCE(uf.file_size, 0) as file_size
-                FROM ai_assistant_documentchunk dc
-                LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
-                WHERE dc.embedding IS NOT NULL AND dc.content IS NOT NULL
-                ORDER BY dc.id;
-            """)
-            results = cursor.fetchall()
-        
-        documents = []
-        for row in results:
-            uploaded_file_id = row[2]
-            page_number = row[3] or 1
-            filename = row[5] or "Unknown Document"
-            content = row[1]
-            
-            # Generate title: use filename if valid, otherwise extract from content
-            if filename and filename != "Unknown Document":
-                title = filename
-            else:
-                # Extract first meaningful words from content as title
-                words = content.split()[:10]  # First 10 words
-                title = " ".join(words)
-                if len(title) > 100:
-                    title = title[:100] + "..."
-            
-            # Create view URL for PDF viewer
-            view_url = None
-            if uploaded_file_id:
-                view_url = f"/api/ai/pdf/{uploaded_file_id}/view/?page={page_number}"
-            
-            documents.append({
-                "id": row[0],
-                "content": content,
-                "uploaded_file_id": uploaded_file_id,
-                "page_number": page_number,
-                "chunk_index": row[4],
-                "filename": filename,
-                "title": title,  # Smart title: filename or content excerpt
-                "file_hash": row[6],
-                "file_size": row[7],
-                "view_url": view_url,
-                "source_display": f"{filename} (Page {page_number})" if filename != "Unknown Document" else f"Page {page_number}"
-            })
-        
-        # Cache for 30 minutes
-        cache.set(cache_key, documents, 1800)
-        return documents
+        self.lexical_candidates = getattr(settings, 'HYBRID_LEXICAL_CANDIDATES', 20)
+    
+    def get_lexical_candidates(self, query: str, vector_results: List[Dict]) -> List[Dict]:
+        """Full-text hits that the vector search did not return"""
+        if self.lexical_candidates <= 0:
+            return []
+        try:
+            vector_ids = {doc['id'] for doc in vector_results}
+            lexical_results = lexical_retriever.search(query, self.lexical_candidates)
+            return [doc for doc in lexical_results if doc['id'] not in vector_ids]
+        except Exception as e:
+            logger.warning(f"Lexical retrieval failed, using vector candidates only: {e}")
+            return []
     
     def normalize_scores(self, scores: List[float]) -> List[float]:
         """Normalize scores to 0-1 range"""
-        if not scores:
-            return scores
-        
-        min_score = min(scores)
-        max_score = max(scores)
-        
-        if max_score == min_score:
-            return [1.0] * len(scores)
-        
-        return [(score - min_score) / (max_score - min_score) for score in scores]
+        return minmax_normalize(scores).tolist()
     
     def hybrid_search(self, query: str, vector_results: List[Dict], top_k: int = 10) -> List[Dict]:
-        """Perform hybrid search combining vector similarity and BM25"""
-        if not vector_results:
-            return []
+        """Perform hybrid search fusing vector candidates with full-text candidates
         
+        Full-text hits the embedding missed join the candidate pool with a vector
+        score of 0, so they can only rank through their BM25 score - also when
+        the vector search found nothing (exact part numbers, error codes).
+        Scores are fused as arrays; result dicts are only built for the final top_k.
+        """
         try:
-            # Get all documents for BM25
-            all_documents = self.get_all_documents()
-            
-            # Build BM25 corpus statistics if needed
-            if not self.bm25_scorer.corpus_stats:
-                self.bm25_scorer.build_corpus_stats(all_documents)
-            
-            # Create document lookup for BM25 scoring
-            doc_lookup = {doc['id']: doc for doc in all_documents}
+            # Lexical channel: exact keyword hits the vector search missed
+            lexical_only = self.get_lexical_candidates(query, vector_results)
+            candidates = vector_results + lexical_only
+            offset = len(vector_results)
+            if not candidates:
+                return []
             
             # Preprocess query for BM25
             query_terms = self.bm25_scorer.preprocess_text(query)
             
-            # Calculate hybrid scores
-            hybrid_results = []
-            vector_similarities = [doc.get('similarity', 0) for doc in vector_results]
-            bm25_scores = []
+            # Calculate BM25 scores for all candidates from the inverted index
+            bm25_raw = self.bm25_scorer.score_documents(query_terms, candidates)
+            
+            # Normalize both score types (vector scores over the vector candidates only)
+            vector_scores = np.zeros(len(candidates))
+            vector_scores[:offset] = minmax_normalize([doc.get('similarity', 0) for doc in vector_results])
+            bm25_scores = minmax_normalize(bm25_raw)
             
-            # Calculate BM25 scores for vector results
-            for doc in vector_results:
-                doc_id = doc['id']
-                if doc_id in doc_lookup:
-                    bm25_score = self.bm25_scorer.score_document(query_terms, doc_lookup[doc_id], 0)
-                    bm25_scores.append(bm25_score)
-                else:
-                    bm25_scores.append(0.0)
+            # BM25 only sees alphabetic terms; full-text rank (already 0-1) covers
+            # codes and version strings that matched through the tsvector
+            if lexical_only:
+                lexical_scores = np.array([doc.get('lexical_score', 0.0) for doc in lexical_only])
+                bm25_scores[offset:] = np.maximum(bm25_scores[offset:], lexical_scores)
             
-            # Normalize both score types
-            normalized_vector = self.normalize_scores(vector_similarities)
-            normalized_bm25 = self.normalize_scores(bm25_scores)
+            # Hybrid score combination
+            hybrid_scores = self.vector_weight * vector_scores + self.bm25_weight * bm25_scores
             
-            # Combine scores
-            for i, doc in enumerate(vector_results):
-                vector_score = normalized_vector[i]
-                bm25_score = normalized_bm25[i]
-                
-                # Hybrid score combination
-                hybrid_score = (self.vector_weight * vector_score + 
-                               self.bm25_weight * bm25_score)
-                
-                # Add scoring details to document
+            # Top-k by hybrid score (descending); only these are materialised
+            final_results = []
+            for i in top_k_indices(hybrid_scores, top_k):
+                doc = candidates[i]
                 enhanced_doc = doc.copy()
                 enhanced_doc.update({
-                    'hybrid_score': hybrid_score,
-                    'vector_score': vector_score,
-                    'bm25_score': bm25_score,
+                    'hybrid_score': float(hybrid_scores[i]),
+                    'vector_score': float(vector_scores[i]),
+                    'bm25_score': float(bm25_scores[i]),
                     'original_similarity': doc.get('similarity', 0)
                 })
-                hybrid_results.append(enhanced_doc)
-            
-            # Sort by hybrid score (descending)
-            hybrid_results.sort(key=lambda x: x['hybrid_score'], reverse=True)
-            
-            # Return top-k results
-            final_results = hybrid_results[:top_k]
+                final_results.append(enhanced_doc)
             
-            logger.info(f"Hybrid search: {len(final_results)} results, "
-                       f"avg hybrid score: {sum(r['hybrid_score'] for r in final_results) / len(final_results):.3f}")
+            if final_results:
+                logger.info(f"Hybrid search: {len(final_results)} results "
+                           f"({len(lexical_only)} full-text-only candidates), "
+                           f"avg hybrid score: {sum(r['hybrid_score'] for r in final_results) / len(final_results):.3f}")
             
             return final_results
             
@@ -6,11 +6,19 @@ import os
 import fitz  # PyMuPDF
 import hashlib
 import numpy as np
-from django.db import connection
 from django.conf import settings
 from django.core.cache import cache
 from .models import DocumentFile, UploadedFile, DocumentChunk, QueryHistory
 from .enhanced_chunking import semantic_chunker, advanced_chunker
+from .vector_index import normalize_embedding
+from .retrieval_core import vector_retriever, reciprocal_rank_fusion
+from .embedding_client import embedding_client, EmbeddingError
+from .pdf_extraction import extract_page_texts
+from .cache_codec import cache_codec
+from .llm_streaming import cached_token_stream, stream_ollama_chat, stream_rag_pipeline
+from .async_rag import async_ollama_client, async_rag_pipeline
+from .single_flight import single_flight
+from .semantic_cache import semantic_cache
 import logging
 import json
 
@@ -25,7 +33,6 @@ class ImprovedRAGService:
         self.embedding_model = getattr(settings, 'EMBEDDING_MODEL', 'bge-m3')
         
         # Enhanced cache settings
-        self.embedding_cache_ttl = getattr(settings, 'EMBEDDING_CACHE_TTL', 24 * 3600)  # 24 hours
         self.search_cache_ttl = getattr(settings, 'SEARCH_CACHE_TTL', 3600)  # 1 hour
         self.response_cache_ttl = getattr(settings, 'RESPONSE_CACHE_TTL', 1800)  # 30 minutes
         
@@ -38,51 +45,37 @@ class ImprovedRAGService:
         self.chunker = advanced_chunker
         
     def get_embedding_from_ollama(self, text):
-        """Get embedding from Ollama with improved caching"""
-        # Create cache key based on text hash and model
-        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-        cache_key = f"embedding_{self.embedding_model}_{text_hash}"
-        
-        # Try to get from cache first
-        cached_embedding = cache.get(cache_key)
-        if cached_embedding is not None:
-            logger.debug(f"Using cached embedding for text hash: {text_hash[:8]}...")
-            return cached_embedding
+        """Get embedding from Ollama (previously embedded text comes from the durable embedding store)"""
+        # BGE-M3 through the shared embedding client (only 1024-dimension vectors are usable)
+        try:
+            embedding = embedding_client.embed_one(text)
+            if len(embedding) == 1024:
+                return embedding
+            logger.warning(f"BGE-M3 generated {len(embedding)} dimensions, expected 1024. Skipping.")
+        except EmbeddingError as e:
+            logger.warning(f"Failed to use BGE-M3 for embedding: {e}")
         
-        # Try BGE-M3 first (only use models that generate 1024 dimensions)
-        models_to_try = ['bge-m3']
+        # If embedding fails, use fallback (never stored)
+        logger.warning("Embedding failed, using fallback")
+        return self._simple_embedding_fallback(text)
+    
+    def get_embeddings_from_ollama(self, texts):
+        """Get embeddings for several texts with one batched embedding request
         
-        for model in models_to_try:
-            try:
-                response = requests.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={
-                        "model": model,
-                        "prompt": text
-                    },
-                    timeout=15
-                )
-                response.raise_for_status()
-                embedding = response.json()["embedding"]
-                
-                # Ensure embedding has correct dimensions (1024)
-                if len(embedding) != 1024:
-                    logger.warning(f"Model {model} generated {len(embedding)} dimensions, expected 1024. Skipping.")
-                    continue
-                
-                # Cache the embedding for longer (24 hours)
-                cache.set(cache_key, embedding, self.embedding_cache_ttl)
-                logger.debug(f"Successfully used {model} for embedding and cached it")
-                return embedding
-            except Exception as e:
-                logger.warning(f"Failed to use {model} for embedding: {e}")
-                continue
+        Texts embedded before are served from the embedding store; only new
+        texts are embedded. Falls back to per-text requests if the batch fails.
+        """
+        if not texts:
+            return []
         
-        # If all models fail, use fallback
-        logger.warning("All embedding models failed, using fallback")
-        fallback_embedding = self._simple_embedding_fallback(text)
-        cache.set(cache_key, fallback_embedding, self.embedding_cache_ttl)
-        return fallback_embedding
+        try:
+            embeddings = embedding_client.embed(list(texts))
+            if len(embeddings) != len(texts) or any(len(e) != 1024 for e in embeddings):
+                raise ValueError("unexpected batch embedding shape")
+            return embeddings
+        except Exception as e:
+            logger.warning(f"Batched embedding failed, embedding texts individually: {e}")
+            return [self.get_embedding_from_ollama(text) for text in texts]
     
     def _simple_embedding_fallback(self, text):
         """Simple fallback embedding when Ollama embedding fails"""
@@ -142,8 +135,7 @@ class ImprovedRAGService:
                 doc = None
                 try:
                     doc = fitz.open(file_path)
-                    for page_num, page in enumerate(doc, start=1):
-                        text = page.get_text()
+                    for text in extract_page_texts(file_path, doc=doc):
                         if text.strip():
                             page_texts.append(text)
                     total_pages = len(doc)
@@ -199,7 +191,7 @@ class ImprovedRAGService:
                     doc_chunk = DocumentChunk.objects.create(
                         uploaded_file=uploaded_file,
                         content=text_chunk.content,
-                        embedding=embedding,
+                        embedding=normalize_embedding(embedding),
                         page_number=text_chunk.page_number,
                         chunk_index=text_chunk.chunk_index
                     )
@@ -232,8 +224,11 @@ class ImprovedRAGService:
                 'error': str(e)
             }
     
-    def search_relevant_documents_with_scoring(self, query, top_k=None):
-        """Enhanced search with similarity scoring and filtering"""
+    def search_relevant_documents_with_scoring(self, query, top_k=None, ef_search=None):
+        """Enhanced search with similarity scoring and filtering
+
+        ef_search optionally overrides VECTOR_INDEX_EF_SEARCH for this query.
+        """
         if top_k is None:
             top_k = self.final_top_k
             
@@ -243,7 +238,7 @@ class ImprovedRAGService:
             cache_key = f"search_scored_{query_hash}_{top_k}_{self.similarity_threshold}"
             
             # Try to get from cache first
-            cached_results = cache.get(cache_key)
+            cached_results = cache_codec.get_results(cache_key)
             if cached_results is not None:
                 logger.info(f"Using cached search results for query: {query[:30]}...")
                 return cached_results
@@ -251,71 +246,22 @@ class ImprovedRAGService:
             # Generate query embedding
             query_embedding = self.get_embedding_from_ollama(query)
             
-            # Search using pgvector with more candidates
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
-                           COALESCE(uf.filename, 'Unknown Document') as filename,
-                           COALESCE(uf.file_hash, '') as file_hash, 
-                           COALESCE(uf.file_size, 0) as file_size,
-                           1 - (dc.embedding <=> %s::vector) as similarity
-                    FROM ai_assistant_documentchunk dc
-                    LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
-                    WHERE dc.embedding IS NOT NULL
-                    ORDER BY dc.embedding <=> %s::vector
-                    LIMIT %s;
-                """, [query_embedding, query_embedding, self.top_k_candidates])
-                results = cursor.fetchall()
-            
-            # Filter by similarity threshold and format results
-            filtered_results = []
-            for row in results:
-                similarity = float(row[8])
-                
-                # Only include results above threshold
-                if similarity >= self.similarity_threshold:
-                    uploaded_file_id = row[2]
-                    page_number = row[3] or 1
-                    filename = row[5] or "Unknown Document"
-                    content = row[1]
-                    
-                    # Generate title: use filename if valid, otherwise extract from content
-                    if filename and filename != "Unknown Document":
-                        title = filename
-                    else:
-                        # Extract first meaningful words from content as title
-                        words = content.split()[:10]  # First 10 words
-                        title = " ".join(words)
-                        if len(title) > 100:
-                            title = title[:100] + "..."
-                    
-                    # Create view URL for PDF viewer if uploaded_file_id exists
-                    view_url = None
-                    if uploaded_file_id:
-                        view_url = f"/api/ai/pdf/{uploaded_file_id}/view/?page={page_number}"
-                    
-                    filtered_results.append({
-                        "id": row[0],
-                        "content": content,
-                        "uploaded_file_id": uploaded_file_id,
-                        "page_number": page_number,
-                        "chunk_index": row[4],
-                        "filename": filename,
-                        "title": title,  # Smart title: filename or content excerpt
-                        "file_hash": row[6],
-                        "file_size": row[7],
-                        "similarity": similarity,
-                        "download_url": f"/api/ai/documents/{uploaded_file_id}/download/" if uploaded_file_id else None,
-                        "view_url": view_url,  # URL to open PDF at specific page
-                        "source_display": f"{filename} (Page {page_number})" if filename != "Unknown Document" else f"Page {page_number}"
-                    })
+            # Shared cosine retrieval core (same index and scores as every other tier)
+            candidates = vector_retriever.search(
+                query_embedding, self.top_k_candidates, ef_search=ef_search
+            )
+            
+            # Only include results above threshold
+            filtered_results = [
+                doc for doc in candidates if doc['similarity'] >= self.similarity_threshold
+            ]
             
             # Sort by similarity (highest first) and limit to top_k
             filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
             final_results = filtered_results[:top_k]
             
             # Cache the results
-            cache.set(cache_key, final_results, self.search_cache_ttl)
+            cache_codec.set_results(cache_key, final_results, self.search_cache_ttl)
             logger.info(f"Found {len(final_results)} relevant results (threshold: {self.similarity_threshold})")
             
             return final_results
@@ -324,11 +270,61 @@ class ImprovedRAGService:
             logger.error(f"Error in enhanced vector search: {e}")
             return []
     
+    def search_query_variants_with_scoring(self, queries, top_k=None, ef_search=None):
+        """Retrieve candidates for several variants of one query (e.g. expanded + original)
+        
+        All variants are embedded in one batched call and searched in one SQL
+        round-trip; the per-variant lists (after the similarity threshold) are
+        merged with reciprocal-rank fusion, best first.
+        """
+        if top_k is None:
+            top_k = self.final_top_k
+        
+        # Drop duplicate variants (e.g. expansion was a no-op) but keep order
+        queries = list(dict.fromkeys(queries))
+        
+        try:
+            variants_hash = hashlib.md5("\x1f".join(queries).encode('utf-8')).hexdigest()
+            cache_key = f"search_variants_{variants_hash}_{top_k}_{self.similarity_threshold}"
+            
+            cached_results = cache_codec.get_results(cache_key)
+            if cached_results is not None:
+                logger.info(f"Using cached multi-query search results for: {queries[0][:30]}...")
+                return cached_results
+            
+            query_embeddings = self.get_embeddings_from_ollama(queries)
+            candidate_lists = vector_retriever.search_many(
+                query_embeddings, max(top_k, self.top_k_candidates), ef_search=ef_search
+            )
+            
+            filtered_lists = [
+                [doc for doc in candidates if doc['similarity'] >= self.similarity_threshold]
+                for candidates in candidate_lists
+            ]
+            final_results = reciprocal_rank_fusion(filtered_lists)[:top_k]
+            
+            if final_results:
+                cache_codec.set_results(cache_key, final_results, self.search_cache_ttl)
+            logger.info(
+                f"Multi-query search: {len(queries)} variants, "
+                f"{[len(l) for l in filtered_lists]} above threshold, {len(final_results)} fused"
+            )
+            
+            return final_results
+            
+        except Exception as e:
+            logger.error(f"Error in multi-query vector search: {e}")
+            return []
+    
     def generate_enhanced_response(self, query, context_documents):
         """Generate response with improved context handling"""
         if not context_documents:
             return "I don't know."
         
+        return self.ollama_generate(self.build_enhanced_prompt(query, context_documents))
+    
+    def build_enhanced_prompt(self, query, context_documents):
+        """Prompt for generate_enhanced_response"""
         # Build context with similarity scores and better formatting
         context_lines = []
         for idx, doc in enumerate(context_documents, 1):
@@ -361,7 +357,25 @@ class ImprovedRAGService:
             "Answer:"
         )
         
-        return self.ollama_generate(prompt)
+        return prompt
+    
+    def _generation_payload(self, prompt, model):
+        """/api/chat request body shared by the blocking and streaming generators"""
+        return {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False,
+            "options": {
+                "num_predict": 1024,      # Increased for comprehensive responses
+                "temperature": 0.2,       # Lower for more focused responses
+                "top_p": 0.9,
+                "top_k": 40,
+                "repeat_penalty": 1.1,
+                "num_ctx": 4096          # Increased context window
+            }
+        }
     
     def ollama_generate(self, prompt, model=None):
         """Generate response using Ollama with enhanced caching"""
@@ -381,21 +395,7 @@ class ImprovedRAGService:
         try:
             response = requests.post(
                 f"{self.ollama_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ],
-                    "stream": False,
-                    "options": {
-                        "num_predict": 1024,      # Increased for comprehensive responses
-                        "temperature": 0.2,       # Lower for more focused responses
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "repeat_penalty": 1.1,
-                        "num_ctx": 4096          # Increased context window
-                    }
-                },
+                json=self._generation_payload(prompt, model),
                 timeout=getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
             )
             response.raise_for_status()
@@ -410,8 +410,24 @@ class ImprovedRAGService:
             logger.error(f"Error generating response: {e}")
             raise
     
+    def stream_ollama_generate(self, prompt, model=None):
+        """Streaming ollama_generate: yields response pieces, shares its cache"""
+        if model is None:
+            model = self.model_name
+        
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return cached_token_stream(
+            f"response_{model}_{prompt_hash}",
+            self.response_cache_ttl,
+            lambda: stream_ollama_chat(
+                self.ollama_url,
+                self._generation_payload(prompt, model),
+                getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+        )
+    
     def query_with_enhanced_rag(self, query, top_k=None, user=None):
-        """Enhanced RAG pipeline with scoring and better caching"""
+        """Enhanced RAG pipeline with scoring and better caching; concurrent identical queries share one computation"""
         if top_k is None:
             top_k = self.final_top_k
             
@@ -420,57 +436,12 @@ class ImprovedRAGService:
             query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
             cache_key = f"enhanced_rag_{query_hash}_{top_k}_{self.similarity_threshold}"
             
-            # Try to get from cache first
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Using cached enhanced RAG result for query: {query[:30]}...")
-                return cached_result
-            
-            # Search for relevant documents with scoring
-            relevant_docs = self.search_relevant_documents_with_scoring(query, top_k)
-            
-            if not relevant_docs:
-                response = "I don't know."
-                result = {
-                    "response": response,
-                    "sources": [],
-                    "query": query,
-                    "search_stats": {
-                        "total_candidates": 0,
-                        "filtered_results": 0,
-                        "similarity_threshold": self.similarity_threshold
-                    }
-                }
-            else:
-                # Generate enhanced response
-                response = self.generate_enhanced_response(query, relevant_docs)
-                result = {
-                    "response": response,
-                    "sources": relevant_docs,
-                    "query": query,
-                    "search_stats": {
-                        "total_candidates": self.top_k_candidates,
-                        "filtered_results": len(relevant_docs),
-                        "similarity_threshold": self.similarity_threshold,
-                        "avg_similarity": sum(doc['similarity'] for doc in relevant_docs) / len(relevant_docs)
-                    }
-                }
-            
-            # Cache the result
-            cache.set(cache_key, result, self.response_cache_ttl)
-            logger.info(f"Enhanced RAG complete: {len(relevant_docs)} sources, avg similarity: {result['search_stats'].get('avg_similarity', 0):.3f}")
-            
-            # Save to history
-            if user:
-                QueryHistory.objects.create(
-                    query=query,
-                    response=response,
-                    sources=relevant_docs,
-                    query_type='enhanced_rag',
-                    user=user
-                )
-            
-            return result
+            return single_flight.run(
+                cache_key,
+                self.response_cache_ttl,
+                compute=lambda: self._compute_enhanced_rag(query, top_k, user),
+                revalidate=lambda: self._compute_enhanced_rag(query, top_k),
+            )
             
         except Exception as e:
             logger.error(f"Error in enhanced RAG query: {e}")
@@ -480,6 +451,109 @@ class ImprovedRAGService:
                 "query": query,
                 "search_stats": {"error": str(e)}
             }
+    
+    def _compute_enhanced_rag(self, query, top_k, user=None):
+        """query_with_enhanced_rag on a cache miss"""
+        # Search for relevant documents with scoring
+        relevant_docs = self.search_relevant_documents_with_scoring(query, top_k)
+        
+        if not relevant_docs:
+            result = self._enhanced_result(query, relevant_docs, "I don't know.")
+        else:
+            # Generate enhanced response (or reuse the answer to an equivalent query)
+            result = semantic_cache.get_or_generate(
+                'enhanced_rag', f"{self.model_name}:top_k={top_k}:threshold={self.similarity_threshold}",
+                query, relevant_docs,
+                lambda: self._enhanced_result(query, relevant_docs, self.generate_enhanced_response(query, relevant_docs))
+            )
+        response = result['response']
+        logger.info(f"Enhanced RAG complete: {len(relevant_docs)} sources, avg similarity: {result['search_stats'].get('avg_similarity', 0):.3f}")
+        
+        # Save to history
+        if user:
+            QueryHistory.objects.create(
+                query=query,
+                response=response,
+                sources=relevant_docs,
+                query_type='enhanced_rag',
+                user=user
+            )
+        
+        return result
+    
+    def _enhanced_result(self, query, relevant_docs, response):
+        if not relevant_docs:
+            search_stats = {
+                "total_candidates": 0,
+                "filtered_results": 0,
+                "similarity_threshold": self.similarity_threshold
+            }
+        else:
+            search_stats = {
+                "total_candidates": self.top_k_candidates,
+                "filtered_results": len(relevant_docs),
+                "similarity_threshold": self.similarity_threshold,
+                "avg_similarity": sum(doc['similarity'] for doc in relevant_docs) / len(relevant_docs)
+            }
+        return {
+            "response": response,
+            "sources": relevant_docs,
+            "query": query,
+            "search_stats": search_stats
+        }
+    
+    def stream_query_with_enhanced_rag(self, query, top_k=None, user=None):
+        """query_with_enhanced_rag as (event, data) pairs: sources, then tokens, then the result"""
+        if top_k is None:
+            top_k = self.final_top_k
+        
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return stream_rag_pipeline(
+            query,
+            user,
+            cache_key=f"enhanced_rag_{query_hash}_{top_k}_{self.similarity_threshold}",
+            cache_ttl=self.response_cache_ttl,
+            history_type='enhanced_rag',
+            search=lambda: self.search_relevant_documents_with_scoring(query, top_k),
+            stream_answer=lambda docs: self.stream_ollama_generate(self.build_enhanced_prompt(query, docs)),
+            build_result=lambda docs, response: self._enhanced_result(query, docs, response),
+        )
+    
+    async def aquery_with_enhanced_rag(self, query, top_k=None, user=None):
+        """query_with_enhanced_rag on the async request path (non-blocking generation)"""
+        if top_k is None:
+            top_k = self.final_top_k
+        
+        async def generate(prompt):
+            prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+            return await async_ollama_client.cached_chat(
+                f"response_{self.model_name}_{prompt_hash}",
+                self.response_cache_ttl,
+                self._generation_payload(prompt, self.model_name),
+                getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+        
+        try:
+            query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+            return await async_rag_pipeline(
+                query,
+                user,
+                cache_key=f"enhanced_rag_{query_hash}_{top_k}_{self.similarity_threshold}",
+                cache_ttl=self.response_cache_ttl,
+                history_type='enhanced_rag',
+                search=lambda: self.search_relevant_documents_with_scoring(query, top_k),
+                prepare=lambda docs: self.build_enhanced_prompt(query, docs),
+                generate=generate,
+                build_result=lambda docs, response: self._enhanced_result(query, docs, response),
+            )
+        except Exception as e:
+            logger.error(f"Error in async enhanced RAG query: {e}")
+            return {
+                "response": f"Error processing query: {str(e)}",
+                "sources": [],
+                "query": query,
+                "search_stats": {"error": str(e)}
+            }
 
 # Global enhanced RAG service instance
 enhanced_rag_service = ImprovedRAGService()
@@ -0,0 +1,172 @@
+"""
+Streaming Ingestion Pipeline
+
+Stages used by AutomaticFileProcessor to stream a document through
+extract -> chunk -> embed -> write without materialising all of its chunks:
+
+- ChunkStream: runs the page-wise chunk generator (PyMuPDF extraction +
+  semantic chunking) in a producer thread behind a bounded queue
+- the caller embeds micro-batches taken from the stream
+- ChunkWriterStage: writes embedded batches with ChunkBulkWriter in a
+  background thread behind a second bounded queue
+
+Both queues block when full, so a slow stage applies backpressure to the
+one before it and memory stays bounded regardless of document size.
+"""
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from django.db import connection
+from .chunk_writer import ChunkBulkWriter
+
+logger = logging.getLogger(__name__)
+
+# How often blocked queue operations re-check for shutdown/failure
+POLL_SECONDS = 0.5
+
+
+class ChunkStream:
+    """
+    Chunk generator consumed through a bounded queue.
+
+    The generator runs in its own thread, so extraction and chunking of the
+    next pages overlap with embedding of earlier ones; at most max_buffered
+    chunks wait in memory. Must not touch the database (file paths are
+    resolved by the caller).
+    """
+
+    _END = object()
+
+    def __init__(self, chunks: Iterable[Dict], max_buffered: int = 256):
+        self.queue = queue.Queue(maxsize=max_buffered)
+        self.produced = 0
+        self._pending = deque()  # Chunks handed back by the consumer
+        self._error = None
+        self._finished = False
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(chunks,), name='chunk-producer', daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Blocking put that gives up once the stream is closed"""
+        while not self._closed.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, chunks: Iterable[Dict]):
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+                self.produced += 1
+        except Exception as e:
+            logger.error(f"Chunk producer failed: {e}")
+            self._error = e
+        self._put(self._END)
+
+    def next(self) -> Optional[Dict]:
+        """Next chunk, or None once the generator is exhausted"""
+        if self._pending:
+            return self._pending.popleft()
+        if self._finished:
+            return None
+
+        chunk = self.queue.get()
+        if chunk is self._END:
+            self._finished = True
+            if self._error is not None:
+                raise self._error
+            return None
+        return chunk
+
+    def push_back(self, chunks: List[Dict]):
+        """Return chunks so the next take() starts with them again"""
+        self._pending.extendleft(reversed(chunks))
+
+    def take(self, size: int, max_chars: int) -> List[Dict]:
+        """Up to size chunks carrying at most max_chars of text (always at least one)"""
+        batch = []
+        payload = 0
+        while len(batch) < size:
+            chunk = self.next()
+            if chunk is None:
+                break
+            payload += len(chunk['content'])
+            if batch and payload > max_chars:
+                self.push_back([chunk])
+                break
+            batch.append(chunk)
+        return batch
+
+    def close(self):
+        """Stop the producer (unblocking it if the queue is full)"""
+        self._closed.set()
+        self._thread.join(timeout=POLL_SECONDS * 4)
+
+
+class ChunkWriterStage:
+    """
+    Writes embedded batches in a background thread.
+
+    put() blocks while max_pending_batches batches are waiting, so embedding
+    never runs far ahead of the database. Each batch is one ChunkBulkWriter
+    flush (one transaction). A write failure is re-raised in the caller on
+    the next put() or in raise_if_failed().
+    """
+
+    def __init__(self, writer: ChunkBulkWriter, max_pending_batches: int = 2):
+        self.writer = writer
+        self.batches = queue.Queue(maxsize=max_pending_batches)
+        self.written = 0
+        self.error = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='chunk-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                rows = self.batches.get()
+                if rows is None:
+                    return
+                if self.error is not None:
+                    continue  # Drain so producers never block on a dead writer
+                try:
+                    for fields in rows:
+                        self.writer.add(**fields)
+                    self.writer.flush()
+                    self.written += len(rows)
+                except Exception as e:
+                    logger.error(f"Chunk writer failed: {e}")
+                    self.error = e
+        finally:
+            # Thread-local connection opened by the writes
+            connection.close()
+
+    def raise_if_failed(self):
+        if self.error is not None:
+            raise self.error
+
+    def put(self, rows: List[Dict]):
+        """Queue one embedded batch (DocumentChunk field dicts) for writing"""
+        while True:
+            self.raise_if_failed()
+            try:
+                self.batches.put(rows, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        """Write everything still queued and stop the thread (idempotent)"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self.batches.put(None)
+        self._thread.join()
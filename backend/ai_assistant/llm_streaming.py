@@ -0,0 +1,160 @@
+"""
+Token Streaming for RAG and Chat Responses
+
+Non-streamed generation keeps users waiting for the whole answer (often
+1000+ tokens). The streaming variants forward tokens as Ollama emits them:
+- stream_ollama_chat() reads Ollama's NDJSON /api/chat stream
+- cached_token_stream() replays a cached answer, or forwards a fresh stream
+  and caches the assembled text under the same key as the non-streamed
+  generator once it is complete
+- stream_rag_pipeline() runs a RAG tier as events: 'sources' as soon as
+  retrieval is done, 'token' per generated piece and 'done' with the full
+  result (cached and stored in QueryHistory like the non-streamed pipeline)
+- event_stream_response() sends (event, data) pairs as Server-Sent Events;
+  views add EventStreamRenderer so DRF content negotiation accepts them
+
+If the client disconnects, the generator is closed, which closes the Ollama
+connection and stops generation; nothing is cached for a partial answer.
+"""
+import json
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import requests
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from .models import QueryHistory
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+
+def stream_ollama_chat(ollama_url: str, payload: Dict, timeout: float) -> Iterator[str]:
+    """Yield the content pieces of a streamed /api/chat response"""
+    payload = dict(payload, stream=True)
+    with requests.post(f"{ollama_url}/api/chat", json=payload, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get('error'):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            piece = data.get('message', {}).get('content', '')
+            if piece:
+                yield piece
+            if data.get('done'):
+                break
+
+
+def cached_token_stream(cache_key: str, cache_ttl: int, start: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """Cached text in one piece, or the pieces of start() (cached once complete)"""
+    cached_response = cache.get(cache_key)
+    if cached_response is not None:
+        yield cached_response
+        return
+
+    parts = []
+    for piece in start():
+        parts.append(piece)
+        yield piece
+    cache.set(cache_key, ''.join(parts), cache_ttl)
+
+
+def _without_sources(result: Dict) -> Dict:
+    return {key: value for key, value in result.items() if key != 'sources'}
+
+
+def stream_rag_pipeline(
+    query: str,
+    user,
+    cache_key: str,
+    cache_ttl: int,
+    history_type: str,
+    search: Callable[[], List[Dict]],
+    stream_answer: Callable[[List[Dict]], Iterator[str]],
+    build_result: Callable[[List[Dict], str], Dict],
+    finalize: Optional[Callable[[str], str]] = None,
+    empty_response: str = "I don't know.",
+    cache_empty: bool = True,
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Streaming counterpart of a query_with_*_rag pipeline, yielding
+    (event, data) pairs. The 'done' event carries the same result dict the
+    non-streamed pipeline returns (without the sources already sent), with
+    the answer passed through finalize (e.g. markdown clean-up).
+    """
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        yield 'sources', {'query': query, 'sources': cached_result.get('sources', [])}
+        yield 'token', {'text': cached_result.get('response', '')}
+        yield 'done', dict(_without_sources(cached_result), cached=True)
+        return
+
+    relevant_docs = search()
+    yield 'sources', {'query': query, 'sources': relevant_docs}
+
+    if relevant_docs:
+        parts = []
+        for piece in stream_answer(relevant_docs):
+            parts.append(piece)
+            yield 'token', {'text': piece}
+        response = ''.join(parts)
+        if finalize is not None:
+            response = finalize(response)
+    else:
+        response = empty_response
+        yield 'token', {'text': response}
+
+    result = build_result(relevant_docs, response)
+    if relevant_docs or cache_empty:
+        single_flight.store(cache_key, result, cache_ttl)
+
+    if user:
+        QueryHistory.objects.create(
+            query=query,
+            response=response,
+            sources=relevant_docs,
+            query_type=history_type,
+            user=user
+        )
+
+    yield 'done', dict(_without_sources(result), cached=False)
+
+
+def _json_default(value):
+    """numpy scalars and other stragglers in result dicts"""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF views accept 'Accept: text/event-stream' (EventSource sends it);
+    the stream itself bypasses rendering, errors before it are sent as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, default=_json_default)
+
+
+def event_stream_response(events: Iterator[Tuple[str, Dict]], operation: str = 'stream') -> StreamingHttpResponse:
+    """Server-Sent Events response; a failure mid-stream becomes an 'error' event"""
+    def body():
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error in {operation}: {e}", exc_info=True)
+            yield sse_event('error', {'message': str(e)})
+
+    response = StreamingHttpResponse(body(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Do not let nginx buffer the stream
+    return response
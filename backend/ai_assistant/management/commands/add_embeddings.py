@@ -1,10 +1,19 @@
 import logging
 from django.core.management.base import BaseCommand
-from ai_assistant.models import DocumentChunk
-from ai_assistant.rag_service import EnhancedRAGService
+from ai_assistant.embedding_backfill import EmbeddingBackfill
+from ai_assistant.semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
+
+def format_duration(seconds):
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
 class Command(BaseCommand):
     help = 'Add embeddings to existing document chunks for better search functionality'
 
@@ -19,6 +28,23 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be processed without actually doing it',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of chunks embedded and written per batch (default: EMBEDDING_BACKFILL_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Batches processed concurrently (default: EMBEDDING_BACKFILL_WORKERS)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the saved resume point of an interrupted run and start over',
+        )
         parser.add_argument(
             '--chunk-id',
             type=int,
@@ -26,68 +52,63 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        force = options['force']
-        dry_run = options['dry_run']
-        chunk_id = options['chunk_id']
-        
+        backfill = EmbeddingBackfill(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            force=options['force'],
+            chunk_id=options['chunk_id'],
+        )
+        restart = options['restart']
+
         self.stdout.write(
             self.style.SUCCESS('Starting embedding generation...')
         )
-        
-        # Initialize RAG service
-        rag_service = EnhancedRAGService()
-        
-        # Get chunks that need embeddings
-        chunks_query = DocumentChunk.objects.all()
-        if chunk_id:
-            chunks_query = chunks_query.filter(id=chunk_id)
-        
-        if not force:
-            chunks_query = chunks_query.filter(embedding__isnull=True)
-        
-        chunks = list(chunks_query)
-        
-        self.stdout.write(f"Found {len(chunks)} chunks to process")
-        
-        if dry_run:
+
+        resume_from, pending = backfill.count_pending(restart=restart)
+        if resume_from:
+            self.stdout.write(f"Resuming after chunk {resume_from} (use --restart to start over)")
+        self.stdout.write(
+            f"Found {pending} chunks to process "
+            f"({backfill.workers} workers, batches of {backfill.batch_size})"
+        )
+
+        if options['dry_run']:
             self.stdout.write("DRY RUN - No embeddings will be generated")
-            for chunk in chunks[:10]:  # Show first 10
-                self.stdout.write(f"  - {chunk.uploaded_file.filename if chunk.uploaded_file else 'Unknown'} - Page {chunk.page_number}")
-            if len(chunks) > 10:
-                self.stdout.write(f"  ... and {len(chunks) - 10} more")
             return
-        
-        processed_count = 0
-        error_count = 0
-        
-        for chunk in chunks:
-            try:
-                self.stdout.write(f"Processing chunk {chunk.id}: {chunk.uploaded_file.filename if chunk.uploaded_file else 'Unknown'} - Page {chunk.page_number}")
-                
-                # Generate embedding
-                embedding = rag_service.get_embedding_from_ollama(chunk.content)
-                
-                # Update chunk
-                chunk.embedding = embedding
-                chunk.save()
-                
-                processed_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f"  ✓ Successfully processed")
-                )
-                    
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(
-                    self.style.ERROR(f"  ✗ Error processing chunk {chunk.id}: {str(e)}")
-                )
-                logger.error(f"Error processing chunk {chunk.id}: {e}")
-        
+        if not pending:
+            return
+
+        def report(progress):
+            done = progress['processed'] + progress['errors']
+            self.stdout.write(
+                f"  {done}/{progress['total']} chunks "
+                f"({progress['chunks_per_second']:.1f} chunks/s, "
+                f"ETA {format_duration(progress['eta_seconds'])}, "
+                f"last ID {progress['last_chunk_id']})"
+            )
+
+        result = backfill.run(restart=restart, on_progress=report)
+        if options['force'] and result['processed']:
+            # Re-embedded chunks keep their ids, so the corpus version does not change
+            semantic_cache.invalidate()
+
         # Summary
         self.stdout.write("\n" + "="*50)
         self.stdout.write(
             self.style.SUCCESS(f"Embedding generation complete!")
         )
-        self.stdout.write(f"  Processed: {processed_count}")
-        self.stdout.write(f"  Errors: {error_count}")
-        self.stdout.write(f"  Total: {len(chunks)}")
+        self.stdout.write(f"  Processed: {result['processed']}")
+        self.stdout.write(f"  Errors: {result['errors']}")
+        self.stdout.write(f"  Total: {result['total']}")
+        self.stdout.write(f"  Time: {format_duration(result['elapsed_seconds'])} ({result['chunks_per_second']:.1f} chunks/s)")
+        if result['errors'] and options['force']:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Failed batches were logged and keep their old embeddings; re-run with --force "
+                    "to resume at the first failed batch."
+                )
+            )
+        elif result['errors']:
+            self.stdout.write(
+                self.style.WARNING("Failed batches were logged; re-run to embed the chunks still missing embeddings.")
+            )
@@ -63,7 +63,7 @@ class Command(BaseCommand):
             )
             
             chunk_count = chunks.count()
-            has_embeddings = chunks.filter(embedding__isnull=False).count()
+            has_embeddings = chunks.exclude(embedding__isnull=True, canonical_chunk__isnull=True).count()
             
             if chunk_count > 0:
                 processed_count += 1
@@ -110,7 +110,9 @@ class Command(BaseCommand):
             self.stdout.write("  python manage.py reprocess_pdfs")
         
         # Check for chunks without embeddings
-        chunks_without_embeddings = DocumentChunk.objects.filter(embedding__isnull=True).count()
+        chunks_without_embeddings = DocumentChunk.objects.filter(
+            embedding__isnull=True, canonical_chunk__isnull=True
+        ).count()
         if chunks_without_embeddings > 0:
             self.stdout.write(
                 self.style.WARNING(f"\n{chunks_without_embeddings} chunks need embeddings. Run:")
@@ -0,0 +1,126 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from ai_assistant.chunk_writer import chunk_content_hash
+from ai_assistant.models import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Backfill chunk content hashes and optionally collapse duplicate chunks onto shared vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of chunks hashed per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--share-vectors',
+            action='store_true',
+            help='Drop the stored vector of duplicate chunks and point them at one canonical chunk',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only show deduplication status',
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self._show_status()
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('Backfilling chunk content hashes...')
+        )
+        hashed_count = self._backfill_hashes(options['batch_size'])
+
+        shared_count = 0
+        if options['share_vectors']:
+            self.stdout.write('Collapsing duplicate chunks onto shared vectors...')
+            shared_count = self._share_vectors()
+
+        # Summary
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(
+            self.style.SUCCESS("Chunk deduplication complete!")
+        )
+        self.stdout.write(f"  Hashes backfilled: {hashed_count}")
+        if options['share_vectors']:
+            self.stdout.write(f"  Vectors released: {shared_count}")
+        self._show_status()
+
+    def _backfill_hashes(self, batch_size):
+        chunks_query = DocumentChunk.objects.filter(content_hash__isnull=True).only('id', 'content').order_by('id')
+        pending = chunks_query.count()
+        self.stdout.write(f"Found {pending} chunks without a content hash")
+
+        hashed_count = 0
+        last_id = 0
+        start_time = time.time()
+
+        # Keyset pagination keeps each batch query cheap on large tables
+        while True:
+            batch = list(chunks_query.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for chunk in batch:
+                chunk.content_hash = chunk_content_hash(chunk.content)
+            try:
+                DocumentChunk.objects.bulk_update(batch, ['content_hash'], batch_size=batch_size)
+                hashed_count += len(batch)
+            except Exception as e:
+                logger.error(f"Error hashing chunks up to ID {last_id}: {e}")
+                self.stdout.write(self.style.ERROR(f"  ✗ Batch ending at chunk {last_id} failed: {e}"))
+                continue
+
+            elapsed = time.time() - start_time
+            rate = hashed_count / elapsed if elapsed > 0 else 0
+            self.stdout.write(f"  {hashed_count}/{pending} chunks hashed ({rate:.0f} chunks/s)")
+
+        return hashed_count
+
+    def _share_vectors(self):
+        """The lowest-id chunk of each duplicated content keeps the vector"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                WITH canonical AS (
+                    SELECT content_hash, MIN(id) AS id
+                    FROM ai_assistant_documentchunk
+                    WHERE content_hash IS NOT NULL
+                      AND embedding IS NOT NULL
+                      AND canonical_chunk_id IS NULL
+                    GROUP BY content_hash
+                    HAVING COUNT(*) > 1
+                )
+                UPDATE ai_assistant_documentchunk dc
+                SET canonical_chunk_id = canonical.id, embedding = NULL
+                FROM canonical
+                WHERE dc.content_hash = canonical.content_hash
+                  AND dc.id <> canonical.id
+                  AND dc.embedding IS NOT NULL
+                  AND dc.canonical_chunk_id IS NULL;
+            """)
+            return cursor.rowcount
+
+    def _show_status(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*),
+                       COUNT(content_hash),
+                       COUNT(DISTINCT content_hash),
+                       COUNT(canonical_chunk_id)
+                FROM ai_assistant_documentchunk;
+            """)
+            total, hashed, distinct, shared = cursor.fetchone()
+
+        self.stdout.write(f"  Total chunks: {total}")
+        self.stdout.write(f"  Chunks with content hash: {hashed}")
+        self.stdout.write(f"  Distinct contents: {distinct}")
+        self.stdout.write(f"  Duplicate contents: {hashed - distinct}")
+        self.stdout.write(f"  Chunks sharing a vector: {shared}")
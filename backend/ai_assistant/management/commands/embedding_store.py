@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from ai_assistant.embedding_store import embedding_store
+
+class Command(BaseCommand):
+    help = 'Show the durable embedding store status or prune entries of old model versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete entries that do not belong to the current model name and version',
+        )
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = embedding_store.prune()
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ Removed {deleted} stale embedding store entries")
+            )
+
+        status = embedding_store.get_status()
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(
+            self.style.SUCCESS(f"Embedding store: {status['model_name']} (version {status['model_version']})")
+        )
+        self.stdout.write(f"  Entries: {status['entries']}")
+        self.stdout.write(f"  Stale entries (other models/versions): {status['stale_entries']}")
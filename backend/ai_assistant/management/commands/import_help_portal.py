@@ -4,14 +4,20 @@ Management command to import and process help portal documents
 Usage:
     python manage.py import_help_portal
     python manage.py import_help_portal --force  # Reprocess even if already processed
+    python manage.py import_help_portal --full-rescan  # Also re-stat files rewritten in place
+    python manage.py import_help_portal --allow-mass-delete  # Apply a scan that removes most documents
+
+Re-syncs are incremental: the folder manifest (folder_sync.py) means only
+new or changed PDFs are hashed, and PDFs removed from the folder are removed
+from the index.
 """
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from ai_assistant.models import HelpPortalDocument, UploadedFile, DocumentChunk
 from ai_assistant.rag_service import EnhancedRAGService
+from ai_assistant.folder_sync import FolderSync, FolderSyncError, check_deletions, delete_imported_file
 import os
-import hashlib
 import logging
 from pathlib import Path
 import re
@@ -28,6 +34,16 @@ class Command(BaseCommand):
             action='store_true',
             help='Force reprocessing of already processed documents',
         )
+        parser.add_argument(
+            '--full-rescan',
+            action='store_true',
+            help='Stat every PDF instead of only those in changed directories',
+        )
+        parser.add_argument(
+            '--allow-mass-delete',
+            action='store_true',
+            help='Remove documents even if most of the directory seems to be gone',
+        )
 
     def handle(self, *args, **options):
         force = options['force']
@@ -43,29 +59,70 @@ class Command(BaseCommand):
             )
             return
         
-        # Find all PDFs
-        pdf_files = list(help_portal_path.glob('*.pdf'))
-        
-        if not pdf_files:
-            self.stdout.write(self.style.WARNING('No PDF files found in help portal directory'))
+        # Find all PDFs (MD5 manifest hashes double as HelpPortalDocument.file_hash)
+        folder = FolderSync(help_portal_path, extensions=['.pdf'], recursive=False, hash_algorithm='md5')
+        try:
+            scan = folder.scan(full=options['full_rescan'])
+            check_deletions(scan, options['allow_mass_delete'])
+        except FolderSyncError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
             return
+        entries = scan['entries']
         
-        self.stdout.write(f'Found {len(pdf_files)} PDF files')
-        
-        # Initialize RAG service
-        rag_service = EnhancedRAGService()
+        self.stdout.write(
+            f"Found {len(entries)} PDF files "
+            f"({scan['stats']['new']} new, {scan['stats']['modified']} modified, "
+            f"{scan['stats']['deleted']} removed, {scan['stats']['files_hashed']} hashed)"
+        )
         
         stats = {
-            'total': len(pdf_files),
+            'total': len(entries),
             'processed': 0,
             'skipped': 0,
             'failed': 0,
+            'removed': 0,
         }
         
-        for pdf_file in sorted(pdf_files):
+        # Propagate deletes, and drop the previous version of modified PDFs
+        stale_hashes = [entry.content_hash for entry in scan['deleted']]
+        stale_hashes += [entry.previous_hash for entry in scan['modified']]
+        live_hashes = {entry.content_hash for entry in entries.values()}
+        for file_hash in set(stale_hashes) - live_hashes:
+            if self._remove_document(file_hash):
+                stats['removed'] += 1
+        
+        for entry in scan['moved']:
+            HelpPortalDocument.objects.filter(file_hash=entry.content_hash).update(
+                filename=os.path.basename(entry.path),
+                file_path=folder.absolute_path(entry.path)
+            )
+        
+        folder.commit(scan)
+        
+        if not entries:
+            self.stdout.write(self.style.WARNING('No PDF files found in help portal directory'))
+            return
+        
+        # Unchanged, completed documents are skipped without opening them
+        completed = set()
+        if not force:
+            completed = set(
+                HelpPortalDocument.objects.filter(
+                    file_hash__in=[entry.content_hash for entry in entries.values()],
+                    status='completed'
+                ).values_list('file_hash', flat=True)
+            )
+        to_process = [entry for path, entry in sorted(entries.items()) if entry.content_hash not in completed]
+        stats['skipped'] = len(entries) - len(to_process)
+        
+        # Initialize RAG service
+        rag_service = EnhancedRAGService()
+        
+        for entry in to_process:
+            pdf_file = Path(folder.absolute_path(entry.path))
             try:
                 self.stdout.write(f'\nProcessing: {pdf_file.name}')
-                result = self._process_document(pdf_file, rag_service, force)
+                result = self._process_document(pdf_file, rag_service, force, entry.content_hash)
                 
                 if result == 'skipped':
                     stats['skipped'] += 1
@@ -87,12 +144,22 @@ class Command(BaseCommand):
         self.stdout.write(f'  Processed: {stats["processed"]}')
         self.stdout.write(f'  Skipped: {stats["skipped"]}')
         self.stdout.write(f'  Failed: {stats["failed"]}')
+        self.stdout.write(f'  Removed: {stats["removed"]}')
     
-    def _process_document(self, pdf_file, rag_service, force):
-        """Process a single document"""
+    def _remove_document(self, file_hash):
+        """Remove a help portal document that left the folder, with its chunks"""
+        help_doc = HelpPortalDocument.objects.filter(file_hash=file_hash).select_related('uploaded_file').first()
+        if not help_doc:
+            return False
         
-        # Calculate file hash
-        file_hash = self._compute_file_hash(pdf_file)
+        self.stdout.write(f'Removing: {help_doc.filename}')
+        if help_doc.uploaded_file:
+            delete_imported_file(help_doc.uploaded_file)
+        help_doc.delete()
+        return True
+    
+    def _process_document(self, pdf_file, rag_service, force, file_hash):
+        """Process a single document"""
         
         # Check if document already exists
         help_doc, created = HelpPortalDocument.objects.get_or_create(
@@ -166,14 +233,6 @@ class Command(BaseCommand):
             logger.error(f'Error processing {pdf_file.name}: {str(e)}', exc_info=True)
             return 'failed'
     
-    def _compute_file_hash(self, file_path):
-        """Compute MD5 hash of file"""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    
     def _classify_document(self, filename):
         """Classify document by filename"""
         filename_lower = filename.lower()
@@ -0,0 +1,84 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Rows whose norm differs from 1 by less than this are left alone
+NORM_TOLERANCE = 1e-4
+
+NON_UNIT_FILTER = """
+    embedding IS NOT NULL
+    AND vector_norm(embedding) > 0
+    AND abs(vector_norm(embedding) - 1) > %s
+"""
+
+class Command(BaseCommand):
+    help = 'L2-normalise existing document chunk embeddings in bulk so one cosine index serves all search modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of chunk IDs covered by each UPDATE (default: 5000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count embeddings that are not unit length',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        self.stdout.write(
+            self.style.SUCCESS('Starting embedding normalisation...')
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*), MIN(id), MAX(id) FROM ai_assistant_documentchunk WHERE {NON_UNIT_FILTER};",
+                [NORM_TOLERANCE]
+            )
+            pending, min_id, max_id = cursor.fetchone()
+
+        self.stdout.write(f"Found {pending} embeddings to normalise")
+
+        if dry_run or not pending:
+            if dry_run:
+                self.stdout.write("DRY RUN - No embeddings will be updated")
+            return
+
+        updated_count = 0
+        start_time = time.time()
+
+        # Walk the primary key range so each UPDATE touches a bounded set of rows
+        for batch_start in range(min_id, max_id + 1, batch_size):
+            batch_end = batch_start + batch_size
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        UPDATE ai_assistant_documentchunk dc
+                        SET embedding = (
+                            SELECT array_agg(u.x / vector_norm(dc.embedding) ORDER BY u.ord)::vector
+                            FROM unnest(dc.embedding::real[]) WITH ORDINALITY AS u(x, ord)
+                        )
+                        WHERE dc.id >= %s AND dc.id < %s AND {NON_UNIT_FILTER};
+                    """, [batch_start, batch_end, NORM_TOLERANCE])
+                    updated_count += cursor.rowcount
+
+            elapsed = time.time() - start_time
+            rate = updated_count / elapsed if elapsed > 0 else 0
+            self.stdout.write(f"  IDs {batch_start}-{batch_end - 1}: {updated_count}/{pending} normalised ({rate:.0f} rows/s)")
+
+        # Summary
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(
+            self.style.SUCCESS("Embedding normalisation complete!")
+        )
+        self.stdout.write(f"  Normalised: {updated_count}")
+        self.stdout.write(f"  Time: {time.time() - start_time:.1f}s")
+        self.stdout.write("Cached search results may still hold old scores; they expire with SEARCH_CACHE_TTL.")
@@ -0,0 +1,91 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from ai_assistant.bm25_index import bm25_index
+from ai_assistant.models import DocumentChunk, BM25ChunkLength, BM25Posting
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Build or rebuild the persistent BM25 inverted index used by hybrid search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of chunks indexed per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-index every chunk instead of only chunks missing from the index',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only show index status without indexing',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        full = options['full']
+
+        if options['status']:
+            self._show_status()
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('Building BM25 inverted index...')
+        )
+
+        chunks_query = DocumentChunk.objects.only('id', 'content', 'token_stats').order_by('id')
+        if not full:
+            chunks_query = chunks_query.filter(bm25_length__isnull=True)
+
+        pending = chunks_query.count()
+        self.stdout.write(f"Found {pending} chunks to index")
+
+        indexed_count = 0
+        postings_count = 0
+        last_id = 0
+        start_time = time.time()
+
+        # Keyset pagination keeps each batch query cheap on large tables
+        while True:
+            batch = list(chunks_query.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            try:
+                postings_count += bm25_index.index_chunks(batch, replace=full)
+                indexed_count += len(batch)
+            except Exception as e:
+                logger.error(f"Error indexing chunks up to ID {last_id}: {e}")
+                self.stdout.write(self.style.ERROR(f"  ✗ Batch ending at chunk {last_id} failed: {e}"))
+                continue
+
+            elapsed = time.time() - start_time
+            rate = indexed_count / elapsed if elapsed > 0 else 0
+            self.stdout.write(f"  {indexed_count}/{pending} chunks indexed ({rate:.0f} chunks/s)")
+
+        # Summary
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(
+            self.style.SUCCESS("BM25 index build complete!")
+        )
+        self.stdout.write(f"  Chunks indexed: {indexed_count}")
+        self.stdout.write(f"  Postings written: {postings_count}")
+        self.stdout.write(f"  Time: {time.time() - start_time:.1f}s")
+        self._show_status()
+
+    def _show_status(self):
+        total_chunks = DocumentChunk.objects.count()
+        indexed_chunks = BM25ChunkLength.objects.count()
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(self.style.SUCCESS("BM25 index status:"))
+        self.stdout.write(f"  Indexed chunks: {indexed_chunks}/{total_chunks}")
+        self.stdout.write(f"  Postings: {BM25Posting.objects.count()}")
+        stats = bm25_index.get_corpus_stats()
+        self.stdout.write(f"  Average chunk length: {stats['avg_doc_length']:.1f} terms")
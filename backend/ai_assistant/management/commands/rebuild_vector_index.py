@@ -0,0 +1,77 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from ai_assistant.vector_index import (
+    MANAGED_VECTOR_INDEXES, get_vector_index_status, reindex_vector_index
+)
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the pgvector HNSW indexes on document chunk embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index',
+            choices=MANAGED_VECTOR_INDEXES,
+            help='Rebuild only this index (default: all vector indexes)',
+        )
+        parser.add_argument(
+            '--no-concurrently',
+            action='store_true',
+            help='Use a blocking REINDEX (faster, but locks out writes to chunks)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run ANALYZE on the chunk table after rebuilding',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only show index status without rebuilding',
+        )
+
+    def handle(self, *args, **options):
+        concurrently = not options['no_concurrently']
+        index_names = [options['index']] if options['index'] else MANAGED_VECTOR_INDEXES
+
+        if options['status']:
+            self._show_status()
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('Rebuilding vector indexes...')
+        )
+
+        missing = [s['name'] for s in get_vector_index_status() if not s['exists']]
+        for index_name in index_names:
+            if index_name in missing:
+                raise CommandError(
+                    f"Index {index_name} does not exist. Run: python manage.py migrate ai_assistant"
+                )
+
+            try:
+                self.stdout.write(f"Rebuilding {index_name} ({'concurrently' if concurrently else 'blocking'})...")
+                reindex_vector_index(index_name, concurrently=concurrently)
+                self.stdout.write(self.style.SUCCESS(f"  ✓ {index_name} rebuilt"))
+            except Exception as e:
+                logger.error(f"Error rebuilding {index_name}: {e}")
+                raise CommandError(f"Failed to rebuild {index_name}: {e}")
+
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE ai_assistant_documentchunk;")
+            self.stdout.write(self.style.SUCCESS("  ✓ Table statistics updated"))
+
+        self._show_status()
+
+    def _show_status(self):
+        self.stdout.write("\n" + "="*50)
+        self.stdout.write(self.style.SUCCESS("Vector index status:"))
+        for status in get_vector_index_status():
+            if not status['exists']:
+                self.stdout.write(self.style.WARNING(f"  {status['name']}: missing"))
+                continue
+            validity = "valid" if status['valid'] else "INVALID (rebuild required)"
+            self.stdout.write(f"  {status['name']}: {status['size']}, {validity}")
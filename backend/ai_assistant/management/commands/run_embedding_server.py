@@ -0,0 +1,80 @@
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ai_assistant.embedding_server import MicroBatcher, create_backend, create_embedding_server
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the local embedding server that batches BGE-M3 requests from all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default=getattr(settings, 'EMBEDDING_SERVER_HOST', '127.0.0.1'),
+            help='Interface to bind (default: 127.0.0.1)',
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=getattr(settings, 'EMBEDDING_SERVER_PORT', 8765),
+            help='Port to listen on (default: 8765)',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['ollama', 'sentence-transformers'],
+            default=getattr(settings, 'EMBEDDING_SERVER_BACKEND', 'ollama'),
+            help='Inference backend. Stored vectors were produced by Ollama; switching '
+                 'to sentence-transformers requires re-embedding existing chunks',
+        )
+        parser.add_argument(
+            '--model',
+            help='Model name for the backend (default: bge-m3 for ollama, BAAI/bge-m3 for sentence-transformers)',
+        )
+        parser.add_argument(
+            '--max-batch-size',
+            type=int,
+            default=getattr(settings, 'EMBEDDING_SERVER_MAX_BATCH_SIZE', 64),
+            help='Maximum texts per backend call (default: 64)',
+        )
+        parser.add_argument(
+            '--max-wait-ms',
+            type=int,
+            default=getattr(settings, 'EMBEDDING_SERVER_MAX_WAIT_MS', 10),
+            help='How long a batch waits for more requests (default: 10ms)',
+        )
+
+    def handle(self, *args, **options):
+        backend_name = options['backend']
+        model_name = options['model'] or (
+            'BAAI/bge-m3' if backend_name == 'sentence-transformers'
+            else getattr(settings, 'EMBEDDING_SERVER_MODEL', 'bge-m3')
+        )
+
+        try:
+            backend = create_backend(backend_name, model_name, device=getattr(settings, 'EMBEDDING_DEVICE', 'cpu'))
+        except Exception as e:
+            raise CommandError(f"Could not initialise {backend_name} backend: {e}")
+
+        batcher = MicroBatcher(
+            backend,
+            max_batch_size=options['max_batch_size'],
+            max_wait_ms=options['max_wait_ms'],
+        )
+        server = create_embedding_server(options['host'], options['port'], batcher, model_name)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Embedding server ({backend_name}: {model_name}) listening on "
+                f"http://{options['host']}:{options['port']} "
+                f"(max batch {options['max_batch_size']}, max wait {options['max_wait_ms']}ms)"
+            )
+        )
+        self.stdout.write("Endpoints: POST /embed, GET /metrics, GET /health")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("\nShutting down embedding server...")
+        finally:
+            server.server_close()
@@ -0,0 +1,40 @@
+# Generated manually to add pgvector HNSW indexes on DocumentChunk.embedding
+
+import pgvector.django
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("ai_assistant", "0018_add_truncation_tracking"),
+    ]
+
+    operations = [
+        # Cosine distance (<=>) - ImprovedRAGService and subclasses
+        AddIndexConcurrently(
+            model_name="documentchunk",
+            index=pgvector.django.HnswIndex(
+                ef_construction=64,
+                fields=["embedding"],
+                m=16,
+                name="documentchunk_emb_cos_hnsw",
+                opclasses=["vector_cosine_ops"],
+            ),
+        ),
+        # Negative inner product (<#>) - EnhancedRAGService
+        AddIndexConcurrently(
+            model_name="documentchunk",
+            index=pgvector.django.HnswIndex(
+                ef_construction=64,
+                fields=["embedding"],
+                m=16,
+                name="documentchunk_emb_ip_hnsw",
+                opclasses=["vector_ip_ops"],
+            ),
+        ),
+    ]
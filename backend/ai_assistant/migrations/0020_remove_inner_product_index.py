@@ -0,0 +1,21 @@
+# Generated manually: all RAG tiers now search by cosine distance, so the
+# inner-product HNSW index is no longer used
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("ai_assistant", "0019_add_embedding_hnsw_indexes"),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name="documentchunk",
+            name="documentchunk_emb_ip_hnsw",
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated manually: persistent BM25 inverted index, replaces the whole-corpus
+# cache used by hybrid search. Populate existing chunks with:
+#   python manage.py rebuild_bm25_index
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0020_remove_inner_product_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BM25Posting",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64)),
+                ("tf", models.PositiveIntegerField(default=1)),
+                (
+                    "chunk",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bm25_postings",
+                        to="ai_assistant.documentchunk",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("term", "chunk")},
+            },
+        ),
+        migrations.CreateModel(
+            name="BM25ChunkLength",
+            fields=[
+                (
+                    "chunk",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="bm25_length",
+                        serialize=False,
+                        to="ai_assistant.documentchunk",
+                    ),
+                ),
+                ("length", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated manually: full-text lexical retrieval channel for hybrid search.
+# Adding the generated column rewrites the chunk table once; the GIN index is
+# then built concurrently so searches keep running.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("ai_assistant", "0021_bm25_inverted_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentchunk",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.SearchVector(
+                    "content", config="english"
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="documentchunk",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="documentchunk_search_gin"
+            ),
+        ),
+    ]
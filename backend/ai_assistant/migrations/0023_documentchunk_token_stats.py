@@ -0,0 +1,18 @@
+# Generated manually: per-chunk token statistics computed at ingest
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0022_documentchunk_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentchunk",
+            name="token_stats",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated manually: resumable ingestion checkpoints
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0023_documentchunk_token_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadedfile",
+            name="last_committed_chunk_index",
+            field=models.IntegerField(default=-1),
+        ),
+        migrations.AddField(
+            model_name="documentchunk",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="documentchunk",
+            index=models.Index(
+                fields=["uploaded_file", "chunk_index"], name="documentchunk_file_idx"
+            ),
+        ),
+    ]
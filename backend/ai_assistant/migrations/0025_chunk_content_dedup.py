@@ -0,0 +1,36 @@
+# Generated manually: content-addressed chunk deduplication. The hash index is
+# built concurrently so ingestion and searches keep running. Hashes for chunks
+# ingested before this migration are filled in (and duplicates optionally
+# collapsed onto shared vectors) by:
+#   python manage.py dedup_chunks [--share-vectors]
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("ai_assistant", "0024_ingestion_checkpoints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentchunk",
+            name="canonical_chunk",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicate_chunks",
+                to="ai_assistant.documentchunk",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="documentchunk",
+            index=models.Index(fields=["content_hash"], name="documentchunk_hash_idx"),
+        ),
+    ]
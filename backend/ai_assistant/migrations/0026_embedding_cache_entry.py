@@ -0,0 +1,42 @@
+# Generated manually: durable embedding store, replaces the TTL-bound Redis
+# embedding cache
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0025_chunk_content_dedup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_name", models.CharField(max_length=100)),
+                ("model_version", models.CharField(max_length=64)),
+                ("text_hash", models.CharField(max_length=64)),
+                ("dimensions", models.PositiveSmallIntegerField()),
+                ("vector", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model_name", "model_version", "text_hash"),
+                        name="embedding_cache_entry_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated manually: resumable cursor for bulk embedding backfills
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0026_embedding_cache_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingBackfillCursor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("model_name", models.CharField(max_length=100)),
+                ("model_version", models.CharField(max_length=64)),
+                ("last_chunk_id", models.BigIntegerField(default=0)),
+                ("processed", models.BigIntegerField(default=0)),
+                ("errors", models.BigIntegerField(default=0)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
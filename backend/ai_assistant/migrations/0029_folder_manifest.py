@@ -0,0 +1,84 @@
+# Generated manually: persistent manifests for incremental folder sync
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0028_bulk_import_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FolderManifest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("root", models.CharField(max_length=500, unique=True)),
+                ("hash_algorithm", models.CharField(default="sha256", max_length=16)),
+                ("directories", models.JSONField(default=dict)),
+                ("file_count", models.IntegerField(default=0)),
+                ("last_scan_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="FolderManifestEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("path", models.CharField(max_length=1000)),
+                ("directory", models.CharField(max_length=1000)),
+                ("size", models.BigIntegerField(default=0)),
+                ("mtime_ns", models.BigIntegerField(default=0)),
+                ("inode", models.BigIntegerField(default=0)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "manifest",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entries",
+                        to="ai_assistant.foldermanifest",
+                    ),
+                ),
+                (
+                    "uploaded_file",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="folder_manifest_entries",
+                        to="ai_assistant.uploadedfile",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("manifest", "path"), name="folder_manifest_entry_path"
+                    )
+                ],
+                "indexes": [
+                    models.Index(
+                        fields=["manifest", "directory"], name="folder_manifest_entry_dir"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated manually: semantic answer cache keyed by query-embedding similarity
+
+import pgvector.django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0029_folder_manifest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SemanticCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tier", models.CharField(max_length=32)),
+                ("params", models.CharField(max_length=128)),
+                ("query", models.TextField()),
+                ("embedding", pgvector.django.VectorField(dimensions=1024)),
+                ("chunk_ids", models.JSONField(default=list)),
+                ("result", models.JSONField()),
+                ("corpus_version", models.CharField(max_length=64)),
+                ("hit_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_hit_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["tier", "params", "corpus_version"],
+                        name="semanticcache_scope_idx",
+                    ),
+                    models.Index(fields=["created_at"], name="semanticcache_created_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated manually: bulk import jobs that could not be dispatched are marked failed
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_assistant", "0030_semantic_cache_entry"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bulkimportjob",
+            name="status",
+            field=models.CharField(
+                choices=[("running", "Running"), ("completed", "Completed"), ("failed", "Failed")],
+                default="running",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -2,7 +2,9 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
-from pgvector.django import VectorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from pgvector.django import VectorField, HnswIndex
 import hashlib
 
 class UploadedFile(models.Model):
@@ -18,6 +20,7 @@ class UploadedFile(models.Model):
     # NEW: Processing status tracking for automatic processing
     PROCESSING_STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('queued', 'Queued for Bulk Import'),  # Dispatched by a BulkImportJob, not the upload signal
         ('metadata_extracting', 'Extracting Metadata'),
         ('chunking', 'Generating Chunks'),
         ('embedding', 'Creating Embeddings'),
@@ -46,6 +49,9 @@ class UploadedFile(models.Model):
     chunk_count = models.IntegerField(default=0)  # Actual chunks created
     embedding_count = models.IntegerField(default=0)  # Actual embeddings created
     
+    # Ingestion checkpoint: highest chunk_index committed so far (-1 = none), lets retries resume
+    last_committed_chunk_index = models.IntegerField(default=-1)
+    
     # Document truncation tracking
     is_truncated = models.BooleanField(default=False, help_text="True if document was truncated due to size limits")
     processing_coverage = models.FloatField(default=100.0, help_text="Percentage of document that was processed (0-100)")
@@ -189,6 +195,22 @@ class DocumentChunk(models.Model):
     page_number = models.IntegerField(default=1)
     chunk_index = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)  # Allow null for existing data
+    # SHA-256 of normalised content; lets ingestion retries recognise chunks that are
+    # already stored and lets identical text reuse an existing embedding (chunk_dedup)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Shared-vector dedup (CHUNK_DEDUP_SHARED_VECTORS): duplicates store no embedding
+    # and point at the chunk holding the vector for their content
+    canonical_chunk = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, related_name='duplicate_chunks', null=True, blank=True
+    )
+    # Token length and term counts computed once at ingest (bm25_index.compute_token_stats)
+    token_stats = models.JSONField(null=True, blank=True)
+    # Full-text lexical channel for hybrid search, kept in sync by PostgreSQL
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     def __str__(self):
         filename = (
@@ -200,6 +222,146 @@ class DocumentChunk(models.Model):
 
     class Meta:
         ordering = ['uploaded_file', 'document_file', 'page_number', 'chunk_index']
+        indexes = [
+            # ANN index - every RAG tier searches by cosine distance (<=>)
+            HnswIndex(
+                name='documentchunk_emb_cos_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+            # Lexical (full-text) retrieval for exact keyword hits
+            GinIndex(name='documentchunk_search_gin', fields=['search_vector']),
+            # Per-file resume point lookups during ingestion
+            models.Index(fields=['uploaded_file', 'chunk_index'], name='documentchunk_file_idx'),
+            # Content-addressed embedding reuse
+            models.Index(fields=['content_hash'], name='documentchunk_hash_idx'),
+        ]
+
+class BM25Posting(models.Model):
+    """Inverted index entry: one term occurring in one chunk, with its term frequency"""
+    term = models.CharField(max_length=64)
+    chunk = models.ForeignKey(DocumentChunk, on_delete=models.CASCADE, related_name='bm25_postings')
+    tf = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        # (term, chunk) serves both the per-term document frequency count and
+        # the postings lookup for query terms
+        unique_together = ['term', 'chunk']
+
+class BM25ChunkLength(models.Model):
+    """Token count of an indexed chunk (BM25 document length)"""
+    chunk = models.OneToOneField(DocumentChunk, on_delete=models.CASCADE, primary_key=True, related_name='bm25_length')
+    length = models.PositiveIntegerField(default=0)
+
+class EmbeddingCacheEntry(models.Model):
+    """Durable embedding cache (embedding_store): one float32 vector per model version and text"""
+    model_name = models.CharField(max_length=100)
+    model_version = models.CharField(max_length=64)
+    text_hash = models.CharField(max_length=64)  # SHA-256 of normalised text
+    dimensions = models.PositiveSmallIntegerField()
+    vector = models.BinaryField()  # Little-endian float32
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model_name', 'model_version', 'text_hash'],
+                name='embedding_cache_entry_key',
+            ),
+        ]
+
+class EmbeddingBackfillCursor(models.Model):
+    """Resume point of a bulk embedding backfill (embedding_backfill / add_embeddings)"""
+    name = models.CharField(max_length=100, unique=True)
+    model_name = models.CharField(max_length=100)
+    model_version = models.CharField(max_length=64)
+    # Every chunk with id <= last_chunk_id has been handled
+    last_chunk_id = models.BigIntegerField(default=0)
+    processed = models.BigIntegerField(default=0)
+    errors = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+class BulkImportJob(models.Model):
+    """Aggregated progress of a bulk import fanned out into per-file tasks (bulk_import.py)"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),  # Could not be dispatched
+    ]
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    # UploadedFile ids in dispatch order (smallest files first)
+    file_ids = models.JSONField(default=list)
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+    processed_bytes = models.BigIntegerField(default=0)
+    concurrency = models.IntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+class FolderManifest(models.Model):
+    """Incremental scan state of a watched folder (folder_sync)"""
+    root = models.CharField(max_length=500, unique=True)
+    hash_algorithm = models.CharField(max_length=16, default='sha256')
+    # Relative directory path -> {'mtime_ns': ..., 'subdirs': [...]}; a directory
+    # whose mtime is unchanged is not listed again on the next scan
+    directories = models.JSONField(default=dict)
+    file_count = models.IntegerField(default=0)
+    last_scan_at = models.DateTimeField(null=True, blank=True)
+
+class FolderManifestEntry(models.Model):
+    """One file of a watched folder as of the last scan"""
+    manifest = models.ForeignKey(FolderManifest, on_delete=models.CASCADE, related_name='entries')
+    path = models.CharField(max_length=1000)  # Relative to the manifest root
+    directory = models.CharField(max_length=1000)  # Relative parent directory
+    size = models.BigIntegerField(default=0)
+    mtime_ns = models.BigIntegerField(default=0)
+    inode = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64)
+    # File imported from this path (None for duplicates of content imported elsewhere)
+    uploaded_file = models.ForeignKey(
+        UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='folder_manifest_entries'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['manifest', 'path'], name='folder_manifest_entry_path'),
+        ]
+        indexes = [
+            models.Index(fields=['manifest', 'directory'], name='folder_manifest_entry_dir'),
+        ]
+
+class SemanticCacheEntry(models.Model):
+    """A generated RAG answer, reused for similar later queries (semantic_cache.py)"""
+    tier = models.CharField(max_length=32)  # QueryHistory.query_type of the pipeline
+    params = models.CharField(max_length=128)  # Model and pipeline parameters the answer depends on
+    query = models.TextField()
+    embedding = VectorField(dimensions=1024)  # Normalised BGE-M3 query embedding
+    chunk_ids = models.JSONField(default=list)  # Chunks retrieved for the query
+    result = models.JSONField()
+    corpus_version = models.CharField(max_length=64)
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Lookups scan the (small) set of recent entries of one scope exactly
+            models.Index(fields=['tier', 'params', 'corpus_version'], name='semanticcache_scope_idx'),
+            models.Index(fields=['created_at'], name='semanticcache_created_idx'),
+        ]
 
 # Legacy PDFDocument for backward compatibility
 class PDFDocument(models.Model):
@@ -0,0 +1,192 @@
+"""
+Parallel PDF Text Extraction
+
+PyMuPDF text extraction holds the GIL, so large PDFs are split into
+contiguous page-range shards that are extracted in separate worker
+processes (each opens the PDF itself) and merged back in page order.
+
+- PDF_EXTRACT_WORKERS: worker processes (0 = one per CPU core)
+- PDF_EXTRACT_MAX_WORKERS: upper bound on the above. Every process that
+  extracts PDFs (each Celery child, each gunicorn worker) keeps its own
+  pool, so the machine-wide total is processes x this cap
+- PDF_PARALLEL_MIN_PAGES: documents with fewer pages are extracted
+  in-process (fast path; process start-up would cost more than it saves)
+
+The pool is created lazily, kept for the life of the process and uses the
+'spawn' start method so workers never inherit threads or database
+connections. Celery prefork children are daemonic, and the standard
+library refuses to start children from a daemonic process; there the pool
+is a billiard (Celery's multiprocessing fork) pool, which allows it. If
+no pool can be started extraction falls back to the sequential path.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_pool_unavailable = False
+
+
+def _extract_range(file_path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end) - runs in a worker process"""
+    texts = []
+    doc = fitz.open(file_path)
+    try:
+        for page_num in range(start, end):
+            try:
+                texts.append(doc[page_num].get_text())
+            except Exception as e:
+                logger.warning(f"Error extracting PDF page {page_num + 1}: {e}")
+                texts.append('')
+    finally:
+        doc.close()
+    return texts
+
+
+def get_worker_count() -> int:
+    from django.conf import settings
+
+    workers = getattr(settings, 'PDF_EXTRACT_WORKERS', 0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    max_workers = getattr(settings, 'PDF_EXTRACT_MAX_WORKERS', 4)
+    return max(1, min(workers, max_workers)) if max_workers > 0 else workers
+
+
+class _BilliardFuture:
+    """Future-style result() over a billiard AsyncResult"""
+
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def result(self):
+        return self._async_result.get()
+
+
+class BilliardExecutor:
+    """submit()/shutdown() over a billiard pool, usable from daemonic Celery children"""
+
+    def __init__(self, max_workers: int):
+        import billiard
+
+        self._pool = billiard.get_context('spawn').Pool(processes=max_workers)
+
+    def submit(self, fn, *args) -> _BilliardFuture:
+        return _BilliardFuture(self._pool.apply_async(fn, args))
+
+    def shutdown(self, wait: bool = True):
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+
+def _create_pool(workers: int):
+    if multiprocessing.current_process().daemon:
+        # Celery prefork child: only billiard may start processes here
+        return BilliardExecutor(workers)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _get_pool(workers: int):
+    """Shared process pool, or None if this process cannot start children"""
+    global _pool, _pool_workers, _pool_unavailable
+
+    with _pool_lock:
+        if _pool_unavailable:
+            return None
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+                _pool = None
+            try:
+                _pool = _create_pool(workers)
+            except Exception as e:
+                logger.warning(f"Cannot start PDF extraction workers, extracting PDFs sequentially: {e}")
+                _pool_unavailable = True
+                return None
+            _pool_workers = workers
+        return _pool
+
+
+def _shard_ranges(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split pages into contiguous, near-equal [start, end) ranges"""
+    size, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for shard in range(shards):
+        end = start + size + (1 if shard < extra else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def iter_page_texts(file_path: str, doc: fitz.Document = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for every page, in page order.
+
+    Large documents are extracted in parallel and each shard is yielded as
+    soon as it and all earlier shards are done. An already open doc is
+    reused for the sequential fast path.
+    """
+    from django.conf import settings
+
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(file_path)
+    try:
+        page_count = doc.page_count
+        workers = min(get_worker_count(), page_count)
+        min_pages = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 64)
+        parallel = workers > 1 and page_count >= min_pages and bool(file_path) and os.path.exists(file_path)
+        pool = _get_pool(workers) if parallel else None
+
+        if pool is not None:
+            # Parallel path: workers open the file themselves
+            if own_doc:
+                doc.close()
+                doc = None
+            try:
+                futures = [
+                    pool.submit(_extract_range, file_path, start, end)
+                    for start, end in _shard_ranges(page_count, workers)
+                ]
+            except Exception as e:
+                logger.warning(f"Parallel PDF extraction unavailable, extracting sequentially: {e}")
+                futures = None
+
+            if futures is not None:
+                page_number = 1
+                for future in futures:
+                    for text in future.result():
+                        yield page_number, text
+                        page_number += 1
+                return
+
+            if own_doc:
+                doc = fitz.open(file_path)
+
+        # Fast path for small documents
+        for page_num in range(page_count):
+            try:
+                text = doc[page_num].get_text()
+            except Exception as e:
+                logger.warning(f"Error extracting PDF page {page_num + 1}: {e}")
+                text = ''
+            yield page_num + 1, text
+    finally:
+        if own_doc and doc is not None:
+            doc.close()
+
+
+def extract_page_texts(file_path: str, doc: fitz.Document = None) -> List[str]:
+    """Text of every page in page order (see iter_page_texts)"""
+    return [text for _, text in iter_page_texts(file_path, doc=doc)]
@@ -18,6 +18,7 @@ from PIL import Image
 import pytesseract
 import cv2
 import numpy as np
+from .pdf_extraction import extract_page_texts
 
 logger = logging.getLogger(__name__)
 
@@ -230,12 +231,15 @@ class PDFProcessor:
         """Extract content from all pages"""
         pages = []
         
+        # Text of large documents is extracted by parallel page-range workers
+        page_texts = extract_page_texts(doc.name, doc=doc)
+        
         for page_num in range(doc.page_count):
             try:
                 page = doc[page_num]
                 
                 # Extract text
-                text = page.get_text()
+                text = page_texts[page_num]
                 
                 # Extract images
                 images = self._extract_page_images(page, page_num) if self.image_extraction_enabled else []
@@ -7,7 +7,17 @@ from pathlib import Path
 from django.db import connection
 from django.conf import settings
 from django.core.cache import cache
-from .models import DocumentFile, UploadedFile, DocumentChunk, QueryHistory
+from .models import DocumentFile, UploadedFile, QueryHistory
+from .chunk_writer import ChunkBulkWriter
+from .retrieval_core import vector_retriever
+from .embedding_client import embedding_client, EmbeddingError
+from .pdf_extraction import extract_page_texts
+from .chunk_dedup import chunk_deduplicator
+from .cache_codec import cache_codec
+from .llm_streaming import cached_token_stream, stream_ollama_chat, stream_rag_pipeline
+from .async_rag import async_ollama_client, async_rag_pipeline
+from .single_flight import single_flight
+from .semantic_cache import semantic_cache
 import logging
 import json
 
@@ -18,8 +28,7 @@ class EnhancedRAGService:
         self.model_name = model_name or getattr(settings, 'OLLAMA_MODEL', 'qwen2.5:latest')
         self.ollama_url = getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
         self.embedding_model = getattr(settings, 'EMBEDDING_MODEL', 'bge-m3')
-        # Standardized cache settings across all RAG services
-        self.embedding_cache_ttl = getattr(settings, 'EMBEDDING_CACHE_TTL', 24 * 3600)  # 24 hours (standardized)
+        # Standardized cache settings across all RAG services (embeddings live in embedding_store)
         self.search_cache_ttl = getattr(settings, 'SEARCH_CACHE_TTL', 3600)  # 1 hour
         self.response_cache_ttl = getattr(settings, 'RESPONSE_CACHE_TTL', 1800)  # 30 minutes
         
@@ -35,72 +44,33 @@ class EnhancedRAGService:
         - No hash-based fallback
         - Will retry but NO compromises on model quality
         """
-        # Create cache key based on text hash
-        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-        cache_key = f"embedding_{text_hash}"
-        
-        # Try to get from cache first
-        cached_embedding = cache.get(cache_key)
-        if cached_embedding is not None:
-            logger.info(f"Using cached embedding for text hash: {text_hash[:8]}...")
-            return cached_embedding
-        
-        # Use BGE-M3 ONLY - NO FALLBACKS
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                response = requests.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={
-                        "model": "bge-m3",  # BGE-M3 ONLY
-                        "prompt": text
-                    },
-                    timeout=60  # Longer timeout for quality
-                )
-                response.raise_for_status()
-                embedding = response.json()["embedding"]
-                
-                # Ensure 1024 dimensions (BGE-M3 standard)
-                if len(embedding) != 1024:
-                    if len(embedding) < 1024:
-                        # Pad with zeros
-                        embedding = list(embedding) + [0.0] * (1024 - len(embedding))
-                        logger.warning(f"Padded embedding to 1024 dimensions")
-                    else:
-                        # Truncate
-                        embedding = embedding[:1024]
-                        logger.warning(f"Truncated embedding to 1024 dimensions")
-                
-                # Cache the embedding
-                cache.set(cache_key, embedding, self.embedding_cache_ttl)
-                logger.info(f"Successfully used BGE-M3 for embedding and cached it")
-                return embedding
-                
-            except requests.exceptions.Timeout:
-                retry_count += 1
-                logger.warning(f"BGE-M3 timeout (attempt {retry_count}/{max_retries})")
-                if retry_count >= max_retries:
-                    raise Exception("BGE-M3 embedding timeout after multiple retries")
-                    
-            except Exception as e:
-                logger.error(f"BGE-M3 embedding error: {e}")
-                if retry_count >= max_retries - 1:
-                    raise Exception(f"BGE-M3 embedding failed after all retries: {str(e)}")
-                retry_count += 1
-                continue
-        
-        # Should never reach here, but if we do, raise error
-        raise Exception("Failed to get BGE-M3 embedding after all retries")
+        # Use BGE-M3 ONLY - NO FALLBACKS (the client retries before giving up and
+        # serves previously embedded text from the durable embedding store)
+        try:
+            return self._fit_embedding_dimensions(embedding_client.embed_one(text))
+        except EmbeddingError as e:
+            logger.error(f"BGE-M3 embedding error: {e}")
+            raise Exception(f"BGE-M3 embedding failed after all retries: {str(e)}")
+    
+    def _fit_embedding_dimensions(self, embedding):
+        """Ensure 1024 dimensions (BGE-M3 standard)"""
+        if len(embedding) != 1024:
+            if len(embedding) < 1024:
+                # Pad with zeros
+                embedding = list(embedding) + [0.0] * (1024 - len(embedding))
+                logger.warning(f"Padded embedding to 1024 dimensions")
+            else:
+                # Truncate
+                embedding = embedding[:1024]
+                logger.warning(f"Truncated embedding to 1024 dimensions")
+        return embedding
     
     def get_embeddings_from_ollama_batch(self, texts):
         """Get embeddings for multiple texts efficiently with batch processing
         
-        This method processes a batch of texts by:
-        1. Checking cache first for each text (fast lookup)
-        2. Only calling Ollama API for uncached texts
-        3. Processing remaining uncached texts in parallel for efficiency
+        Empty texts get the simple fallback; all other texts are sent in one
+        request through the embedding client, which serves previously
+        embedded text from the durable embedding store.
         
         Args:
             texts: List of text strings to embed
@@ -108,105 +78,33 @@ class EnhancedRAGService:
         Returns:
             List of embeddings corresponding to input texts
         """
-        import hashlib
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
         # Safety check: Limit batch size to prevent memory issues
         MAX_BATCH_SIZE = 50
-        MAX_CONCURRENT_WORKERS = 10
         
         if len(texts) > MAX_BATCH_SIZE:
             logger.warning(f"Batch too large ({len(texts)} chunks), limiting to {MAX_BATCH_SIZE}")
             texts = texts[:MAX_BATCH_SIZE]
         
         results = [None] * len(texts)
-        cache_hits = 0
-        api_calls_needed = []
+        to_embed = []
         
-        # Phase 1: Check cache for all texts
         for idx, text in enumerate(texts):
             if not text.strip():
                 results[idx] = self._simple_embedding_fallback(text)
-                continue
-                
-            text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-            cache_key = f"embedding_{text_hash}"
-            cached_embedding = cache.get(cache_key)
-            
-            if cached_embedding is not None:
-                results[idx] = cached_embedding
-                cache_hits += 1
             else:
-                api_calls_needed.append((idx, text))
-        
-        if cache_hits > 0:
-            logger.info(f"Cache hits: {cache_hits}/{len(texts)} chunks")
+                to_embed.append((idx, text))
         
-        # Phase 2: Process uncached texts with parallel API calls
-        if api_calls_needed:
-            logger.info(f"Fetching {len(api_calls_needed)} embeddings from Ollama (parallel processing)")
-            
-            def fetch_embedding(idx, text):
-                """Fetch embedding using BGE-M3 ONLY - NO FALLBACKS"""
-                max_retries = 3
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        response = requests.post(
-                            f"{self.ollama_url}/api/embeddings",
-                            json={
-                                "model": "bge-m3",  # BGE-M3 ONLY
-                                "prompt": text
-                            },
-                            timeout=60  # Longer timeout for quality
-                        )
-                        response.raise_for_status()
-                        embedding = response.json()["embedding"]
-                        
-                        # Ensure 1024 dimensions
-                        if len(embedding) != 1024:
-                            if len(embedding) < 1024:
-                                embedding = list(embedding) + [0.0] * (1024 - len(embedding))
-                            else:
-                                embedding = embedding[:1024]
-                        
-                        # Cache it
-                        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-                        cache_key = f"embedding_{text_hash}"
-                        cache.set(cache_key, embedding, self.embedding_cache_ttl)
-                        
-                        return idx, embedding
-                        
-                    except requests.exceptions.Timeout:
-                        retry_count += 1
-                        logger.warning(f"BGE-M3 timeout for text {idx} (attempt {retry_count}/{max_retries})")
-                        if retry_count >= max_retries:
-                            raise Exception(f"BGE-M3 embedding timeout for text {idx}")
-                            
-                    except Exception as e:
-                        logger.error(f"BGE-M3 embedding error for text {idx}: {e}")
-                        retry_count += 1
-                        if retry_count >= max_retries:
-                            raise Exception(f"BGE-M3 embedding failed for text {idx}: {str(e)}")
-                        continue
-                
-                raise Exception(f"Failed to get BGE-M3 embedding for text {idx}")
+        if to_embed:
+            logger.info(f"Fetching {len(to_embed)} embeddings from BGE-M3 (one batch)")
             
-            # Use ThreadPoolExecutor for parallel processing (limited to prevent server overload)
-            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_WORKERS) as executor:
-                futures = {executor.submit(fetch_embedding, idx, text): (idx, text) 
-                          for idx, text in api_calls_needed}
-                
-                for future in as_completed(futures):
-                    try:
-                        idx, embedding = future.result()
-                        results[idx] = embedding
-                    except Exception as e:
-                        idx, text = futures[future]
-                        logger.error(f"Error processing chunk {idx}: {e}")
-                        # NO FALLBACK - Quality requirement
-                        raise Exception(f"BGE-M3 batch processing failed for chunk {idx}: {str(e)}")
+            try:
+                embeddings = embedding_client.embed([text for _, text in to_embed])
+            except EmbeddingError as e:
+                # NO FALLBACK - Quality requirement
+                raise Exception(f"BGE-M3 batch processing failed: {str(e)}")
+            
+            for (idx, _), embedding in zip(to_embed, embeddings):
+                results[idx] = self._fit_embedding_dimensions(embedding)
         
         return results
     
@@ -276,6 +174,7 @@ class EnhancedRAGService:
             doc = None
             chunks = []
             vectors = []
+            canonical_ids = []
             
             try:
                 doc = fitz.open(file_path)
@@ -283,15 +182,10 @@ class EnhancedRAGService:
                 
                 logger.info(f"Processing PDF with {total_pages} pages")
                 
-                # Process all pages - batch processing handles memory automatically
-                for page_num in range(1, total_pages + 1):
-                    page = doc[page_num - 1]  # Pages are 0-indexed
-                    text = page.get_text()
-                    if text.strip():
-                        # Generate embedding using Ollama
-                        embedding = self.get_embedding_from_ollama(text)
-                        chunks.append(text)
-                        vectors.append(embedding)
+                # Process all pages - large PDFs are extracted in parallel page ranges
+                chunks = [text for text in extract_page_texts(file_path, doc=doc) if text.strip()]
+                # Pages seen before (boilerplate shared across manual versions) reuse stored vectors
+                vectors, canonical_ids = chunk_deduplicator.embed(chunks, self.get_embeddings_from_ollama_batch)
             finally:
                 if doc:
                     doc.close()
@@ -315,15 +209,17 @@ class EnhancedRAGService:
                 uploaded_by=request.user if hasattr(request, 'user') else None
             )
             
-            # Store document chunks with embeddings
-            for idx, (content, embedding) in enumerate(zip(chunks, vectors)):
-                DocumentChunk.objects.create(
-                    uploaded_file=uploaded_file,
-                    content=content,
-                    embedding=embedding,
-                    page_number=idx + 1,
-                    chunk_index=idx
-                )
+            # Store document chunks with embeddings (batched INSERTs, one transaction per batch)
+            with ChunkBulkWriter() as writer:
+                for idx, (content, embedding) in enumerate(zip(chunks, vectors)):
+                    writer.add(
+                        uploaded_file=uploaded_file,
+                        content=content,
+                        embedding=embedding,
+                        page_number=idx + 1,
+                        chunk_index=idx,
+                        canonical_chunk_id=canonical_ids[idx] if idx < len(canonical_ids) else None
+                    )
             
             return {
                 'success': True,
@@ -386,6 +282,7 @@ class EnhancedRAGService:
                 file_extension = document_file.name.split('.')[-1].lower() if hasattr(document_file, 'name') and '.' in document_file.name else 'pdf'
             chunks = []
             vectors = []
+            canonical_ids = []
             
             if file_extension == 'pdf':
                 # Process PDF with PyMuPDF
@@ -397,14 +294,10 @@ class EnhancedRAGService:
                     
                     logger.info(f"Processing PDF with {total_pages} pages")
                     
-                    # Process all pages - memory usage is constant per page
-                    for page_num in range(1, total_pages + 1):
-                        page = doc[page_num - 1]  # Pages are 0-indexed
-                        text = page.get_text()
-                        if text.strip():
-                            embedding = self.get_embedding_from_ollama(text)
-                            chunks.append(text)
-                            vectors.append(embedding)
+                    # Process all pages - large PDFs are extracted in parallel page ranges
+                    chunks = [text for text in extract_page_texts(file_path, doc=doc) if text.strip()]
+                    # Pages seen before reuse stored vectors
+                    vectors, canonical_ids = chunk_deduplicator.embed(chunks, self.get_embeddings_from_ollama_batch)
                     page_count = total_pages
                 finally:
                     if doc:
@@ -453,15 +346,15 @@ class EnhancedRAGService:
                         
                         logger.info(f"Processing batch {batch_idx // batch_size + 1}/{total_batches}")
                         
-                        # Use batch embedding method for efficiency
-                        batch_embeddings = self.get_embeddings_from_ollama_batch(batch)
+                        # Use batch embedding method for efficiency; repeated text reuses stored vectors
+                        batch_embeddings, batch_canonical_ids = chunk_deduplicator.embed(
+                            batch, self.get_embeddings_from_ollama_batch
+                        )
                         
                         # Store results
-                        for idx, chunk_text in enumerate(batch):
-                            if chunk_text.strip():
-                                embedding = batch_embeddings[idx] if idx < len(batch_embeddings) else self.get_embedding_from_ollama(chunk_text)
-                                chunks.append(chunk_text)
-                                vectors.append(embedding)
+                        chunks.extend(batch)
+                        vectors.extend(batch_embeddings)
+                        canonical_ids.extend(batch_canonical_ids)
                 
                 page_count = 1
                 if not chunks:
@@ -493,15 +386,17 @@ class EnhancedRAGService:
                 uploaded_by=user if user else None
             )
             
-            # Store document chunks with embeddings
-            for idx, (content, embedding) in enumerate(zip(chunks, vectors)):
-                DocumentChunk.objects.create(
-                    uploaded_file=uploaded_file,
-                    content=content,
-                    embedding=embedding,
-                    page_number=idx + 1,
-                    chunk_index=idx
-                )
+            # Store document chunks with embeddings (batched INSERTs, one transaction per batch)
+            with ChunkBulkWriter() as writer:
+                for idx, (content, embedding) in enumerate(zip(chunks, vectors)):
+                    writer.add(
+                        uploaded_file=uploaded_file,
+                        content=content,
+                        embedding=embedding,
+                        page_number=idx + 1,
+                        chunk_index=idx,
+                        canonical_chunk_id=canonical_ids[idx] if idx < len(canonical_ids) else None
+                    )
             
             return {
                 'success': True,
@@ -518,15 +413,18 @@ class EnhancedRAGService:
                 'error': str(e)
             }
 
-    def search_relevant_documents(self, query, top_k=10):  # Increased from 8 to 10 for maximum comprehensive results
-        """Search for relevant documents using vector similarity with Ollama embeddings and caching"""
+    def search_relevant_documents(self, query, top_k=10, ef_search=None):  # Increased from 8 to 10 for maximum comprehensive results
+        """Search for relevant documents using vector similarity with Ollama embeddings and caching
+
+        ef_search optionally overrides VECTOR_INDEX_EF_SEARCH for this query.
+        """
         try:
             # Create cache key for search results
             query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
             cache_key = f"search_{query_hash}_{top_k}"
             
             # Try to get from cache first
-            cached_results = cache.get(cache_key)
+            cached_results = cache_codec.get_results(cache_key)
             if cached_results is not None:
                 logger.info(f"Using cached search results for query: {query[:30]}...")
                 return cached_results
@@ -534,61 +432,11 @@ class EnhancedRAGService:
             # Generate query embedding using Ollama (BGE-M3 only)
             query_embedding = self.get_embedding_from_ollama(query)
             
-            # Search using pgvector with file information
-            # CRITICAL: Only search files that are fully processed and ready
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
-                           COALESCE(uf.filename, 'Unknown Document') as filename,
-                           COALESCE(uf.file_hash, '') as file_hash, 
-                           COALESCE(uf.file_size, 0) as file_size
-                    FROM ai_assistant_documentchunk dc
-                    LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
-                    WHERE dc.embedding IS NOT NULL
-                    ORDER BY dc.embedding <#> %s::vector
-                    LIMIT %s;
-                """, [query_embedding, top_k])
-                results = cursor.fetchall()
-            
-            formatted_results = []
-            for row in results:
-                uploaded_file_id = row[2]
-                page_number = row[3] or 1
-                filename = row[5] or "Unknown Document"
-                content = row[1]
-                
-                # Generate title: use filename if valid, otherwise extract from content
-                if filename and filename != "Unknown Document":
-                    title = filename
-                else:
-                    # Extract first meaningful words from content as title
-                    words = content.split()[:10]  # First 10 words
-                    title = " ".join(words)
-                    if len(title) > 100:
-                        title = title[:100] + "..."
-                
-                # Create view URL for PDF viewer
-                view_url = None
-                if uploaded_file_id:
-                    view_url = f"/api/ai/pdf/{uploaded_file_id}/view/?page={page_number}"
-                
-                formatted_results.append({
-                    "id": row[0],
-                    "content": content,
-                    "uploaded_file_id": uploaded_file_id,
-                    "page_number": page_number,
-                    "chunk_index": row[4],
-                    "filename": filename,
-                    "title": title,  # Smart title: filename or content excerpt
-                    "file_hash": row[6],
-                    "file_size": row[7],
-                    "download_url": f"/api/ai/documents/{uploaded_file_id}/download/" if uploaded_file_id else None,
-                    "view_url": view_url,
-                    "source_display": f"{filename} (Page {page_number})" if filename != "Unknown Document" else f"Page {page_number}"
-                })
+            # Shared cosine retrieval core (same index and scores as every other tier)
+            formatted_results = vector_retriever.search(query_embedding, top_k, ef_search=ef_search)
             
             # Cache the results
-            cache.set(cache_key, formatted_results, self.response_cache_ttl)
+            cache_codec.set_results(cache_key, formatted_results, self.response_cache_ttl)
             logger.info(f"Cached search results for query: {query[:30]}...")
             
             return formatted_results
@@ -597,6 +445,25 @@ class EnhancedRAGService:
             logger.error(f"Error in vector search: {e}")
             return []
 
+    def _generation_payload(self, prompt, model):
+        """/api/chat request body shared by the blocking and streaming generators"""
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": "You are a helpful assistant. Use only the following context to answer the question. Be concise and accurate."},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False,
+            "options": {
+                "num_predict": 768,  # Increased from 512 for maximum comprehensive responses
+                "temperature": 0.3,  # Lower temperature for more focused responses
+                "top_p": 0.9,
+                "top_k": 40,
+                "repeat_penalty": 1.1,
+                "num_ctx": 4096  # Increased from 2048 for maximum context
+            }
+        }
+
     def ollama_generate(self, prompt, model=None):
         """Generate response using Ollama with caching"""
         if model is None:
@@ -615,22 +482,7 @@ class EnhancedRAGService:
         try:
             response = requests.post(
                 f"{self.ollama_url}/api/chat",
-                json={
-                    "model": model,
-                    "messages": [
-                        {"role": "system", "content": "You are a helpful assistant. Use only the following context to answer the question. Be concise and accurate."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "stream": False,
-                    "options": {
-                        "num_predict": 768,  # Increased from 512 for maximum comprehensive responses
-                        "temperature": 0.3,  # Lower temperature for more focused responses
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "repeat_penalty": 1.1,
-                        "num_ctx": 4096  # Increased from 2048 for maximum context
-                    }
-                },
+                json=self._generation_payload(prompt, model),
                 timeout=getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)  # Reduced timeout
             )
             response.raise_for_status()
@@ -645,11 +497,31 @@ class EnhancedRAGService:
             logger.error(f"Error generating response: {e}")
             raise
 
+    def stream_ollama_generate(self, prompt, model=None):
+        """Streaming ollama_generate: yields response pieces, shares its cache"""
+        if model is None:
+            model = self.model_name
+        
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        return cached_token_stream(
+            f"response_{prompt_hash}",
+            self.response_cache_ttl,
+            lambda: stream_ollama_chat(
+                self.ollama_url,
+                self._generation_payload(prompt, model),
+                getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+        )
+
     def generate_response(self, query, context_documents):
         """Generate response with proper context handling - optimized for maximum comprehensive answers"""
         if not context_documents:
             return "I don't know."
         
+        return self.ollama_generate(self.build_response_prompt(query, context_documents))
+
+    def build_response_prompt(self, query, context_documents):
+        """RAG prompt for generate_response"""
         # Build context with reference numbers - use all 10 documents for maximum comprehensive responses
         context_lines = []
         for idx, doc in enumerate(context_documents[:10], 1):  # Increased from 6 to 10 documents
@@ -675,55 +547,21 @@ class EnhancedRAGService:
             "Answer:"
         )
         
-        return self.ollama_generate(prompt)
+        return prompt
 
     def query_with_rag(self, query, top_k=10, user=None):  # Increased from 8 to 10
-        """Main RAG pipeline with caching"""
+        """Main RAG pipeline with caching; concurrent identical queries share one computation"""
         try:
             # Create cache key for entire RAG query
             query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
             cache_key = f"rag_query_{query_hash}_{top_k}"
             
-            # Try to get from cache first
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                logger.info(f"Using cached RAG result for query: {query[:30]}...")
-                return cached_result
-            
-            # Search for relevant documents
-            relevant_docs = self.search_relevant_documents(query, top_k)
-            
-            if not relevant_docs:
-                response = "I don't know."
-                result = {
-                    "response": response,
-                    "sources": [],
-                    "query": query
-                }
-            else:
-                # Generate response
-                response = self.generate_response(query, relevant_docs)
-                result = {
-                    "response": response,
-                    "sources": relevant_docs,
-                    "query": query
-                }
-            
-            # Cache the result
-            cache.set(cache_key, result, self.response_cache_ttl)
-            logger.info(f"Cached RAG result for query: {query[:30]}...")
-            
-            # Save to history
-            if user:
-                QueryHistory.objects.create(
-                    query=query,
-                    response=response,
-                    sources=relevant_docs,
-                    query_type='rag',
-                    user=user
-                )
-            
-            return result
+            return single_flight.run(
+                cache_key,
+                self.response_cache_ttl,
+                compute=lambda: self._compute_rag_query(query, top_k, user),
+                revalidate=lambda: self._compute_rag_query(query, top_k),
+            )
             
         except Exception as e:
             logger.error(f"Error in RAG query: {e}")
@@ -733,6 +571,87 @@ class EnhancedRAGService:
                 "query": query
             }
 
+    def _compute_rag_query(self, query, top_k, user=None):
+        """query_with_rag on a cache miss"""
+        # Search for relevant documents
+        relevant_docs = self.search_relevant_documents(query, top_k)
+        
+        if not relevant_docs:
+            result = self._rag_result(query, relevant_docs, "I don't know.")
+        else:
+            # Generate response (or reuse the answer to an equivalent query)
+            result = semantic_cache.get_or_generate(
+                'rag', f"{self.model_name}:top_k={top_k}", query, relevant_docs,
+                lambda: self._rag_result(query, relevant_docs, self.generate_response(query, relevant_docs))
+            )
+        response = result['response']
+        logger.info(f"Computed RAG result for query: {query[:30]}...")
+        
+        # Save to history
+        if user:
+            QueryHistory.objects.create(
+                query=query,
+                response=response,
+                sources=relevant_docs,
+                query_type='rag',
+                user=user
+            )
+        
+        return result
+
+    def _rag_result(self, query, relevant_docs, response):
+        return {
+            "response": response,
+            "sources": relevant_docs,
+            "query": query
+        }
+
+    def stream_query_with_rag(self, query, top_k=10, user=None):
+        """query_with_rag as (event, data) pairs: sources, then tokens, then the result"""
+        query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+        return stream_rag_pipeline(
+            query,
+            user,
+            cache_key=f"rag_query_{query_hash}_{top_k}",
+            cache_ttl=self.response_cache_ttl,
+            history_type='rag',
+            search=lambda: self.search_relevant_documents(query, top_k),
+            stream_answer=lambda docs: self.stream_ollama_generate(self.build_response_prompt(query, docs)),
+            build_result=lambda docs, response: self._rag_result(query, docs, response),
+        )
+
+    async def aquery_with_rag(self, query, top_k=10, user=None):
+        """query_with_rag on the async request path (non-blocking generation)"""
+        async def generate(prompt):
+            prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+            return await async_ollama_client.cached_chat(
+                f"response_{prompt_hash}",
+                self.response_cache_ttl,
+                self._generation_payload(prompt, self.model_name),
+                getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
+            )
+
+        try:
+            query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+            return await async_rag_pipeline(
+                query,
+                user,
+                cache_key=f"rag_query_{query_hash}_{top_k}",
+                cache_ttl=self.response_cache_ttl,
+                history_type='rag',
+                search=lambda: self.search_relevant_documents(query, top_k),
+                prepare=lambda docs: self.build_response_prompt(query, docs),
+                generate=generate,
+                build_result=lambda docs, response: self._rag_result(query, docs, response),
+            )
+        except Exception as e:
+            logger.error(f"Error in async RAG query: {e}")
+            return {
+                "response": f"Error processing query: {str(e)}",
+                "sources": [],
+                "query": query
+            }
+
     def get_index_info(self):
         """Get information about the vector index"""
         try:
@@ -2,75 +2,185 @@
 Result Reranking using Cross-Encoder and Advanced Scoring
 """
 import logging
+import threading
+import time
 from typing import List, Dict, Tuple
 import re
 import hashlib
 from django.core.cache import cache
 from django.conf import settings
+import numpy as np
+from .bm25_index import bm25_index, tokenize
+from .hybrid_search import top_k_indices
+from .context_packer import context_packer, document_score
 
 logger = logging.getLogger(__name__)
 
 class CrossEncoderReranker:
-    """Cross-encoder based reranking for better relevance"""
+    """Cross-encoder based reranking for better relevance
+    
+    The model is loaded once per worker process (at startup when
+    CROSS_ENCODER_PRELOAD is set, otherwise on first use) and shared by all
+    threads. A failed load is remembered for CROSS_ENCODER_RETRY_AFTER seconds
+    so requests fall back to rule-based scoring instead of retrying the load.
+    Pair scores are cached per (query, chunk, model version) and scored in
+    batches within a per-request time budget.
+    """
+    
+    # Process-wide model state shared by every instance
+    _model = None
+    _load_failed_at = None
+    _load_lock = threading.Lock()
     
     def __init__(self):
-        self.model = None
         self.device = 'cpu'
         self.use_lightweight = True
+        self.model_name = getattr(settings, 'CROSS_ENCODER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-2-v2')
+        self.model_version = getattr(settings, 'CROSS_ENCODER_MODEL_VERSION', '1')
+        self.batch_size = getattr(settings, 'CROSS_ENCODER_BATCH_SIZE', 16)
+        self.time_budget = getattr(settings, 'CROSS_ENCODER_TIME_BUDGET_MS', 1500) / 1000.0
+        self.cache_ttl = getattr(settings, 'CROSS_ENCODER_CACHE_TTL', 86400)
+        self.retry_after = getattr(settings, 'CROSS_ENCODER_RETRY_AFTER', 600)
+    
+    @property
+    def model(self):
+        return CrossEncoderReranker._model
         
     def _load_model(self):
-        """Load cross-encoder model if available"""
-        try:
-            # Try to use sentence-transformers cross-encoder
-            from sentence_transformers import CrossEncoder
-            
-            # Use a lightweight cross-encoder model
-            model_name = 'cross-encoder/ms-marco-MiniLM-L-2-v2'
-            self.model = CrossEncoder(model_name, device=self.device)
-            logger.info(f"Loaded cross-encoder model: {model_name}")
+        """Load cross-encoder model if available (once per process)"""
+        cls = CrossEncoderReranker
+        if cls._model is not None:
             return True
-        except Exception as e:
-            logger.warning(f"Could not load cross-encoder model: {e}")
+        
+        # Negative-load sentinel: don't stall requests retrying a broken load
+        if cls._load_failed_at is not None and time.monotonic() - cls._load_failed_at < self.retry_after:
             return False
+        
+        with cls._load_lock:
+            if cls._model is not None:
+                return True
+            try:
+                # Try to use sentence-transformers cross-encoder
+                from sentence_transformers import CrossEncoder
+                
+                cls._model = CrossEncoder(self.model_name, device=self.device)
+                cls._load_failed_at = None
+                logger.info(f"Loaded cross-encoder model: {self.model_name}")
+                return True
+            except Exception as e:
+                cls._load_failed_at = time.monotonic()
+                logger.warning(
+                    f"Could not load cross-encoder model: {e} "
+                    f"(using rule-based reranking, next attempt in {self.retry_after}s)"
+                )
+                return False
     
-    def rerank_with_cross_encoder(self, query: str, documents: List[Dict]) -> List[Dict]:
-        """Rerank documents using cross-encoder model"""
-        if not self.model and not self._load_model():
-            # Fallback to rule-based reranking
-            return self.rerank_with_rules(query, documents)
+    def warm_up(self):
+        """Load the model and run one prediction so the first request is not slow"""
+        if self._load_model():
+            try:
+                self.model.predict([["warm up", "warm up"]])
+            except Exception as e:
+                logger.warning(f"Cross-encoder warm-up prediction failed: {e}")
+    
+    def _pair_cache_key(self, query_hash: str, doc: Dict) -> str:
+        return f"cross_encoder_{self.model_version}_{query_hash}_{doc['id']}"
+    
+    def score_documents(self, query: str, documents: List[Dict]) -> Tuple[np.ndarray, str]:
+        """
+        Relevance score per document, in input order.
+        
+        Returns (scores, method) where method is 'cross_encoder', or 'rules'
+        when the model is unavailable, fails, or the time budget runs out
+        before any document is scored.
+        """
+        if not self._load_model():
+            # Fallback to rule-based scoring
+            return self.score_with_rules(query, documents), 'rules'
         
         try:
-            # Prepare query-document pairs
-            pairs = []
-            for doc in documents:
-                content = doc.get('content', '')[:512]  # Limit content length
-                pairs.append([query, content])
+            scores = np.full(len(documents), np.nan)
+            
+            # Reuse cached pair scores (only for documents with a chunk id)
+            query_hash = hashlib.md5(query.encode('utf-8')).hexdigest()
+            cache_keys = {
+                i: self._pair_cache_key(query_hash, doc) for i, doc in enumerate(documents) if 'id' in doc
+            }
+            cached_scores = cache.get_many(list(cache_keys.values())) if cache_keys else {}
+            for i, key in cache_keys.items():
+                if key in cached_scores:
+                    scores[i] = cached_scores[key]
             
-            # Get cross-encoder scores
-            scores = self.model.predict(pairs)
+            # Score the rest in batches, in input order (best candidates first)
+            pending = [i for i in range(len(documents)) if np.isnan(scores[i])]
+            new_scores = {}
+            start_time = time.monotonic()
+            for batch_start in range(0, len(pending), self.batch_size):
+                if time.monotonic() - start_time > self.time_budget:
+                    logger.warning(
+                        f"Cross-encoder time budget ({self.time_budget:.2f}s) exhausted, "
+                        f"{len(pending) - batch_start} documents left unscored"
+                    )
+                    break
+                
+                batch = pending[batch_start:batch_start + self.batch_size]
+                # Prepare query-document pairs
+                pairs = [[query, documents[i].get('content', '')[:512]] for i in batch]  # Limit content length
+                batch_scores = self.model.predict(pairs, batch_size=self.batch_size)
+                
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    if i in cache_keys:
+                        new_scores[cache_keys[i]] = float(score)
             
-            # Add scores to documents
-            reranked_docs = []
-            for i, doc in enumerate(documents):
-                enhanced_doc = doc.copy()
-                enhanced_doc['cross_encoder_score'] = float(scores[i])
-                reranked_docs.append(enhanced_doc)
+            if new_scores:
+                cache.set_many(new_scores, self.cache_ttl)
             
-            # Sort by cross-encoder score
-            reranked_docs.sort(key=lambda x: x['cross_encoder_score'], reverse=True)
+            scored = ~np.isnan(scores)
+            if not scored.any():
+                return self.score_with_rules(query, documents), 'rules'
+            # Documents the budget did not reach rank below every scored one
+            # (finite, so min-max normalisation in the fusion still works)
+            scores[~scored] = scores[scored].min() - 1.0
             
-            logger.info(f"Cross-encoder reranking: {len(reranked_docs)} documents")
-            return reranked_docs
+            logger.info(
+                f"Cross-encoder scoring: {len(documents)} documents "
+                f"({len(documents) - len(pending)} cached, {len(new_scores)} scored)"
+            )
+            return scores, 'cross_encoder'
             
         except Exception as e:
             logger.error(f"Cross-encoder reranking failed: {e}")
-            return self.rerank_with_rules(query, documents)
+            return self.score_with_rules(query, documents), 'rules'
     
-    def rerank_with_rules(self, query: str, documents: List[Dict]) -> List[Dict]:
-        """Rule-based reranking as fallback"""
-        query_terms = set(query.lower().split())
+    def rerank_with_cross_encoder(self, query: str, documents: List[Dict]) -> List[Dict]:
+        """Rerank documents using cross-encoder model"""
+        scores, method = self.score_documents(query, documents)
+        score_key = 'cross_encoder_score' if method == 'cross_encoder' else 'rule_based_score'
+        
+        reranked_docs = []
+        for i in top_k_indices(scores, len(documents)):
+            enhanced_doc = documents[i].copy()
+            enhanced_doc[score_key] = float(scores[i])
+            reranked_docs.append(enhanced_doc)
+        return reranked_docs
+    
+    def score_with_rules(self, query: str, documents: List[Dict]) -> np.ndarray:
+        """Rule-based relevance scores (fallback), in input order
         
-        for doc in documents:
+        Term matches come from the token stats precomputed at ingest, so chunk
+        content is not re-tokenised per query.
+        """
+        query_lower = query.lower()
+        query_terms = set(tokenize(query))
+        try:
+            token_stats = bm25_index.get_token_stats([doc['id'] for doc in documents if 'id' in doc])
+        except Exception as e:
+            logger.warning(f"Could not load chunk token stats, tokenising content: {e}")
+            token_stats = {}
+        
+        scores = np.zeros(len(documents))
+        for i, doc in enumerate(documents):
             content = doc.get('content', '').lower()
             filename = doc.get('filename', '').lower()
             
@@ -78,12 +188,16 @@ class CrossEncoderReranker:
             relevance_score = 0.0
             
             # 1. Exact phrase matching (highest weight)
-            if query.lower() in content:
+            if query_lower in content:
                 relevance_score += 2.0
             
             # 2. Term frequency in content
-            content_words = set(content.split())
-            term_matches = len(query_terms.intersection(content_words))
+            stats = token_stats.get(doc.get('id'))
+            if stats is not None:
+                content_terms = stats['tf']
+            else:
+                content_terms = set(tokenize(content))
+            term_matches = sum(1 for term in query_terms if term in content_terms)
             relevance_score += term_matches * 0.5
             
             # 3. Term frequency in filename
@@ -106,12 +220,19 @@ class CrossEncoderReranker:
             elif content_length > 2000:
                 relevance_score *= 0.9  # Too long
             
-            doc['rule_based_score'] = relevance_score
+            scores[i] = relevance_score
+        
+        logger.info(f"Rule-based scoring: {len(documents)} documents")
+        return scores
+    
+    def rerank_with_rules(self, query: str, documents: List[Dict]) -> List[Dict]:
+        """Rule-based reranking as fallback"""
+        scores = self.score_with_rules(query, documents)
+        for doc, score in zip(documents, scores):
+            doc['rule_based_score'] = float(score)
         
         # Sort by rule-based score
         documents.sort(key=lambda x: x.get('rule_based_score', 0), reverse=True)
-        
-        logger.info(f"Rule-based reranking: {len(documents)} documents")
         return documents
 
 class AdvancedReranker:
@@ -138,6 +259,7 @@ class AdvancedReranker:
     def calculate_quality_score(self, doc: Dict) -> float:
         """Calculate content quality score"""
         content = doc.get('content', '')
+        content_lower = content.lower()
         
         quality_score = 0.5  # Base score
         
@@ -146,11 +268,11 @@ class AdvancedReranker:
             quality_score += 0.2  # Good length
         
         # Structure indicators
-        if any(marker in content.lower() for marker in ['step', 'procedure', 'process']):
+        if any(marker in content_lower for marker in ['step', 'procedure', 'process']):
             quality_score += 0.1  # Structured content
         
         # Technical content indicators
-        if any(term in content.lower() for term in ['configure', 'install', 'setup']):
+        if any(term in content_lower for term in ['configure', 'install', 'setup']):
             quality_score += 0.1  # Technical relevance
         
         # Completeness indicators
@@ -164,114 +286,87 @@ class AdvancedReranker:
         # In production, this would use actual user feedback data
         return 0.5
     
-    def advanced_rerank(self, query: str, documents: List[Dict]) -> List[Dict]:
-        """Perform advanced reranking with multiple signals"""
+    def advanced_rerank(self, query: str, documents: List[Dict], top_k: int = None) -> List[Dict]:
+        """Perform advanced reranking with multiple signals
+        
+        All signals are scored as arrays and fused in one pass; result dicts
+        are only built for the top_k documents (all documents if top_k is None).
+        """
         if not documents:
             return documents
         
-        # Get cross-encoder scores
-        cross_encoder_docs = self.cross_encoder.rerank_with_cross_encoder(query, documents)
+        # Get cross-encoder scores (or rule-based scores as fallback)
+        raw_scores, method = self.cross_encoder.score_documents(query, documents)
+        
+        # Get individual scores
+        hybrid_scores = np.array([doc.get('hybrid_score', doc.get('similarity', 0)) for doc in documents], dtype=np.float64)
+        freshness_scores = np.array([self.calculate_freshness_score(doc) for doc in documents])
+        quality_scores = np.array([self.calculate_quality_score(doc) for doc in documents])
+        feedback_scores = np.array([self.calculate_user_feedback_score(doc) for doc in documents])
+        
+        # Normalize cross-encoder score to 0-1 range
+        cross_encoder_scores = np.where(
+            raw_scores > 1, 1.0, np.where(raw_scores < -1, 0.0, (raw_scores + 1) / 2)
+        )
+        
+        # Calculate final reranking score
+        final_scores = (
+            self.weights['hybrid_score'] * hybrid_scores +
+            self.weights['cross_encoder'] * cross_encoder_scores +
+            self.weights['freshness'] * freshness_scores +
+            self.weights['quality'] * quality_scores +
+            self.weights['user_feedback'] * feedback_scores
+        )
         
-        # Calculate additional scores
+        # Final ordering by reranking score, materialising only what is returned
         final_docs = []
-        for doc in cross_encoder_docs:
-            enhanced_doc = doc.copy()
-            
-            # Get individual scores
-            hybrid_score = doc.get('hybrid_score', doc.get('similarity', 0))
-            cross_encoder_score = doc.get('cross_encoder_score', doc.get('rule_based_score', 0))
-            freshness_score = self.calculate_freshness_score(doc)
-            quality_score = self.calculate_quality_score(doc)
-            feedback_score = self.calculate_user_feedback_score(doc)
-            
-            # Normalize cross-encoder score to 0-1 range
-            if cross_encoder_score > 1:
-                cross_encoder_score = 1.0
-            elif cross_encoder_score < -1:
-                cross_encoder_score = 0.0
-            else:
-                cross_encoder_score = (cross_encoder_score + 1) / 2
-            
-            # Calculate final reranking score
-            final_score = (
-                self.weights['hybrid_score'] * hybrid_score +
-                self.weights['cross_encoder'] * cross_encoder_score +
-                self.weights['freshness'] * freshness_score +
-                self.weights['quality'] * quality_score +
-                self.weights['user_feedback'] * feedback_score
-            )
-            
+        for i in top_k_indices(final_scores, top_k if top_k is not None else len(documents)):
+            enhanced_doc = documents[i].copy()
+            if method == 'rules':
+                enhanced_doc['rule_based_score'] = float(raw_scores[i])
             enhanced_doc.update({
-                'final_rerank_score': final_score,
-                'freshness_score': freshness_score,
-                'quality_score': quality_score,
-                'feedback_score': feedback_score,
-                'cross_encoder_score': cross_encoder_score
+                'final_rerank_score': float(final_scores[i]),
+                'freshness_score': float(freshness_scores[i]),
+                'quality_score': float(quality_scores[i]),
+                'feedback_score': float(feedback_scores[i]),
+                'cross_encoder_score': float(cross_encoder_scores[i])
             })
-            
             final_docs.append(enhanced_doc)
         
-        # Final sort by reranking score
-        final_docs.sort(key=lambda x: x['final_rerank_score'], reverse=True)
-        
-        logger.info(f"Advanced reranking complete: {len(final_docs)} documents, "
-                   f"avg final score: {sum(d['final_rerank_score'] for d in final_docs) / len(final_docs):.3f}")
+        logger.info(f"Advanced reranking complete: {len(final_docs)} of {len(documents)} documents, "
+                   f"avg final score: {final_scores.mean():.3f}")
         
         return final_docs
 
 class ContextOptimizer:
     """Optimize context generation for better RAG responses"""
     
-    def __init__(self, max_context_length: int = 4000):
-        self.max_context_length = max_context_length
+    def __init__(self, max_context_tokens: int = 2048):
+        # Used when the caller does not pass the budget left by its num_ctx / num_predict
+        self.max_context_tokens = max_context_tokens
     
-    def optimize_context(self, query: str, documents: List[Dict]) -> str:
-        """Generate optimized context from ranked documents"""
+    @staticmethod
+    def _format_document(index, doc: Dict, content: str) -> str:
+        """Document with metadata and relevance indicator"""
+        filename = doc.get('filename', 'Unknown')
+        page = doc.get('page_number', 1)
+        return f"[{index}] {filename} (Page {page}, Relevance: {document_score(doc):.3f})\n{content}"
+    
+    def optimize_context(self, query: str, documents: List[Dict], token_budget: int = None) -> str:
+        """Generate optimized context from ranked documents, at most token_budget tokens"""
         if not documents:
             return ""
         
-        context_parts = []
-        current_length = 0
-        
-        # Add documents until we reach the context limit
-        for i, doc in enumerate(documents, 1):
-            content = doc.get('content', '')
-            filename = doc.get('filename', 'Unknown')
-            page = doc.get('page_number', 1)
-            
-            # Get relevance indicators
-            hybrid_score = doc.get('hybrid_score', doc.get('similarity', 0))
-            final_score = doc.get('final_rerank_score', hybrid_score)
-            
-            # Format document with metadata
-            doc_header = f"[{i}] {filename} (Page {page}, Relevance: {final_score:.3f})"
-            
-            # Truncate content if needed
-            available_length = self.max_context_length - current_length - len(doc_header) - 50
-            if available_length <= 0:
-                break
-            
-            if len(content) > available_length:
-                # Smart truncation - try to end at sentence boundary
-                truncated = content[:available_length]
-                last_period = truncated.rfind('.')
-                if last_period > available_length * 0.7:  # If we can keep 70% of content
-                    truncated = truncated[:last_period + 1]
-                else:
-                    truncated = truncated + "..."
-                content = truncated
-            
-            doc_text = f"{doc_header}\n{content}"
-            context_parts.append(doc_text)
-            current_length += len(doc_text) + 2  # +2 for newlines
-            
-            if current_length >= self.max_context_length:
-                break
-        
-        optimized_context = "\n\n".join(context_parts)
-        
-        logger.info(f"Optimized context: {len(context_parts)} documents, {len(optimized_context)} characters")
-        return optimized_context
+        packed = context_packer.pack(
+            'advanced',
+            documents,
+            token_budget or self.max_context_tokens,
+            render_item=lambda doc, content: self._format_document(len(documents), doc, content),
+            render_context=lambda items: "\n\n".join(
+                self._format_document(i, doc, content) for i, (doc, content) in enumerate(items, 1)
+            ),
+        )
+        return packed.text
     
     def generate_enhanced_prompt(self, query: str, context: str, query_type: str = 'general') -> str:
         """Generate enhanced prompt based on query type and context"""
@@ -313,4 +408,4 @@ class ContextOptimizer:
 
 # Global instances
 advanced_reranker = AdvancedReranker()
-context_optimizer = ContextOptimizer(max_context_length=4000)
+context_optimizer = ContextOptimizer()
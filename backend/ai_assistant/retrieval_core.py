@@ -0,0 +1,237 @@
+"""
+Single Vector Retrieval Core shared by all RAG tiers
+
+Every search mode (basic, enhanced, advanced, comprehensive) retrieves
+candidates through VectorRetriever, so all of them:
+- use the same distance operator (cosine, <=>) and therefore one HNSW index
+- report the same similarity score (1 - cosine distance), comparable across tiers
+- format chunk rows identically
+
+Several query variants (e.g. original + expanded) can be retrieved in a
+single SQL round-trip and merged with reciprocal-rank fusion.
+
+LexicalRetriever is the full-text counterpart (tsvector + GIN) that hybrid
+search fuses with the vector candidates, so exact keyword hits (KPR numbers,
+error codes, version strings) are found even when the embedding misses them.
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+from django.db import connection
+from .vector_index import vector_search_cursor, normalize_embedding
+
+logger = logging.getLogger(__name__)
+
+# Must match the config of the DocumentChunk.search_vector generated column
+FULL_TEXT_CONFIG = 'english'
+
+
+def format_chunk_row(chunk_id, content, uploaded_file_id, page_number, chunk_index,
+                     filename, file_hash, file_size, similarity=None) -> Dict:
+    """Build the result dict returned to views for a single chunk"""
+    page_number = page_number or 1
+    filename = filename or "Unknown Document"
+
+    # Generate title: use filename if valid, otherwise extract from content
+    if filename != "Unknown Document":
+        title = filename
+    else:
+        # Extract first meaningful words from content as title
+        words = content.split()[:10]  # First 10 words
+        title = " ".join(words)
+        if len(title) > 100:
+            title = title[:100] + "..."
+
+    # Create view URL for PDF viewer if uploaded_file_id exists
+    view_url = None
+    if uploaded_file_id:
+        view_url = f"/api/ai/pdf/{uploaded_file_id}/view/?page={page_number}"
+
+    result = {
+        "id": chunk_id,
+        "content": content,
+        "uploaded_file_id": uploaded_file_id,
+        "page_number": page_number,
+        "chunk_index": chunk_index,
+        "filename": filename,
+        "title": title,  # Smart title: filename or content excerpt
+        "file_hash": file_hash,
+        "file_size": file_size,
+        "download_url": f"/api/ai/documents/{uploaded_file_id}/download/" if uploaded_file_id else None,
+        "view_url": view_url,  # URL to open PDF at specific page
+        "source_display": f"{filename} (Page {page_number})" if filename != "Unknown Document" else f"Page {page_number}"
+    }
+    if similarity is not None:
+        result["similarity"] = float(similarity)
+    return result
+
+
+def fetch_chunk_rows(chunk_ids: Sequence[int]) -> Dict[int, Dict]:
+    """Formatted result dicts (no scores) for the given chunk ids, in one query"""
+    if not chunk_ids:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
+                   COALESCE(uf.filename, 'Unknown Document') as filename,
+                   COALESCE(uf.file_hash, '') as file_hash,
+                   COALESCE(uf.file_size, 0) as file_size
+            FROM ai_assistant_documentchunk dc
+            LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
+            WHERE dc.id = ANY(%s);
+        """, [list(chunk_ids)])
+        rows = cursor.fetchall()
+
+    return {row[0]: format_chunk_row(*row) for row in rows}
+
+
+class VectorRetriever:
+    """Cosine-similarity retrieval over DocumentChunk embeddings"""
+
+    def search(self, query_embedding: Sequence[float], limit: int,
+               ef_search: Optional[int] = None) -> List[Dict]:
+        """
+        Return the `limit` nearest chunks to query_embedding, best first.
+
+        Stored embeddings are L2-normalised at write time, so cosine
+        similarity here equals the dot product of the stored vectors.
+        """
+        query_vector = normalize_embedding(query_embedding)
+
+        with vector_search_cursor(limit=limit, ef_search=ef_search) as cursor:
+            cursor.execute("""
+                SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
+                       COALESCE(uf.filename, 'Unknown Document') as filename,
+                       COALESCE(uf.file_hash, '') as file_hash,
+                       COALESCE(uf.file_size, 0) as file_size,
+                       1 - (dc.embedding <=> %s::vector) as similarity
+                FROM ai_assistant_documentchunk dc
+                LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
+                WHERE dc.embedding IS NOT NULL
+                ORDER BY dc.embedding <=> %s::vector
+                LIMIT %s;
+            """, [query_vector, query_vector, limit])
+            rows = cursor.fetchall()
+
+        return [format_chunk_row(*row) for row in rows]
+
+    def search_many(self, query_embeddings: List[Sequence[float]], limit: int,
+                    ef_search: Optional[int] = None) -> List[List[Dict]]:
+        """
+        Nearest chunks for several query vectors in one SQL round-trip.
+
+        Each query vector gets its own index-ordered LATERAL scan, so the
+        result is one best-first list per input vector (same order as input).
+        """
+        if not query_embeddings:
+            return []
+        if len(query_embeddings) == 1:
+            return [self.search(query_embeddings[0], limit, ef_search=ef_search)]
+
+        values_sql = ", ".join(["(%s, %s::vector)"] * len(query_embeddings))
+        params = []
+        for query_idx, embedding in enumerate(query_embeddings):
+            params.extend([query_idx, normalize_embedding(embedding)])
+        params.append(limit)
+
+        with vector_search_cursor(limit=limit, ef_search=ef_search) as cursor:
+            cursor.execute(f"""
+                SELECT q.query_idx, c.id, c.content, c.uploaded_file_id, c.page_number, c.chunk_index,
+                       c.filename, c.file_hash, c.file_size, c.similarity
+                FROM (VALUES {values_sql}) AS q(query_idx, query_vector)
+                CROSS JOIN LATERAL (
+                    SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
+                           COALESCE(uf.filename, 'Unknown Document') as filename,
+                           COALESCE(uf.file_hash, '') as file_hash,
+                           COALESCE(uf.file_size, 0) as file_size,
+                           1 - (dc.embedding <=> q.query_vector) as similarity
+                    FROM ai_assistant_documentchunk dc
+                    LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
+                    WHERE dc.embedding IS NOT NULL
+                    ORDER BY dc.embedding <=> q.query_vector
+                    LIMIT %s
+                ) c
+                ORDER BY q.query_idx, c.similarity DESC;
+            """, params)
+            rows = cursor.fetchall()
+
+        results = [[] for _ in query_embeddings]
+        for row in rows:
+            results[row[0]].append(format_chunk_row(*row[1:]))
+        return results
+
+
+class LexicalRetriever:
+    """Full-text retrieval over DocumentChunk.search_vector, ranked by ts_rank_cd"""
+
+    def build_search_text(self, query: str) -> str:
+        """
+        Turn a natural-language query into an OR-of-terms websearch query.
+
+        plainto_tsquery would AND every word, so a question rarely matches
+        anything; websearch_to_tsquery never raises on user input.
+        """
+        terms = re.findall(r'\w[\w.\-]*', query)
+        return " or ".join(terms)
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        """
+        Return up to `limit` chunks matching the query terms, best first.
+
+        Each result carries 'lexical_score' (ts_rank_cd scaled to 0-1);
+        'similarity' is not set because no vector distance was computed.
+        """
+        search_text = self.build_search_text(query)
+        if not search_text or limit <= 0:
+            return []
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT dc.id, dc.content, dc.uploaded_file_id, dc.page_number, dc.chunk_index,
+                       COALESCE(uf.filename, 'Unknown Document') as filename,
+                       COALESCE(uf.file_hash, '') as file_hash,
+                       COALESCE(uf.file_size, 0) as file_size,
+                       ts_rank_cd(dc.search_vector, q.query, 32) as lexical_score
+                FROM ai_assistant_documentchunk dc
+                CROSS JOIN websearch_to_tsquery('{FULL_TEXT_CONFIG}', %s) AS q(query)
+                LEFT JOIN ai_assistant_uploadedfile uf ON dc.uploaded_file_id = uf.id
+                WHERE dc.search_vector @@ q.query
+                ORDER BY lexical_score DESC
+                LIMIT %s;
+            """, [search_text, limit])
+            rows = cursor.fetchall()
+
+        results = []
+        for row in rows:
+            result = format_chunk_row(*row[:8])
+            result["lexical_score"] = float(row[8])
+            results.append(result)
+        return results
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Merge best-first result lists with reciprocal-rank fusion.
+
+    score(d) = sum over lists of 1 / (k + rank). A chunk found by several
+    lists keeps its highest similarity; output is sorted by 'rrf_score'.
+    """
+    fused = {}
+    for results in ranked_lists:
+        for rank, doc in enumerate(results, start=1):
+            entry = fused.get(doc['id'])
+            if entry is None:
+                entry = dict(doc)
+                entry['rrf_score'] = 0.0
+                fused[doc['id']] = entry
+            elif doc.get('similarity', 0) > entry.get('similarity', 0):
+                entry['similarity'] = doc['similarity']
+            entry['rrf_score'] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda d: d['rrf_score'], reverse=True)
+
+
+# Global instances
+vector_retriever = VectorRetriever()
+lexical_retriever = LexicalRetriever()
@@ -0,0 +1,208 @@
+"""
+Semantic Answer Cache
+
+The response caches key on md5(query), so "how do I install CDS 2.8" and
+"CDS 2.8 installation steps" never share an answer although they retrieve
+the same chunks. SemanticAnswerCache stores every generated answer with its
+query embedding, retrieved chunk ids and the corpus version, and before a
+new generation looks for a recent answer of the same tier and parameters:
+- nearest cached queries by cosine similarity of their BGE-M3 embeddings
+  (at least SEMANTIC_CACHE_THRESHOLD)
+- same numbers in both queries (versions such as 2.8 vs 2.9 embed almost
+  identically but must not share answers)
+- the new query's retrieved chunks overlap the cached ones (Jaccard at
+  least SEMANTIC_CACHE_MIN_CHUNK_OVERLAP), i.e. the answer was written from
+  the same material
+- same corpus version: the number of embedded chunks and the highest chunk
+  id, refreshed every SEMANTIC_CACHE_VERSION_TTL seconds. Changes that keep
+  both (re-embedding in place) call invalidate().
+
+Retrieval still runs for every query (its results are checked against the
+entry and cached separately); what a hit saves is the generation.
+"""
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from pgvector.django import CosineDistance
+from .models import SemanticCacheEntry
+from .embedding_backfill import fit_embedding_dimensions
+from .embedding_client import embedding_client
+from .vector_index import normalize_embedding
+
+logger = logging.getLogger(__name__)
+
+CORPUS_VERSION_CACHE_KEY = "semantic_cache_corpus_version"
+
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)*')
+
+# Cached answers considered per lookup (nearest first)
+MAX_CANDIDATES = 5
+
+
+def _numbers(text: str) -> frozenset:
+    return frozenset(NUMBER_PATTERN.findall(text))
+
+
+def _plain_json(value):
+    """JSONField-safe copy of a result (numpy scalars, datetimes)"""
+    return json.loads(json.dumps(value, default=lambda v: v.item() if hasattr(v, 'item') else str(v)))
+
+
+def _chunk_ids(documents: Sequence[Dict]) -> List[int]:
+    return [doc['id'] for doc in documents if doc.get('id') is not None]
+
+
+class SemanticAnswerCache:
+    """Reuses generated RAG answers for semantically equivalent queries"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'SEMANTIC_CACHE_ENABLED', True)
+        self.threshold = getattr(settings, 'SEMANTIC_CACHE_THRESHOLD', 0.92)
+        self.min_chunk_overlap = getattr(settings, 'SEMANTIC_CACHE_MIN_CHUNK_OVERLAP', 0.5)
+        self.ttl = getattr(settings, 'SEMANTIC_CACHE_TTL', 86400)
+        self.version_ttl = getattr(settings, 'SEMANTIC_CACHE_VERSION_TTL', 60)
+        self.max_entries = getattr(settings, 'SEMANTIC_CACHE_MAX_ENTRIES', 20000)
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: defaultdict(int))
+
+    def _count(self, tier: str, event: str):
+        with self._lock:
+            self._metrics[tier][event] += 1
+
+    def get_corpus_version(self) -> str:
+        """Fingerprint of the searchable chunks, shared by all processes for version_ttl seconds"""
+        version = cache.get(CORPUS_VERSION_CACHE_KEY)
+        if version is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(embedding), coalesce(max(id), 0) FROM ai_assistant_documentchunk")
+                embedded, max_id = cursor.fetchone()
+            version = f"{embedded}-{max_id}"
+            cache.set(CORPUS_VERSION_CACHE_KEY, version, self.version_ttl)
+        return version
+
+    def _query_embedding(self, query: str) -> List[float]:
+        # Same text the retrievers embed, so this is an embedding store hit for them
+        return normalize_embedding(fit_embedding_dimensions(embedding_client.embed_one(query)))
+
+    def _lookup(self, tier: str, params: str, query: str, chunk_ids: List[int],
+                embedding: List[float], corpus_version: str) -> Optional[Dict]:
+        candidates = (
+            SemanticCacheEntry.objects
+            .filter(
+                tier=tier,
+                params=params,
+                corpus_version=corpus_version,
+                created_at__gte=timezone.now() - timedelta(seconds=self.ttl),
+            )
+            .annotate(distance=CosineDistance('embedding', embedding))
+            .filter(distance__lte=1 - self.threshold)
+            .order_by('distance')
+            .defer('embedding')[:MAX_CANDIDATES]
+        )
+
+        numbers = _numbers(query)
+        retrieved = set(chunk_ids)
+        for entry in candidates:
+            if _numbers(entry.query) != numbers:
+                continue
+            cached_chunks = set(entry.chunk_ids)
+            overlap = len(retrieved & cached_chunks) / len(retrieved | cached_chunks)
+            if overlap < self.min_chunk_overlap:
+                continue
+
+            SemanticCacheEntry.objects.filter(id=entry.id).update(
+                hit_count=F('hit_count') + 1, last_hit_at=timezone.now()
+            )
+            similarity = 1 - entry.distance
+            logger.info(f"Semantic cache hit ({tier}, similarity {similarity:.3f}): "
+                        f"{query[:30]}... -> {entry.query[:30]}...")
+            return dict(
+                entry.result,
+                query=query,
+                semantic_cache={
+                    'matched_query': entry.query,
+                    'similarity': round(similarity, 4),
+                    'chunk_overlap': round(overlap, 3),
+                },
+            )
+        return None
+
+    def get_or_generate(self, tier: str, params: str, query: str, relevant_docs: List[Dict],
+                        generate: Callable[[], Dict]) -> Dict:
+        """
+        A cached answer for an equivalent earlier query, or generate()'s
+        result (stored for later queries). relevant_docs are the chunks
+        retrieved for this query.
+        """
+        chunk_ids = _chunk_ids(relevant_docs)
+        if not self.enabled or not chunk_ids:
+            return generate()
+
+        try:
+            embedding = self._query_embedding(query)
+            corpus_version = self.get_corpus_version()
+            result = self._lookup(tier, params, query, chunk_ids, embedding, corpus_version)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return generate()
+
+        if result is not None:
+            self._count(tier, 'hits')
+            return result
+
+        self._count(tier, 'misses')
+        result = generate()
+        try:
+            SemanticCacheEntry.objects.create(
+                tier=tier,
+                params=params,
+                query=query,
+                embedding=embedding,
+                chunk_ids=chunk_ids,
+                result=_plain_json(result),
+                corpus_version=corpus_version,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store semantic cache entry: {e}")
+        return result
+
+    def invalidate(self):
+        """Drop every cached answer (for corpus changes the fingerprint does not see)"""
+        deleted, _ = SemanticCacheEntry.objects.all().delete()
+        cache.delete(CORPUS_VERSION_CACHE_KEY)
+        logger.info(f"Semantic cache invalidated: {deleted} entries removed")
+
+    def prune(self) -> int:
+        """Remove expired entries, entries of older corpus versions and the oldest beyond max_entries"""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        deleted, _ = SemanticCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+        removed = deleted
+        deleted, _ = SemanticCacheEntry.objects.exclude(corpus_version=self.get_corpus_version()).delete()
+        removed += deleted
+
+        overflow = list(
+            SemanticCacheEntry.objects.order_by('-created_at')
+            .values_list('created_at', flat=True)[self.max_entries:self.max_entries + 1]
+        )
+        if overflow:
+            deleted, _ = SemanticCacheEntry.objects.filter(created_at__lte=overflow[0]).delete()
+            removed += deleted
+        return removed
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per tier: semantic hits and misses (this process)"""
+        with self._lock:
+            return {tier: dict(metrics) for tier, metrics in self._metrics.items()}
+
+
+# Global instance
+semantic_cache = SemanticAnswerCache()
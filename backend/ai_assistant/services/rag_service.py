@@ -11,8 +11,10 @@ import time
 import os
 from typing import Dict, Any, List, Optional
 from django.core.files.storage import FileSystemStorage
+from django.core.cache import cache
 from django.conf import settings
 import requests
+import httpx
 
 from .base_service import BaseService
 from ..models import QueryHistory, UploadedFile
@@ -20,6 +22,8 @@ from ..rag_service import EnhancedRAGService
 from ..improved_rag_service import enhanced_rag_service
 from ..advanced_rag_service import advanced_rag_service
 from ..comprehensive_rag_service import comprehensive_rag_service
+from ..llm_streaming import stream_ollama_chat
+from ..async_rag import async_ollama_client, run_in_retrieval_thread
 
 logger = logging.getLogger(__name__)
 
@@ -73,8 +77,88 @@ class RAGService(BaseService):
             self.log_error('chat_with_ollama', e)
             return self.error_response('Failed to generate chat response')
     
-    def _generate_ollama_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
-        """Generate response using Ollama API"""
+    async def achat_with_ollama(self, prompt: str, user, **kwargs) -> Dict[str, Any]:
+        """chat_with_ollama for async views: waits on Ollama without holding a thread"""
+        try:
+            self.log_operation('achat_with_ollama', {'prompt_length': len(prompt)})
+            
+            if not prompt.strip():
+                return self.error_response('Prompt is required')
+            
+            # Check cache first
+            prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+            cache_key = f"chat_response_{prompt_hash}"
+            cached_response = await cache.aget(cache_key)
+            
+            if cached_response:
+                return self.success_response("Chat response retrieved from cache", cached_response)
+            
+            # Generate response
+            payload, model, timeout_seconds = self._chat_payload(prompt, **kwargs)
+            response_data = {
+                'response': await async_ollama_client.chat(payload, timeout_seconds),
+                'model': model
+            }
+            
+            # Cache response
+            await cache.aset(cache_key, response_data, 1800)  # 30 minutes
+            
+            # Save to history
+            await QueryHistory.objects.acreate(
+                query=prompt,
+                response=response_data['response'],
+                sources=[],
+                query_type='chat',
+                user=user
+            )
+            
+            return self.success_response("Chat response generated successfully", response_data)
+            
+        except httpx.TimeoutException:
+            self.log_error('achat_with_ollama', Exception("Request timeout"))
+            return self.error_response(
+                'Request timed out. The model is taking too long to respond.'
+            )
+        except Exception as e:
+            self.log_error('achat_with_ollama', e)
+            return self.error_response('Failed to generate chat response')
+    
+    def stream_chat_with_ollama(self, prompt: str, user, **kwargs):
+        """
+        chat_with_ollama as (event, data) pairs: a 'token' per generated piece,
+        then 'done' with the model; shares the cache and history of the
+        non-streamed call.
+        """
+        self.log_operation('stream_chat_with_ollama', {'prompt_length': len(prompt)})
+        
+        prompt_hash = hashlib.md5(prompt.encode('utf-8')).hexdigest()
+        cache_key = f"chat_response_{prompt_hash}"
+        cached_response = self.get_cached_result(cache_key)
+        if cached_response:
+            yield 'token', {'text': cached_response['response']}
+            yield 'done', {'model': cached_response['model'], 'cached': True}
+            return
+        
+        payload, model, timeout_seconds = self._chat_payload(prompt, **kwargs)
+        ollama_url = getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
+        parts = []
+        for piece in stream_ollama_chat(ollama_url, payload, timeout_seconds):
+            parts.append(piece)
+            yield 'token', {'text': piece}
+        
+        response_data = {'response': ''.join(parts), 'model': model}
+        self.cache_result(cache_key, response_data, 1800)  # 30 minutes
+        QueryHistory.objects.create(
+            query=prompt,
+            response=response_data['response'],
+            sources=[],
+            query_type='chat',
+            user=user
+        )
+        yield 'done', {'model': model, 'cached': False}
+    
+    def _chat_payload(self, prompt: str, **kwargs):
+        """/api/chat request body for a chat prompt, with the model and timeout"""
         # Get generation parameters
         max_tokens = kwargs.get('max_tokens', getattr(settings, 'OLLAMA_DEFAULT_MAX_TOKENS', 256))
         temperature = kwargs.get('temperature', getattr(settings, 'OLLAMA_TEMPERATURE', 0.3))
@@ -85,11 +169,8 @@ class RAGService(BaseService):
         
         # Ollama configuration
         model = getattr(settings, 'OLLAMA_MODEL', 'qwen2.5:latest')
-        ollama_url = getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
         timeout_seconds = getattr(settings, 'OLLAMA_REQUEST_TIMEOUT', 120)
         
-        # Make API request
-        api_url = f"{ollama_url}/api/chat"
         payload = {
             "model": model,
             "stream": False,
@@ -106,7 +187,15 @@ class RAGService(BaseService):
                 "num_ctx": num_ctx
             }
         }
+        return payload, model, timeout_seconds
+    
+    def _generate_ollama_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Generate response using Ollama API"""
+        payload, model, timeout_seconds = self._chat_payload(prompt, **kwargs)
+        ollama_url = getattr(settings, 'OLLAMA_API_URL', 'http://localhost:11434')
         
+        # Make API request
+        api_url = f"{ollama_url}/api/chat"
         resp = requests.post(api_url, json=payload, timeout=timeout_seconds)
         resp.raise_for_status()
         
@@ -167,6 +256,104 @@ class RAGService(BaseService):
             self.log_error('rag_search', e)
             return self.error_response('Failed to perform RAG search')
     
+    async def arag_search(self, query: str, user, search_mode: str = 'comprehensive',
+                          top_k: int = None) -> Dict[str, Any]:
+        """rag_search for async views: retrieval in a worker thread, generation on the event loop"""
+        start_time = time.time()
+        
+        try:
+            self.log_operation('arag_search', {
+                'query_length': len(query),
+                'search_mode': search_mode
+            })
+            
+            if not query.strip():
+                return self.error_response('Query is required')
+            
+            # Set default top_k based on search mode
+            if top_k is None:
+                top_k = 15 if search_mode == 'comprehensive' else 8
+            
+            if search_mode == 'comprehensive':
+                result = await comprehensive_rag_service.aquery_with_comprehensive_rag(query, top_k=top_k, user=user)
+            elif search_mode == 'advanced':
+                result = await advanced_rag_service.aquery_with_advanced_rag(query, top_k=top_k, user=user)
+            elif search_mode == 'enhanced':
+                result = await enhanced_rag_service.aquery_with_enhanced_rag(query, top_k=top_k, user=user)
+            else:
+                result = await self.rag_service.aquery_with_rag(query, top_k=top_k, user=user)
+            
+            total_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+            if isinstance(result, dict):
+                result['performance'] = {
+                    'search_time_ms': total_time,
+                    'total_time_ms': total_time,
+                    'search_mode': search_mode,
+                    'top_k': top_k
+                }
+            
+            logger.info(f"Async RAG Search Performance - Mode: {search_mode}, Time: {total_time:.2f}ms, Top K: {top_k}")
+            
+            return self.success_response("RAG search completed successfully", result)
+            
+        except Exception as e:
+            total_time = (time.time() - start_time) * 1000
+            logger.error(f"Async RAG Search Error - Mode: {search_mode}, Time: {total_time:.2f}ms")
+            self.log_error('arag_search', e)
+            return self.error_response('Failed to perform RAG search')
+    
+    async def avector_search(self, query: str, user=None, search_mode: str = 'comprehensive',
+                             top_k: int = None) -> Dict[str, Any]:
+        """vector_search for async views; the sync search runs in a worker thread"""
+        return await run_in_retrieval_thread(self.vector_search, query, user, search_mode, top_k)
+    
+    def stream_rag_search(self, query: str, user, search_mode: str = 'comprehensive',
+                          top_k: int = None):
+        """
+        rag_search as (event, data) pairs: 'sources', 'token'..., then 'done'
+        with the result and its performance metrics (including time to first
+        token).
+        """
+        start_time = time.time()
+        self.log_operation('stream_rag_search', {
+            'query_length': len(query),
+            'search_mode': search_mode
+        })
+        
+        # Set default top_k based on search mode
+        if top_k is None:
+            top_k = 15 if search_mode == 'comprehensive' else 8
+        
+        if search_mode == 'comprehensive':
+            events = comprehensive_rag_service.stream_query_with_comprehensive_rag(query, top_k=top_k, user=user)
+        elif search_mode == 'advanced':
+            events = advanced_rag_service.stream_query_with_advanced_rag(query, top_k=top_k, user=user)
+        elif search_mode == 'enhanced':
+            events = enhanced_rag_service.stream_query_with_enhanced_rag(query, top_k=top_k, user=user)
+        else:
+            events = self.rag_service.stream_query_with_rag(query, top_k=top_k, user=user)
+        
+        search_time = None
+        first_token_time = None
+        for event, data in events:
+            if event == 'sources':
+                search_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+            elif event == 'token' and first_token_time is None:
+                first_token_time = (time.time() - start_time) * 1000
+            elif event == 'done':
+                total_time = (time.time() - start_time) * 1000
+                data['performance'] = {
+                    'search_time_ms': search_time,
+                    'time_to_first_token_ms': first_token_time,
+                    'total_time_ms': total_time,
+                    'search_mode': search_mode,
+                    'top_k': top_k,
+                    'streamed': True
+                }
+                logger.info(f"RAG Stream Performance - Mode: {search_mode}, First token: {first_token_time or 0:.2f}ms, "
+                            f"Total: {total_time:.2f}ms, Top K: {top_k}")
+            yield event, data
+    
     def vector_search(self, query: str, user=None, search_mode: str = 'comprehensive', 
                      top_k: int = None, **kwargs) -> Dict[str, Any]:
         """Perform vector similarity search with performance monitoring"""
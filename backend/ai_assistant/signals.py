@@ -13,8 +13,10 @@ import logging
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import UploadedFile, DocumentFile
+from .models import UploadedFile, DocumentFile, DocumentChunk
 from .automatic_file_processor import automatic_file_processor
+from .bm25_index import bm25_index
+from .chunk_dedup import chunk_deduplicator
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +72,37 @@ def auto_process_document_file(sender, instance, created, **kwargs):
             logger.error(f"Error processing DocumentFile: {e}", exc_info=True)
 
 
+@receiver(post_save, sender=DocumentChunk)
+def index_document_chunk(sender, instance, created, **kwargs):
+    """
+    Keep the BM25 inverted index in step with DocumentChunk rows
+    
+    New chunks are indexed on creation; postings are removed with the chunk
+    by ON DELETE CASCADE. Bulk writers call bm25_index.index_chunks() directly.
+    """
+    if created and not kwargs.get('raw'):
+        try:
+            bm25_index.index_chunks([instance])
+        except Exception as e:
+            logger.error(f"BM25 indexing failed for chunk {instance.pk}: {e}", exc_info=True)
+
+
+def keep_shared_vector(sender, instance, **kwargs):
+    """
+    Shared-vector dedup: when a chunk whose vector other chunks reference is
+    deleted, hand the vector to one of those duplicates first
+
+    Connected in AiAssistantConfig.ready() only with CHUNK_DEDUP_SHARED_VECTORS:
+    a delete receiver makes every chunk delete and cascade load full rows
+    (embeddings included) instead of just the ids.
+    """
+    if instance.canonical_chunk_id is None:
+        try:
+            chunk_deduplicator.promote_duplicate(instance)
+        except Exception as e:
+            logger.error(f"Failed to promote duplicate of chunk {instance.pk}: {e}", exc_info=True)
+
+
 @receiver(pre_save, sender=UploadedFile)
 def validate_processing_status(sender, instance, **kwargs):
     """
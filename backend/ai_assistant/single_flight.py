@@ -0,0 +1,178 @@
+"""
+Single-Flight RAG Queries
+
+The RAG result caches (rag_query_*, advanced_rag_*, comprehensive_rag_*)
+only help once the first request has finished: ten users asking the same
+question at once all miss and each runs retrieval, reranking and a full
+generation. SingleFlight.run() coalesces them across processes:
+- the first request takes a lock in Redis (cache.add, i.e. SET NX with an
+  expiry) and computes; the others wait for its result instead of computing
+- the result is fanned out through a short-lived '<key>:flight' entry, so
+  waiters also get results that are not cached (e.g. advanced RAG answers
+  without sources)
+- a leader that dies leaves the lock to expire (SINGLE_FLIGHT_LOCK_TIMEOUT);
+  a waiter that waits longer than SINGLE_FLIGHT_WAIT_TIMEOUT or sees the
+  lock released without a result takes over
+- stale-while-revalidate: every cached result is also kept under
+  '<key>:stale' for SINGLE_FLIGHT_STALE_TTL past its expiry. A request that
+  finds only the stale copy returns it at once; the one that gets the lock
+  recomputes in a background thread
+
+The fresh entry stays the plain result under the original key, so the
+streaming and async pipelines keep reading it as before (they store their
+results through store()/astore(), but do not coalesce).
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .cache_codec import key_family
+
+logger = logging.getLogger(__name__)
+
+FLIGHT_RESULT_TTL = 30  # Seconds waiters have to pick up a fanned-out result
+
+
+class SingleFlight:
+    """Distributed request coalescing with stale-while-revalidate for cached results"""
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'SINGLE_FLIGHT_ENABLED', True)
+        self.lock_timeout = getattr(settings, 'SINGLE_FLIGHT_LOCK_TIMEOUT', 360)
+        self.wait_timeout = getattr(settings, 'SINGLE_FLIGHT_WAIT_TIMEOUT', 360)
+        self.stale_ttl = getattr(settings, 'SINGLE_FLIGHT_STALE_TTL', 3600)
+        self.poll_interval = 0.05
+        self.max_poll_interval = 0.5
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: defaultdict(int))
+
+    def _count(self, cache_key: str, event: str):
+        with self._lock:
+            self._metrics[key_family(cache_key)][event] += 1
+
+    def _acquire(self, cache_key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        return token if cache.add(f"{cache_key}:lock", token, self.lock_timeout) else None
+
+    def _release(self, cache_key: str, token: str):
+        # Check-then-delete: only drop our own lock, not one taken after ours expired
+        if cache.get(f"{cache_key}:lock") == token:
+            cache.delete(f"{cache_key}:lock")
+
+    def store(self, cache_key: str, result: Any, ttl: int):
+        """Cache a result, plus its stale copy for stale-while-revalidate"""
+        cache.set(cache_key, result, ttl)
+        if self.enabled and self.stale_ttl:
+            cache.set(f"{cache_key}:stale", result, ttl + self.stale_ttl)
+
+    async def astore(self, cache_key: str, result: Any, ttl: int):
+        """store() for async callers"""
+        await cache.aset(cache_key, result, ttl)
+        if self.enabled and self.stale_ttl:
+            await cache.aset(f"{cache_key}:stale", result, ttl + self.stale_ttl)
+
+    def _compute(self, cache_key: str, ttl: int, compute: Callable[[], Any],
+                 cacheable: Callable[[Any], bool], token: str) -> Any:
+        """Compute as the lock holder, publish the result and release the lock"""
+        try:
+            result = compute()
+            if cacheable(result):
+                self.store(cache_key, result, ttl)
+            cache.set(f"{cache_key}:flight", result, FLIGHT_RESULT_TTL)
+            return result
+        finally:
+            self._release(cache_key, token)
+
+    def _revalidate(self, cache_key: str, ttl: int, compute: Callable[[], Any],
+                    cacheable: Callable[[Any], bool], token: str):
+        try:
+            self._compute(cache_key, ttl, compute, cacheable, token)
+            self._count(cache_key, 'revalidated')
+        except Exception as e:
+            logger.error(f"Error revalidating {cache_key}: {e}")
+        finally:
+            connection.close()  # Thread-local connection opened by compute()
+
+    def run(
+        self,
+        cache_key: str,
+        ttl: int,
+        compute: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda result: True,
+        revalidate: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        The cached result for cache_key, or compute()'s - computed by one
+        request at a time across all processes. revalidate (compute without
+        per-request side effects such as QueryHistory) refreshes a stale
+        result in the background; without it stale results are not served.
+        """
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            self._count(cache_key, 'hits')
+            return cached_result
+
+        if not self.enabled:
+            self._count(cache_key, 'computed')
+            result = compute()
+            if cacheable(result):
+                cache.set(cache_key, result, ttl)
+            return result
+
+        stale_result = cache.get(f"{cache_key}:stale") if revalidate is not None else None
+        deadline = time.monotonic() + self.wait_timeout
+        interval = self.poll_interval
+        waited = False
+
+        while True:
+            token = self._acquire(cache_key)
+            if token is not None:
+                if stale_result is not None:
+                    self._count(cache_key, 'stale_served')
+                    threading.Thread(
+                        target=self._revalidate,
+                        args=(cache_key, ttl, revalidate, cacheable, token),
+                        name=f"revalidate-{key_family(cache_key)}",
+                        daemon=True,
+                    ).start()
+                    return stale_result
+                self._count(cache_key, 'computed')
+                return self._compute(cache_key, ttl, compute, cacheable, token)
+
+            if stale_result is not None:
+                # Someone else is revalidating
+                self._count(cache_key, 'stale_served')
+                return stale_result
+
+            if not waited:
+                logger.info(f"Waiting for in-flight computation of {cache_key}")
+                waited = True
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+            result = cache.get(f"{cache_key}:flight")
+            if result is None:
+                result = cache.get(cache_key)
+            if result is not None:
+                self._count(cache_key, 'coalesced')
+                return result
+
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for {cache_key} after {self.wait_timeout}s, computing")
+                self._count(cache_key, 'wait_timeouts')
+                return compute()
+            # Lock still held: keep waiting; released without a result: take it over
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per key family: hits, computations, coalesced waiters, stale results served (this process)"""
+        with self._lock:
+            return {family: dict(metrics) for family, metrics in self._metrics.items()}
+
+
+# Global instance
+single_flight = SingleFlight()
@@ -175,6 +175,7 @@ def process_file_automatically(self, uploaded_file_id):
     - Unlimited chunks
     - BGE-M3 only
     - 3 retry attempts (Celery-level) + 3 attempts (process-level) = up to 9 total
+    - Retries resume from the file's ingestion checkpoint (no duplicate chunks)
     - Performance over speed
     """
     try:
@@ -215,47 +216,78 @@ def process_bulk_upload(self, uploaded_file_ids):
     - No compromises on chunking
     - BGE-M3 only for embeddings
     - Performance over speed
+    
+    Fans the files out into per-file tasks (see bulk_import.py) instead of
+    processing them one after another in this task.
     """
+    from .bulk_import import start_bulk_import
+    
     try:
         logger.info(f'Processing {len(uploaded_file_ids)} files in bulk')
         
-        results = {
-            'successful': 0,
-            'failed': 0,
-            'details': []
-        }
+        job = start_bulk_import(uploaded_file_ids)
         
-        for uploaded_file_id in uploaded_file_ids:
-            try:
-                # Process each file using automatic processor
-                result = automatic_file_processor.process_file_fully(uploaded_file_id)
-                
-                results['successful'] += 1
-                results['details'].append({
-                    'uploaded_file_id': uploaded_file_id,
-                    'status': 'success',
-                    'chunk_count': result.get('chunk_count', 0),
-                    'embedding_count': result.get('embedding_count', 0)
-                })
-                
-            except Exception as e:
-                logger.error(f'Error processing file {uploaded_file_id}: {e}', exc_info=True)
-                results['failed'] += 1
-                results['details'].append({
-                    'uploaded_file_id': uploaded_file_id,
-                    'status': 'failed',
-                    'error': str(e)
-                })
-        
-        logger.info(f'Bulk processing completed: {results["successful"]} successful, {results["failed"]} failed')
-        
-        return results
+        return {
+            'status': 'dispatched',
+            'bulk_import_job_id': job.id,
+            'total': job.total,
+            'concurrency': job.concurrency
+        }
         
     except Exception as e:
         logger.error(f'Bulk processing failed: {e}', exc_info=True)
         raise
 
 
+@shared_task(bind=True, name='ai_assistant.tasks.process_bulk_import_file')
+def process_bulk_import_file(self, job_id, uploaded_file_id):
+    """
+    Process one file of a bulk import job (one link of a bulk import lane)
+    
+    Never raises: a failed file is recorded on the job and the lane moves on
+    to its next file. process_file_fully already retries internally.
+    """
+    from .bulk_import import record_file_result
+    
+    try:
+        result = automatic_file_processor.process_file_fully(uploaded_file_id)
+        record_file_result(job_id, uploaded_file_id, success=True)
+        
+        return {
+            'uploaded_file_id': uploaded_file_id,
+            'status': 'success',
+            'chunk_count': result.get('chunk_count', 0),
+            'embedding_count': result.get('embedding_count', 0)
+        }
+        
+    except Exception as e:
+        logger.error(f'Bulk import {job_id}: error processing file {uploaded_file_id}: {e}', exc_info=True)
+        try:
+            record_file_result(job_id, uploaded_file_id, success=False)
+        except Exception as record_error:
+            logger.error(f'Bulk import {job_id}: failed to record result of file {uploaded_file_id}: {record_error}')
+        
+        return {
+            'uploaded_file_id': uploaded_file_id,
+            'status': 'failed',
+            'error': str(e)
+        }
+
+
+@shared_task(name='ai_assistant.tasks.finish_bulk_import')
+def finish_bulk_import(job_id):
+    """Chord callback: all lanes of a bulk import job are done"""
+    from .bulk_import import finish_job
+    from .models import BulkImportJob
+    
+    finish_job(job_id)
+    job = BulkImportJob.objects.filter(id=job_id).first()
+    if job:
+        logger.info(f'Bulk import {job_id} completed: {job.completed} successful, {job.failed} failed')
+    
+    return {'status': 'completed', 'bulk_import_job_id': job_id}
+
+
 @shared_task(name='ai_assistant.tasks.process_pending_files')
 def process_pending_files():
     """
@@ -289,3 +321,24 @@ def process_pending_files():
     except Exception as e:
         logger.error(f'Error processing pending files: {e}', exc_info=True)
 
+
+
+@shared_task(name='ai_assistant.tasks.resume_stalled_bulk_imports')
+def resume_stalled_bulk_imports():
+    """Dispatch again the unfinished files of stalled bulk import jobs (lost chord, killed task)"""
+    from .bulk_import import resume_stalled_jobs
+    
+    dispatched = resume_stalled_jobs()
+    if dispatched:
+        logger.info(f'Dispatched {dispatched} unfinished bulk import files again')
+    return {'status': 'completed', 'dispatched': dispatched}
+
+
+@shared_task(name='ai_assistant.tasks.prune_semantic_cache')
+def prune_semantic_cache():
+    """Drop expired and outdated semantic answer cache entries"""
+    from .semantic_cache import semantic_cache
+    
+    removed = semantic_cache.prune()
+    logger.info(f'Pruned {removed} semantic cache entries')
+    return {'status': 'completed', 'removed': removed}
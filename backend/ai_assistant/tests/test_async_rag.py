@@ -0,0 +1,35 @@
+"""
+Tests for the async RAG retrieval hop (run_in_retrieval_thread)
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from ai_assistant.async_rag import run_in_retrieval_thread
+
+
+class RetrievalThreadTests(SimpleTestCase):
+
+    def test_concurrent_retrievals_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def retrieve(name):
+            # Both calls must be inside retrieve() at once to pass the barrier
+            barrier.wait()
+            return name, threading.current_thread().name
+
+        async def run_both():
+            return await asyncio.gather(run_in_retrieval_thread(retrieve, 'a'), run_in_retrieval_thread(retrieve, 'b'))
+
+        results = asyncio.run(run_both())
+        self.assertEqual([name for name, _ in results], ['a', 'b'])
+        self.assertTrue(all(thread.startswith('async-retrieval') for _, thread in results))
+
+    def test_connections_are_released_even_on_error(self):
+        def retrieve():
+            raise ValueError('search failed')
+
+        with patch('ai_assistant.async_rag.close_old_connections') as close:
+            with self.assertRaisesMessage(ValueError, 'search failed'):
+                asyncio.run(run_in_retrieval_thread(retrieve))
+        self.assertEqual(close.call_count, 2)
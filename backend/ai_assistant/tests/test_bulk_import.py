@@ -0,0 +1,72 @@
+"""
+Tests for bulk import lanes, dispatch failures and stalled job recovery
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.test import SimpleTestCase
+from ai_assistant import bulk_import
+from ai_assistant.bulk_import import build_lanes, dispatch_or_fail, resume_stalled_jobs
+
+
+class BuildLanesTests(SimpleTestCase):
+
+    def test_files_are_dealt_round_robin(self):
+        self.assertEqual(build_lanes([1, 2, 3, 4, 5], 2), [[1, 3, 5], [2, 4]])
+
+    def test_no_empty_lanes(self):
+        self.assertEqual(build_lanes([1, 2], 4), [[1], [2]])
+        self.assertEqual(build_lanes([], 3), [])
+
+
+class DispatchTests(SimpleTestCase):
+
+    def test_dispatch_failure_fails_job_and_files(self):
+        with patch.object(bulk_import, 'dispatch_job', side_effect=ConnectionError('broker down')), \
+                patch.object(bulk_import, 'fail_job') as fail_job:
+            self.assertFalse(dispatch_or_fail(7, [1, 2], 2))
+        fail_job.assert_called_once_with(7, [1, 2], 'Bulk import dispatch failed: broker down')
+
+    def test_successful_dispatch(self):
+        with patch.object(bulk_import, 'dispatch_job') as dispatch_job, \
+                patch.object(bulk_import, 'fail_job') as fail_job:
+            self.assertTrue(dispatch_or_fail(7, [1, 2], 2))
+        dispatch_job.assert_called_once_with(7, [1, 2], 2)
+        fail_job.assert_not_called()
+
+
+class ResumeStalledJobsTests(SimpleTestCase):
+
+    def resume(self, jobs, unfinished_ids):
+        with patch.object(bulk_import, 'BulkImportJob') as job_model, \
+                patch.object(bulk_import, 'UploadedFile') as file_model, \
+                patch.object(bulk_import, 'dispatch_or_fail', return_value=True) as dispatch, \
+                patch.object(bulk_import, 'finish_job') as finish_job:
+            # The same queryset mock serves the stalled-jobs loop and the per-job update
+            job_model.objects.filter.return_value = MagicMock(__iter__=lambda _: iter(jobs))
+            file_model.objects.filter.return_value.values_list.return_value = unfinished_ids
+            dispatched = resume_stalled_jobs()
+        return dispatched, dispatch, finish_job, file_model
+
+    def test_queued_files_are_dispatched_again_in_job_order(self):
+        job = SimpleNamespace(id=3, file_ids=[5, 1, 9, 4], concurrency=3)
+        dispatched, dispatch, finish_job, _ = self.resume([job], [9, 5])
+        self.assertEqual(dispatched, 2)
+        dispatch.assert_called_once_with(3, [5, 9], 2)
+        finish_job.assert_not_called()
+
+    def test_files_left_mid_processing_are_dispatched_again(self):
+        job = SimpleNamespace(id=3, file_ids=[5, 1, 9], concurrency=3)
+        # File 1 was killed while embedding, so no task recorded its result
+        dispatched, dispatch, finish_job, file_model = self.resume([job], [1])
+        statuses = file_model.objects.filter.call_args.kwargs['processing_status__in']
+        self.assertEqual(set(statuses), {'queued', 'metadata_extracting', 'chunking', 'embedding'})
+        self.assertEqual(dispatched, 1)
+        dispatch.assert_called_once_with(3, [1], 1)
+        finish_job.assert_not_called()
+
+    def test_job_with_nothing_unfinished_is_finished(self):
+        job = SimpleNamespace(id=3, file_ids=[5, 1], concurrency=2)
+        dispatched, dispatch, finish_job, _ = self.resume([job], [])
+        self.assertEqual(dispatched, 0)
+        dispatch.assert_not_called()
+        finish_job.assert_called_once_with(3)
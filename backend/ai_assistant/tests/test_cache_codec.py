@@ -0,0 +1,80 @@
+"""
+Tests for the compact cache codec (vectors, chunk-reference results, metrics)
+"""
+from unittest.mock import patch
+from django.test import SimpleTestCase, override_settings
+from ai_assistant.cache_codec import CacheCodec, RESULTS_FORMAT, key_family
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class CacheCodecTests(SimpleTestCase):
+
+    def setUp(self):
+        self.codec = CacheCodec()
+
+    def test_vector_round_trip(self):
+        data = self.codec.encode_vector([0.5, -1.25, 2.0], width=4)
+        self.assertEqual(len(data), 1 + 3 * 4)
+        self.assertEqual(self.codec.decode_vector(data), [0.5, -1.25, 2.0])
+
+    def test_float16_vectors_carry_their_width(self):
+        data = self.codec.encode_vector([0.5, 1.0], width=2)
+        self.assertEqual(len(data), 1 + 2 * 2)
+        self.assertEqual(self.codec.decode_vector(data), [0.5, 1.0])
+
+    def test_chunk_results_keep_only_ids_and_extra_fields(self):
+        payload = self.codec.encode_results([{'id': 3, 'content': 'long text', 'similarity': 0.8}])
+        self.assertEqual(payload, (RESULTS_FORMAT, [(3, {'similarity': 0.8})]))
+
+    def test_non_chunk_results_are_stored_as_is(self):
+        results = [{'id': 'web-1', 'content': 'x'}]
+        self.assertIs(self.codec.encode_results(results), results)
+        self.assertIs(self.codec.decode_results(results), results)
+
+    def test_decode_rehydrates_rows_and_drops_deleted_chunks(self):
+        payload = (RESULTS_FORMAT, [(1, {'similarity': 0.9}), (2, {'similarity': 0.5})])
+        rows = {1: {'id': 1, 'content': 'chunk one'}}
+        with patch('ai_assistant.retrieval_core.fetch_chunk_rows', return_value=rows):
+            results = self.codec.decode_results(payload)
+        self.assertEqual(results, [{'id': 1, 'content': 'chunk one', 'similarity': 0.9}])
+
+    def test_key_family(self):
+        self.assertEqual(key_family('search_scored_' + 'a' * 32 + '_10'), 'search_scored')
+        self.assertEqual(key_family('embedding_misc'), 'embedding')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CacheCodecMetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.codec = CacheCodec()
+        self.codec.size_sample_every = 3
+        self.key = 'search_' + 'b' * 32
+
+    def test_entry_size_is_sampled(self):
+        with patch('ai_assistant.cache_codec.cache'), \
+                patch('ai_assistant.cache_codec.pickle.dumps', return_value=b'x' * 100) as dumps:
+            for _ in range(7):
+                self.codec.set_results(self.key, [{'id': 1, 'similarity': 0.5}], 60)
+        # Writes 1, 4 and 7 are measured, once each
+        self.assertEqual(dumps.call_count, 3)
+        metrics = self.codec.get_metrics()['search']
+        self.assertEqual(metrics['sets'], 7)
+        self.assertEqual(metrics['sized'], 3)
+        self.assertEqual(metrics['avg_entry_bytes'], 100)
+
+    def test_size_sampling_can_be_disabled(self):
+        self.codec.size_sample_every = 0
+        with patch('ai_assistant.cache_codec.cache'), \
+                patch('ai_assistant.cache_codec.pickle.dumps') as dumps:
+            self.codec.set_results(self.key, [{'id': 1}], 60)
+        dumps.assert_not_called()
+        self.assertEqual(self.codec.get_metrics()['search']['avg_entry_bytes'], 0)
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.codec.get_results(self.key))
+        self.codec.set_results(self.key, [{'id': 'web-1'}], 60)
+        self.assertEqual(self.codec.get_results(self.key), [{'id': 'web-1'}])
+        metrics = self.codec.get_metrics()['search']
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['hit_rate']), (1, 1, 0.5))
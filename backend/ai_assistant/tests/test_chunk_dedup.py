@@ -0,0 +1,76 @@
+"""
+Tests for content-addressed embedding reuse (ChunkDeduplicator.embed)
+"""
+from unittest.mock import patch
+from django.conf import settings
+from django.db.models.signals import post_delete, pre_delete
+from django.test import SimpleTestCase
+from ai_assistant.chunk_dedup import ChunkDeduplicator
+from ai_assistant.chunk_writer import chunk_content_hash
+from ai_assistant.models import DocumentChunk
+
+
+class RecordingEmbedder:
+    """embed_batch stand-in: one-element vector per text, records every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class ChunkDeduplicatorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dedup = ChunkDeduplicator()
+        self.dedup.enabled = True
+        self.embedder = RecordingEmbedder()
+
+    def embed(self, texts, existing=None, batch_size=50):
+        with patch.object(self.dedup, 'find_existing', return_value=existing or {}):
+            return self.dedup.embed(texts, self.embedder, batch_size=batch_size)
+
+    def test_identical_texts_in_a_batch_are_embedded_once(self):
+        embeddings, canonical_ids = self.embed(['alpha', 'beta', 'alpha'])
+        self.assertEqual(self.embedder.calls, [['alpha', 'beta']])
+        self.assertEqual(embeddings, [[5.0], [4.0], [5.0]])
+        self.assertEqual(canonical_ids, [None, None, None])
+
+    def test_stored_vectors_are_reused(self):
+        existing = {chunk_content_hash('alpha'): (42, [0.5])}
+        embeddings, canonical_ids = self.embed(['alpha', 'beta'], existing=existing)
+        self.assertEqual(self.embedder.calls, [['beta']])
+        self.assertEqual(embeddings, [[0.5], [4.0]])
+        self.assertEqual(canonical_ids, [42, None])
+
+    def test_nothing_embedded_when_everything_is_known(self):
+        existing = {chunk_content_hash('alpha'): (7, [1.0])}
+        embeddings, canonical_ids = self.embed(['alpha', 'alpha'], existing=existing)
+        self.assertEqual(self.embedder.calls, [])
+        self.assertEqual(canonical_ids, [7, 7])
+
+    def test_unseen_texts_are_embedded_in_batches(self):
+        texts = [f"text {i}" for i in range(5)]
+        self.embed(texts, batch_size=2)
+        self.assertEqual([len(call) for call in self.embedder.calls], [2, 2, 1])
+
+    def test_disabled_embeds_everything(self):
+        self.dedup.enabled = False
+        embeddings, canonical_ids = self.dedup.embed(['alpha', 'alpha'], self.embedder)
+        self.assertEqual(self.embedder.calls, [['alpha', 'alpha']])
+        self.assertEqual(canonical_ids, [None, None])
+
+    def test_content_hash_ignores_whitespace_differences(self):
+        self.assertEqual(chunk_content_hash('some  text\n'), chunk_content_hash('some text'))
+
+
+class ChunkDeleteReceiverTests(SimpleTestCase):
+
+    def test_chunk_deletes_have_no_receivers_without_shared_vectors(self):
+        # Any delete receiver makes chunk deletes load every row with its embedding
+        if getattr(settings, 'CHUNK_DEDUP_SHARED_VECTORS', False):
+            self.skipTest('shared vectors enabled')
+        self.assertFalse(pre_delete.has_listeners(DocumentChunk))
+        self.assertFalse(post_delete.has_listeners(DocumentChunk))
@@ -0,0 +1,100 @@
+"""
+Tests for token-budgeted context packing
+"""
+from django.test import SimpleTestCase
+from ai_assistant.context_packer import ContextPacker, TEMPLATE_OVERHEAD_TOKENS
+
+
+class WordCounter:
+    """TokenCounter stand-in: one token per whitespace-separated word"""
+
+    exact = True
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return ' '.join(text.split()[:max(max_tokens, 0)])
+
+
+def sentences(prefix, count):
+    return ' '.join(f"{prefix} sentence number {i} has some words." for i in range(count))
+
+
+def render_item(doc, content):
+    return f"[{doc['id']}]\n{content}"
+
+
+def render_context(items):
+    return "\n\n".join(render_item(doc, content) for doc, content in items)
+
+
+class ContextPackerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.packer = ContextPacker(token_counter=WordCounter())
+        self.packer.min_chunk_tokens = 5
+
+    def pack(self, documents, budget):
+        return self.packer.pack('test', documents, budget, render_item, render_context)
+
+    def test_context_budget_reserves_generation_and_prompt(self):
+        budget = self.packer.context_budget(1000, 300, 'one two three')
+        self.assertEqual(budget, 1000 - 300 - TEMPLATE_OVERHEAD_TOKENS - 3)
+
+    def test_context_budget_never_below_minimum(self):
+        self.assertEqual(self.packer.context_budget(100, 100, 'prompt'), self.packer.min_chunk_tokens)
+
+    def test_packs_best_scoring_documents_first_within_budget(self):
+        documents = [
+            {'id': 1, 'similarity': 0.2, 'content': sentences('low', 2)},
+            {'id': 2, 'similarity': 0.9, 'content': sentences('high', 2)},
+            {'id': 3, 'similarity': 0.5, 'content': sentences('mid', 2)},
+        ]
+        packed = self.pack(documents, 40)
+        self.assertEqual([doc['id'] for doc, _ in packed.items], [2, 3])
+        self.assertLessEqual(packed.used_tokens, 40)
+        self.assertEqual(packed.used_tokens, WordCounter().count(packed.text))
+        self.assertEqual(packed.dropped, 1)
+
+    def test_skips_chunks_already_packed(self):
+        text = sentences('shared', 3)
+        documents = [
+            {'id': 1, 'similarity': 0.9, 'content': text},
+            {'id': 2, 'similarity': 0.8, 'content': text},
+            {'id': 3, 'similarity': 0.7, 'content': sentences('other', 1)},
+        ]
+        packed = self.pack(documents, 1000)
+        self.assertEqual([doc['id'] for doc, _ in packed.items], [1, 3])
+        self.assertEqual(packed.duplicates, 1)
+
+    def test_truncates_last_chunk_at_sentence_boundary(self):
+        documents = [
+            {'id': 1, 'similarity': 0.9, 'content': sentences('first', 2)},
+            {'id': 2, 'similarity': 0.8, 'content': sentences('second', 4)},
+        ]
+        packed = self.pack(documents, 40)
+        self.assertEqual(packed.truncated, 1)
+        _, content = packed.items[-1]
+        self.assertTrue(content.endswith('.'))
+        self.assertLess(len(content), len(documents[1]['content']))
+        self.assertLessEqual(packed.used_tokens, 40)
+
+    def test_text_cut_from_a_truncated_chunk_is_not_a_duplicate(self):
+        head = sentences('head', 2)
+        tail = sentences('tail', 4)
+        documents = [
+            {'id': 1, 'similarity': 0.9, 'content': f"{head} {tail}"},
+            # Only the tail of chunk 1, which the budget cuts off
+            {'id': 2, 'similarity': 0.8, 'content': tail},
+        ]
+        packed = self.pack(documents, 24)
+        self.assertEqual(packed.truncated, 1)
+        self.assertNotIn('tail', packed.items[0][1])
+        self.assertEqual(packed.duplicates, 0)
+
+    def test_records_metrics(self):
+        self.pack([{'id': 1, 'similarity': 0.9, 'content': sentences('a', 1)}], 100)
+        metrics = self.packer.get_metrics()['test']
+        self.assertEqual(metrics['packs'], 1)
+        self.assertEqual(metrics['avg_budget_tokens'], 100)
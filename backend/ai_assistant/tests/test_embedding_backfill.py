@@ -0,0 +1,52 @@
+"""
+Tests for the embedding backfill resume point (EmbeddingBackfill.run)
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from django.test import SimpleTestCase
+from ai_assistant.embedding_backfill import EmbeddingBackfill
+
+BATCHES = [[(1, 'a'), (2, 'b')], [(3, 'c'), (4, 'd')], [(5, 'e'), (6, 'f')]]
+
+
+def make_cursor(last_chunk_id=0):
+    return SimpleNamespace(last_chunk_id=last_chunk_id, processed=0, errors=0, completed_at=None,
+                           save=lambda **kwargs: None)
+
+
+class EmbeddingBackfillRunTests(SimpleTestCase):
+
+    def run_backfill(self, force, failing_batch=None):
+        backfill = EmbeddingBackfill(batch_size=2, workers=1, force=force)
+        cursor = make_cursor()
+
+        def process(batch):
+            return (0, len(batch)) if batch is failing_batch else (len(batch), 0)
+
+        queryset = MagicMock()
+        queryset.filter.return_value.count.return_value = 6
+
+        with patch.object(backfill, 'load_cursor', return_value=cursor), \
+                patch.object(backfill, 'get_queryset', return_value=queryset), \
+                patch.object(backfill, '_iter_batches', return_value=iter(BATCHES)), \
+                patch.object(backfill, '_process_batch', side_effect=process):
+            result = backfill.run()
+        return result, cursor
+
+    def test_successful_run_completes_the_cursor(self):
+        result, cursor = self.run_backfill(force=True)
+        self.assertEqual(result['processed'], 6)
+        self.assertEqual(cursor.last_chunk_id, 6)
+        self.assertIsNotNone(cursor.completed_at)
+
+    def test_forced_run_holds_the_cursor_at_the_first_failed_batch(self):
+        result, cursor = self.run_backfill(force=True, failing_batch=BATCHES[1])
+        self.assertEqual((result['processed'], result['errors']), (4, 2))
+        self.assertEqual(cursor.last_chunk_id, 2)
+        self.assertIsNone(cursor.completed_at)
+
+    def test_missing_embeddings_run_completes_despite_failures(self):
+        # Failed chunks keep a NULL embedding, so the next run finds them from the start
+        _, cursor = self.run_backfill(force=False, failing_batch=BATCHES[1])
+        self.assertEqual(cursor.last_chunk_id, 6)
+        self.assertIsNotNone(cursor.completed_at)
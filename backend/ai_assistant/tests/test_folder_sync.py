@@ -0,0 +1,152 @@
+"""
+Tests for the manifest-backed folder scan (FolderSync.scan, check_deletions)
+"""
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from ai_assistant.folder_sync import FolderSync, FolderSyncError, check_deletions
+from ai_assistant.models import FolderManifest
+
+
+class InMemoryFolderSync(FolderSync):
+    """FolderSync whose manifest lives in memory; commit() keeps the scan result"""
+
+    def __init__(self, root, **kwargs):
+        super().__init__(root, **kwargs)
+        self.manifest = FolderManifest(root=self.root, hash_algorithm=self.hash_algorithm, directories={})
+        self.stored_entries = []
+
+    def get_manifest(self):
+        return self.manifest
+
+    def get_entries(self, manifest):
+        return list(self.stored_entries)
+
+    def commit(self, scan):
+        self.manifest.directories = scan['directories']
+        self.stored_entries = list(scan['entries'].values())
+
+
+class FolderSyncScanTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.folder = InMemoryFolderSync(self.root, extensions=['.pdf'])
+
+    def write(self, relative_path, content=b'content'):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def bump_mtime(self, relative_dir=''):
+        """Make a directory look changed even within the filesystem's timestamp granularity"""
+        path = os.path.join(self.root, relative_dir)
+        mtime_ns = os.stat(path).st_mtime_ns + 10 ** 9
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def sync(self, **kwargs):
+        scan = self.folder.scan(**kwargs)
+        self.folder.commit(scan)
+        return scan
+
+    def paths(self, entries):
+        return sorted(entry.path for entry in entries)
+
+    def test_first_scan_reports_wanted_files_as_new(self):
+        self.write('a.pdf')
+        self.write(os.path.join('sub', 'b.pdf'))
+        self.write('notes.txt')
+        scan = self.sync()
+        self.assertEqual(self.paths(scan['new']), ['a.pdf', os.path.join('sub', 'b.pdf')])
+        self.assertEqual(scan['stats']['files_hashed'], 2)
+        self.assertTrue(all(entry.content_hash for entry in scan['new']))
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        self.write(os.path.join('sub', 'b.pdf'))
+        self.sync()
+        scan = self.sync()
+        self.assertEqual(scan['stats']['directories_listed'], 0)
+        self.assertEqual(scan['stats']['unchanged'], 1)
+        self.assertEqual(scan['deleted'], [])
+
+    def test_detects_new_modified_moved_and_deleted_files(self):
+        self.write('keep.pdf')
+        self.write('change.pdf', b'old')
+        self.write('rename.pdf', b'rename me')
+        self.write('remove.pdf')
+        self.sync()
+
+        self.write('added.pdf', b'new file')
+        self.write('change.pdf', b'new content')
+        os.rename(os.path.join(self.root, 'rename.pdf'), os.path.join(self.root, 'renamed.pdf'))
+        os.remove(os.path.join(self.root, 'remove.pdf'))
+        self.bump_mtime()
+        scan = self.sync()
+
+        self.assertEqual(self.paths(scan['new']), ['added.pdf'])
+        self.assertEqual(self.paths(scan['modified']), ['change.pdf'])
+        self.assertNotEqual(scan['modified'][0].previous_hash, scan['modified'][0].content_hash)
+        self.assertEqual(self.paths(scan['moved']), ['renamed.pdf'])
+        self.assertEqual(scan['moved'][0].old_path, 'rename.pdf')
+        self.assertEqual(self.paths(scan['deleted']), ['remove.pdf'])
+        self.assertEqual(sorted(scan['entries']), ['added.pdf', 'change.pdf', 'keep.pdf', 'renamed.pdf'])
+
+    def test_removed_subdirectory_files_are_deleted(self):
+        self.write(os.path.join('gone', 'a.pdf'))
+        self.write('b.pdf')
+        self.sync()
+        shutil.rmtree(os.path.join(self.root, 'gone'))
+        self.bump_mtime()
+        scan = self.sync()
+        self.assertEqual(self.paths(scan['deleted']), [os.path.join('gone', 'a.pdf')])
+
+    def test_inaccessible_root_raises(self):
+        self.write('a.pdf')
+        self.sync()
+        shutil.rmtree(self.root)
+        with self.assertRaises(FolderSyncError):
+            self.folder.scan()
+
+    def test_unlistable_directory_keeps_its_subtree(self):
+        self.write(os.path.join('share', 'a.pdf'))
+        self.write(os.path.join('share', 'deep', 'b.pdf'))
+        self.write('c.pdf')
+        self.sync()
+
+        share = os.path.join(self.root, 'share')
+        real_scandir = os.scandir
+
+        def failing_scandir(path):
+            if path == share:
+                raise PermissionError('share unavailable')
+            return real_scandir(path)
+
+        with patch('ai_assistant.folder_sync.os.scandir', side_effect=failing_scandir):
+            scan = self.folder.scan(full=True)
+
+        self.assertEqual(scan['deleted'], [])
+        self.assertEqual(scan['stats']['directories_unreadable'], 1)
+        self.assertIn(os.path.join('share', 'deep', 'b.pdf'), scan['entries'])
+        self.assertIn(os.path.join('share', 'deep'), scan['directories'])
+
+
+class CheckDeletionsTests(SimpleTestCase):
+
+    def scan(self, known, deleted):
+        return {'deleted': [object()] * deleted, 'stats': {'known': known}}
+
+    def test_refuses_mass_deletion(self):
+        with self.assertRaises(FolderSyncError):
+            check_deletions(self.scan(known=100, deleted=80))
+
+    def test_allows_mass_deletion_when_asked(self):
+        check_deletions(self.scan(known=100, deleted=80), allow_mass_delete=True)
+
+    def test_allows_small_or_partial_deletions(self):
+        check_deletions(self.scan(known=100, deleted=40))
+        check_deletions(self.scan(known=4, deleted=4))
@@ -0,0 +1,36 @@
+"""
+Tests for hybrid search score helpers (top_k_indices, minmax_normalize)
+"""
+import numpy as np
+from django.test import SimpleTestCase
+from ai_assistant.hybrid_search import minmax_normalize, top_k_indices
+
+
+class TopKIndicesTests(SimpleTestCase):
+
+    def test_returns_best_first(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+        self.assertEqual(top_k_indices(scores, 3).tolist(), [1, 3, 2])
+
+    def test_matches_full_sort(self):
+        scores = np.random.default_rng(0).random(500)
+        expected = np.argsort(-scores, kind='stable')[:25]
+        self.assertEqual(top_k_indices(scores, 25).tolist(), expected.tolist())
+
+    def test_ties_keep_input_order(self):
+        self.assertEqual(top_k_indices(np.array([0.5, 0.5, 0.5]), 3).tolist(), [0, 1, 2])
+
+    def test_k_out_of_range(self):
+        scores = np.array([0.2, 0.8])
+        self.assertEqual(top_k_indices(scores, 10).tolist(), [1, 0])
+        self.assertEqual(top_k_indices(scores, 0).tolist(), [])
+        self.assertEqual(top_k_indices(np.array([]), 3).tolist(), [])
+
+
+class MinmaxNormalizeTests(SimpleTestCase):
+
+    def test_scales_to_unit_range(self):
+        self.assertEqual(minmax_normalize([2.0, 4.0, 3.0]).tolist(), [0.0, 1.0, 0.5])
+
+    def test_constant_scores_map_to_ones(self):
+        self.assertEqual(minmax_normalize([3.0, 3.0]).tolist(), [1.0, 1.0])
@@ -0,0 +1,106 @@
+"""
+Tests for the streaming ingestion stages (ChunkStream, ChunkWriterStage)
+"""
+import threading
+from django.test import SimpleTestCase
+from ai_assistant.ingest_pipeline import ChunkStream, ChunkWriterStage
+
+
+def make_chunks(count, size=10):
+    return [{'content': 'x' * size, 'chunk_index': i} for i in range(count)]
+
+
+class FakeWriter:
+    """ChunkBulkWriter stand-in that records flushed rows"""
+
+    def __init__(self, fail_on_flush=None):
+        self.rows = []
+        self.pending = []
+        self.flushes = 0
+        self.fail_on_flush = fail_on_flush
+
+    def add(self, **fields):
+        self.pending.append(fields)
+
+    def flush(self):
+        self.flushes += 1
+        if self.fail_on_flush == self.flushes:
+            raise RuntimeError('write failed')
+        self.rows.extend(self.pending)
+        self.pending = []
+
+
+class ChunkStreamTests(SimpleTestCase):
+
+    def test_take_respects_batch_size(self):
+        stream = ChunkStream(make_chunks(5))
+        self.assertEqual([c['chunk_index'] for c in stream.take(2, 1000)], [0, 1])
+        self.assertEqual([c['chunk_index'] for c in stream.take(2, 1000)], [2, 3])
+        self.assertEqual([c['chunk_index'] for c in stream.take(2, 1000)], [4])
+        self.assertEqual(stream.take(2, 1000), [])
+        self.assertEqual(stream.produced, 5)
+
+    def test_take_respects_payload_limit_and_keeps_the_rest(self):
+        stream = ChunkStream(make_chunks(4, size=10))
+        batch = stream.take(10, 25)
+        self.assertEqual([c['chunk_index'] for c in batch], [0, 1])
+        # The chunk that overflowed the payload starts the next batch
+        self.assertEqual([c['chunk_index'] for c in stream.take(10, 25)], [2, 3])
+
+    def test_take_returns_oversized_chunk_alone(self):
+        stream = ChunkStream([{'content': 'x' * 100}, {'content': 'y'}])
+        self.assertEqual(len(stream.take(10, 20)), 1)
+        self.assertEqual(stream.take(10, 20), [{'content': 'y'}])
+
+    def test_push_back_preserves_order(self):
+        stream = ChunkStream(make_chunks(4))
+        batch = stream.take(3, 1000)
+        stream.push_back(batch[1:])
+        self.assertEqual([c['chunk_index'] for c in stream.take(10, 1000)], [1, 2, 3])
+
+    def test_producer_error_is_raised_after_produced_chunks(self):
+        def chunks():
+            yield {'content': 'a'}
+            raise ValueError('extraction failed')
+
+        stream = ChunkStream(chunks())
+        self.assertEqual(stream.next(), {'content': 'a'})
+        with self.assertRaisesMessage(ValueError, 'extraction failed'):
+            stream.next()
+
+    def test_close_unblocks_producer_on_full_queue(self):
+        stream = ChunkStream(iter(make_chunks(100)), max_buffered=2)
+        stream.take(1, 1000)
+        stream.close()
+        self.assertFalse(stream._thread.is_alive())
+        self.assertLess(stream.produced, 100)
+
+
+class ChunkWriterStageTests(SimpleTestCase):
+
+    def test_writes_every_batch(self):
+        writer = FakeWriter()
+        stage = ChunkWriterStage(writer)
+        stage.put([{'chunk_index': 0}, {'chunk_index': 1}])
+        stage.put([{'chunk_index': 2}])
+        stage.stop()
+        stage.raise_if_failed()
+        self.assertEqual(stage.written, 3)
+        self.assertEqual(writer.flushes, 2)
+        self.assertEqual([row['chunk_index'] for row in writer.rows], [0, 1, 2])
+
+    def test_write_failure_is_raised_in_caller(self):
+        stage = ChunkWriterStage(FakeWriter(fail_on_flush=1), max_pending_batches=1)
+        stage.put([{'chunk_index': 0}])
+        stage.stop()
+        with self.assertRaisesMessage(RuntimeError, 'write failed'):
+            stage.raise_if_failed()
+        with self.assertRaisesMessage(RuntimeError, 'write failed'):
+            stage.put([{'chunk_index': 1}])
+
+    def test_stop_is_idempotent(self):
+        stage = ChunkWriterStage(FakeWriter())
+        stage.stop()
+        stage.stop()
+        self.assertFalse(any(t.name == 'chunk-writer' and t is stage._thread and t.is_alive()
+                             for t in threading.enumerate()))
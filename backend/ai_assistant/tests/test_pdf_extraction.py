@@ -0,0 +1,48 @@
+"""
+Tests for parallel PDF extraction sharding and pool selection
+"""
+from unittest.mock import patch
+from django.test import SimpleTestCase, override_settings
+from ai_assistant import pdf_extraction
+
+
+class ShardRangeTests(SimpleTestCase):
+
+    def test_ranges_cover_every_page_in_order(self):
+        self.assertEqual(pdf_extraction._shard_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+
+    def test_more_shards_than_pages(self):
+        self.assertEqual(pdf_extraction._shard_ranges(2, 4), [(0, 1), (1, 2)])
+
+
+class WorkerCountTests(SimpleTestCase):
+
+    @override_settings(PDF_EXTRACT_WORKERS=0, PDF_EXTRACT_MAX_WORKERS=4)
+    def test_cpu_count_is_capped(self):
+        with patch('ai_assistant.pdf_extraction.os.cpu_count', return_value=64):
+            self.assertEqual(pdf_extraction.get_worker_count(), 4)
+
+    @override_settings(PDF_EXTRACT_WORKERS=2, PDF_EXTRACT_MAX_WORKERS=4)
+    def test_explicit_workers_below_cap(self):
+        self.assertEqual(pdf_extraction.get_worker_count(), 2)
+
+    @override_settings(PDF_EXTRACT_WORKERS=16, PDF_EXTRACT_MAX_WORKERS=0)
+    def test_zero_cap_disables_it(self):
+        self.assertEqual(pdf_extraction.get_worker_count(), 16)
+
+
+class PoolSelectionTests(SimpleTestCase):
+
+    def test_daemonic_process_uses_billiard(self):
+        with patch('ai_assistant.pdf_extraction.multiprocessing.current_process') as current, \
+                patch('ai_assistant.pdf_extraction.BilliardExecutor') as executor:
+            current.return_value.daemon = True
+            pool = pdf_extraction._create_pool(2)
+        executor.assert_called_once_with(2)
+        self.assertIs(pool, executor.return_value)
+
+    def test_regular_process_uses_process_pool_executor(self):
+        with patch('ai_assistant.pdf_extraction.ProcessPoolExecutor') as executor:
+            pool = pdf_extraction._create_pool(2)
+        self.assertEqual(executor.call_args.kwargs['max_workers'], 2)
+        self.assertIs(pool, executor.return_value)
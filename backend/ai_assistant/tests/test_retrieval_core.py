@@ -0,0 +1,33 @@
+"""
+Tests for reciprocal-rank fusion of retrieval channels
+"""
+from django.test import SimpleTestCase
+from ai_assistant.retrieval_core import reciprocal_rank_fusion
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+
+    def test_chunks_found_by_both_lists_rank_first(self):
+        vector = [{'id': 1, 'similarity': 0.9}, {'id': 2, 'similarity': 0.8}]
+        lexical = [{'id': 3, 'lexical_score': 2.0}, {'id': 2, 'lexical_score': 1.0}]
+        fused = reciprocal_rank_fusion([vector, lexical], k=60)
+        self.assertEqual([doc['id'] for doc in fused], [2, 1, 3])
+        self.assertAlmostEqual(fused[0]['rrf_score'], 1 / 62 + 1 / 62)
+        self.assertAlmostEqual(fused[1]['rrf_score'], 1 / 61)
+
+    def test_keeps_highest_similarity_and_first_seen_fields(self):
+        fused = reciprocal_rank_fusion([
+            [{'id': 1, 'similarity': 0.4, 'content': 'first'}],
+            [{'id': 1, 'similarity': 0.7, 'content': 'second'}],
+        ])
+        self.assertEqual(fused[0]['similarity'], 0.7)
+        self.assertEqual(fused[0]['content'], 'first')
+
+    def test_inputs_are_not_modified(self):
+        doc = {'id': 1, 'similarity': 0.5}
+        reciprocal_rank_fusion([[doc], [doc]])
+        self.assertEqual(doc, {'id': 1, 'similarity': 0.5})
+
+    def test_empty_lists(self):
+        self.assertEqual(reciprocal_rank_fusion([]), [])
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
@@ -0,0 +1,108 @@
+"""
+Tests for the semantic answer cache (candidate checks and get_or_generate)
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+from django.test import SimpleTestCase
+from ai_assistant import semantic_cache as semantic_cache_module
+from ai_assistant.semantic_cache import SemanticAnswerCache, _chunk_ids, _numbers, _plain_json
+
+
+class FakeQuerySet:
+    """Chainable stand-in for the candidate query; slicing yields the given entries"""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    annotate = order_by = defer = filter
+
+    def update(self, **kwargs):
+        return 1
+
+    def __getitem__(self, item):
+        return self.entries[item]
+
+
+def entry(query, chunk_ids, distance=0.02):
+    return SimpleNamespace(id=1, query=query, chunk_ids=chunk_ids, distance=distance, result={'response': 'cached'})
+
+
+class HelperTests(SimpleTestCase):
+
+    def test_numbers_include_versions(self):
+        self.assertEqual(_numbers('install CDS 2.8 on 64 bit'), frozenset({'2.8', '64'}))
+        self.assertNotEqual(_numbers('CDS 2.8'), _numbers('CDS 2.9'))
+
+    def test_plain_json_converts_numpy_values(self):
+        self.assertEqual(_plain_json({'score': np.float32(0.5), 'ids': [np.int64(3)]}), {'score': 0.5, 'ids': [3]})
+
+    def test_chunk_ids_skip_documents_without_id(self):
+        self.assertEqual(_chunk_ids([{'id': 4}, {'id': None}, {'content': 'web'}]), [4])
+
+
+class LookupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache()
+        self.cache.min_chunk_overlap = 0.5
+
+    def lookup(self, query, chunk_ids, entries):
+        with patch.object(semantic_cache_module.SemanticCacheEntry, 'objects', FakeQuerySet(entries)):
+            return self.cache._lookup('rag', 'k=5', query, chunk_ids, [0.0], 'v1')
+
+    def test_hit_returns_cached_answer_for_new_query(self):
+        result = self.lookup('CDS 2.8 installation steps', [1, 2, 3], [entry('how do I install CDS 2.8', [1, 2, 3])])
+        self.assertEqual(result['response'], 'cached')
+        self.assertEqual(result['query'], 'CDS 2.8 installation steps')
+        self.assertEqual(result['semantic_cache']['similarity'], 0.98)
+        self.assertEqual(result['semantic_cache']['chunk_overlap'], 1.0)
+
+    def test_different_numbers_never_match(self):
+        self.assertIsNone(self.lookup('install CDS 2.9', [1, 2, 3], [entry('install CDS 2.8', [1, 2, 3])]))
+
+    def test_low_chunk_overlap_never_matches(self):
+        self.assertIsNone(self.lookup('install CDS', [1, 2, 3], [entry('install CDS', [3, 4, 5])]))
+
+
+class GetOrGenerateTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache()
+        self.cache.enabled = True
+        self.generated = {'response': 'generated'}
+
+    def generate(self):
+        return self.generated
+
+    def test_disabled_or_no_chunks_always_generates(self):
+        with patch.object(self.cache, '_query_embedding') as embed:
+            self.assertIs(self.cache.get_or_generate('rag', '', 'q', [{'content': 'web'}], self.generate), self.generated)
+            self.cache.enabled = False
+            self.assertIs(self.cache.get_or_generate('rag', '', 'q', [{'id': 1}], self.generate), self.generated)
+        embed.assert_not_called()
+
+    def test_lookup_failure_falls_back_to_generation(self):
+        with patch.object(self.cache, '_query_embedding', side_effect=ConnectionError('embedding service down')):
+            self.assertIs(self.cache.get_or_generate('rag', '', 'q', [{'id': 1}], self.generate), self.generated)
+
+    def test_miss_generates_and_stores(self):
+        with patch.object(self.cache, '_query_embedding', return_value=[0.1]), \
+                patch.object(self.cache, 'get_corpus_version', return_value='v1'), \
+                patch.object(self.cache, '_lookup', return_value=None), \
+                patch.object(semantic_cache_module.SemanticCacheEntry, 'objects') as objects:
+            result = self.cache.get_or_generate('rag', 'k=5', 'q', [{'id': 1}, {'id': 2}], self.generate)
+        self.assertIs(result, self.generated)
+        stored = objects.create.call_args.kwargs
+        self.assertEqual((stored['chunk_ids'], stored['corpus_version']), ([1, 2], 'v1'))
+        self.assertEqual(self.cache.get_metrics()['rag']['misses'], 1)
+
+    def test_hit_skips_generation(self):
+        with patch.object(self.cache, '_query_embedding', return_value=[0.1]), \
+                patch.object(self.cache, 'get_corpus_version', return_value='v1'), \
+                patch.object(self.cache, '_lookup', return_value={'response': 'cached'}):
+            result = self.cache.get_or_generate('rag', 'k=5', 'q', [{'id': 1}], lambda: self.fail('generated'))
+        self.assertEqual(result, {'response': 'cached'})
@@ -0,0 +1,98 @@
+"""
+Tests for single-flight request coalescing (SingleFlight.run) on a local-memory cache
+"""
+import time
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from ai_assistant.single_flight import SingleFlight
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'single-flight-tests'}}
+
+
+class Counter:
+    """compute() stand-in that returns a fixed result and counts its calls"""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SingleFlightTests(SimpleTestCase):
+
+    key = 'rag_query_' + 'c' * 32
+
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight()
+        self.flight.enabled = True
+        self.flight.poll_interval = 0.001
+        self.flight.max_poll_interval = 0.001
+
+    def test_computes_once_then_serves_cache(self):
+        compute = Counter({'answer': 42})
+        self.assertEqual(self.flight.run(self.key, 60, compute), {'answer': 42})
+        self.assertEqual(self.flight.run(self.key, 60, compute), {'answer': 42})
+        self.assertEqual(compute.calls, 1)
+        self.assertIsNone(cache.get(f"{self.key}:lock"))
+        metrics = self.flight.get_metrics()['rag_query']
+        self.assertEqual((metrics['computed'], metrics['hits']), (1, 1))
+
+    def test_uncacheable_result_is_not_stored(self):
+        compute = Counter({'answer': None})
+        self.flight.run(self.key, 60, compute, cacheable=lambda result: result['answer'] is not None)
+        self.assertIsNone(cache.get(self.key))
+        # Waiters still get it through the flight entry
+        self.assertEqual(cache.get(f"{self.key}:flight"), {'answer': None})
+
+    def test_lock_is_released_when_compute_fails(self):
+        def compute():
+            raise RuntimeError('generation failed')
+
+        with self.assertRaisesMessage(RuntimeError, 'generation failed'):
+            self.flight.run(self.key, 60, compute)
+        self.assertIsNone(cache.get(f"{self.key}:lock"))
+
+    def test_waiter_takes_the_leaders_result(self):
+        cache.add(f"{self.key}:lock", 'leader', 60)
+        cache.set(f"{self.key}:flight", {'answer': 'from leader'}, 30)
+        compute = Counter({'answer': 'own'})
+        self.assertEqual(self.flight.run(self.key, 60, compute), {'answer': 'from leader'})
+        self.assertEqual(compute.calls, 0)
+        self.assertEqual(self.flight.get_metrics()['rag_query']['coalesced'], 1)
+
+    def test_waiter_computes_after_wait_timeout(self):
+        self.flight.wait_timeout = 0
+        cache.add(f"{self.key}:lock", 'leader', 60)
+        compute = Counter({'answer': 'own'})
+        self.assertEqual(self.flight.run(self.key, 60, compute), {'answer': 'own'})
+        self.assertEqual(self.flight.get_metrics()['rag_query']['wait_timeouts'], 1)
+
+    def test_stale_result_is_served_and_revalidated(self):
+        cache.set(f"{self.key}:stale", {'answer': 'old'}, 60)
+        compute = Counter({'answer': 'new'})
+        revalidate = Counter({'answer': 'new'})
+        self.assertEqual(self.flight.run(self.key, 60, compute, revalidate=revalidate), {'answer': 'old'})
+        self.assertEqual(compute.calls, 0)
+
+        deadline = time.monotonic() + 5
+        while cache.get(self.key) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.get(self.key), {'answer': 'new'})
+        self.assertEqual(revalidate.calls, 1)
+
+    def test_disabled_computes_without_lock(self):
+        self.flight.enabled = False
+        compute = Counter({'answer': 1})
+        self.flight.run(self.key, 60, compute)
+        self.assertEqual(compute.calls, 1)
+        self.assertIsNone(cache.get(f"{self.key}:stale"))
+
+    def test_store_keeps_a_stale_copy(self):
+        self.flight.store(self.key, {'answer': 1}, 60)
+        self.assertEqual(cache.get(self.key), {'answer': 1})
+        self.assertEqual(cache.get(f"{self.key}:stale"), {'answer': 1})
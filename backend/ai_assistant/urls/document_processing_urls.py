@@ -23,7 +23,8 @@ try:
     from ..views.bulk_import_views import (
         scan_folder,
         bulk_import_files,
-        bulk_import_status
+        bulk_import_status,
+        bulk_import_progress
     )
     BULK_IMPORT_AVAILABLE = True
 except ImportError as e:
@@ -49,5 +50,7 @@ if BULK_IMPORT_AVAILABLE:
         path('bulk/scan-folder/', scan_folder, name='scan_folder'),
         path('bulk/import-files/', bulk_import_files, name='bulk_import_files'),
         path('bulk/status/', bulk_import_status, name='bulk_import_status'),
+        path('bulk/jobs/', bulk_import_progress, name='bulk_import_jobs'),
+        path('bulk/jobs/<int:job_id>/', bulk_import_progress, name='bulk_import_progress'),
     ])
 
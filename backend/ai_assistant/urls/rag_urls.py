@@ -6,22 +6,30 @@ This module contains URL patterns for RAG (Retrieval-Augmented Generation) opera
 
 from django.urls import path
 from ..views.rag_views import (
-    chat_with_ollama, rag_search, advanced_rag_search, 
+    chat_with_ollama, chat_with_ollama_stream, rag_search, rag_search_stream, advanced_rag_search, 
     comprehensive_rag_search, vector_search, upload_pdf_enhanced, 
     upload_document_enhanced
 )
+from ..views.async_rag_views import chat_with_ollama_async, rag_search_async, vector_search_async
 
 urlpatterns = [
     # Chat endpoints (accessible from both /api/ai/rag/ and /api/ai/chat/)
     path('', chat_with_ollama, name='rag_chat'),  # Match root when included
     path('ollama/', chat_with_ollama, name='chat_ollama'),  # /api/ai/chat/ollama/ or /api/ai/rag/ollama/
+    path('ollama/stream/', chat_with_ollama_stream, name='chat_ollama_stream'),  # Server-Sent Events
+    path('ollama/async/', chat_with_ollama_async, name='chat_ollama_async'),  # Async view, for ASGI
     
     # Search endpoints
     path('search/', rag_search, name='rag_search'),
+    path('search/stream/', rag_search_stream, name='rag_search_stream'),  # Server-Sent Events
     path('search/advanced/', advanced_rag_search, name='rag_search_advanced'),
     path('search/comprehensive/', comprehensive_rag_search, name='rag_search_comprehensive'),
     path('search/vector/', vector_search, name='rag_search_vector'),
     
+    # Async search endpoints (same payloads, non-blocking under ASGI)
+    path('search/async/', rag_search_async, name='rag_search_async'),
+    path('search/vector/async/', vector_search_async, name='rag_search_vector_async'),
+    
     # Upload endpoints
     path('upload/pdf/', upload_pdf_enhanced, name='rag_upload_pdf'),
     path('upload/document/', upload_document_enhanced, name='rag_upload_document'),
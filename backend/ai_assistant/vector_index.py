@@ -0,0 +1,117 @@
+"""
+Vector Index Management for DocumentChunk embeddings
+
+A single pgvector HNSW index (vector_cosine_ops) on
+ai_assistant_documentchunk.embedding serves every RAG tier: all searches
+order by cosine distance (<=>) through retrieval_core.VectorRetriever, and
+embeddings are L2-normalised at write time.
+
+Recall/latency is tuned per query with hnsw.ef_search (and ivfflat.probes
+if an IVFFlat index is ever used instead).
+"""
+import logging
+import math
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Index names must match DocumentChunk.Meta.indexes / migrations 0019-0020
+COSINE_INDEX_NAME = 'documentchunk_emb_cos_hnsw'
+
+MANAGED_VECTOR_INDEXES = [COSINE_INDEX_NAME]
+
+
+def normalize_embedding(embedding: Sequence[float]) -> List[float]:
+    """
+    L2-normalise an embedding to unit length.
+
+    Zero vectors are returned unchanged (they have no direction to keep).
+    """
+    values = [float(x) for x in embedding]
+    norm = math.sqrt(sum(x * x for x in values))
+    if norm == 0.0:
+        return values
+    return [x / norm for x in values]
+
+
+def get_ef_search(limit: int = 0, ef_search: Optional[int] = None) -> int:
+    """
+    Resolve hnsw.ef_search for a query.
+
+    HNSW returns at most ef_search rows, so it is never set below the
+    requested LIMIT (comprehensive mode asks for 60 candidates).
+    """
+    if ef_search is None:
+        ef_search = getattr(settings, 'VECTOR_INDEX_EF_SEARCH', 100)
+    return max(int(ef_search), int(limit or 0))
+
+
+def get_probes(probes: Optional[int] = None) -> int:
+    """Resolve ivfflat.probes for a query"""
+    if probes is None:
+        probes = getattr(settings, 'VECTOR_INDEX_PROBES', 10)
+    return max(int(probes), 1)
+
+
+@contextmanager
+def vector_search_cursor(limit: int = 0, ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """
+    Cursor for ANN queries with per-request recall settings.
+
+    SET LOCAL only lasts for the current transaction, so the cursor is
+    opened inside transaction.atomic() and the settings never leak to
+    other queries on the same connection.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {get_ef_search(limit, ef_search)}")
+            cursor.execute(f"SET LOCAL ivfflat.probes = {get_probes(probes)}")
+            yield cursor
+
+
+def get_vector_index_status() -> List[Dict]:
+    """Return name, definition, size and validity of the managed vector indexes"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.relname,
+                   pg_get_indexdef(i.oid),
+                   pg_size_pretty(pg_relation_size(i.oid)),
+                   ix.indisvalid
+            FROM pg_class i
+            JOIN pg_index ix ON ix.indexrelid = i.oid
+            WHERE i.relname = ANY(%s)
+            ORDER BY i.relname;
+        """, [MANAGED_VECTOR_INDEXES])
+        rows = cursor.fetchall()
+
+    found = {row[0]: row for row in rows}
+    status = []
+    for name in MANAGED_VECTOR_INDEXES:
+        row = found.get(name)
+        status.append({
+            'name': name,
+            'exists': row is not None,
+            'definition': row[1] if row else None,
+            'size': row[2] if row else None,
+            'valid': bool(row[3]) if row else False,
+        })
+    return status
+
+
+def reindex_vector_index(index_name: str, concurrently: bool = True):
+    """
+    Rebuild a managed vector index.
+
+    REINDEX ... CONCURRENTLY cannot run inside a transaction block, so this
+    must be called with autocommit on (the default for management commands).
+    """
+    if index_name not in MANAGED_VECTOR_INDEXES:
+        raise ValueError(f"Unknown vector index: {index_name}")
+
+    keyword = "CONCURRENTLY " if concurrently else ""
+    logger.info(f"Rebuilding vector index {index_name} ({'concurrent' if concurrently else 'blocking'})")
+    with connection.cursor() as cursor:
+        cursor.execute(f"REINDEX INDEX {keyword}{index_name};")
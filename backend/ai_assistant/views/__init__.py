@@ -7,8 +7,8 @@ It maintains backward compatibility while organizing views into logical modules.
 
 # Import all views for backward compatibility
 from .rag_views import (
-    chat_with_ollama, rag_search, advanced_rag_search, 
-    comprehensive_rag_search, vector_search, upload_pdf_enhanced, 
+    chat_with_ollama, chat_with_ollama_stream, rag_search, rag_search_stream,
+    advanced_rag_search, comprehensive_rag_search, vector_search, upload_pdf_enhanced, 
     upload_document_enhanced, extract_documents_metadata,
     documents, document_download, document_delete, document_search,
     pdf_view, pdf_download, pdf_delete, pdf_search,
@@ -42,6 +42,9 @@ except ImportError as e:
 # Import product views
 from . import product_views
 
+from .async_rag_views import (
+    chat_with_ollama_async, rag_search_async, vector_search_async
+)
 # Import help portal views
 from . import help_portal_views
 
@@ -51,6 +54,11 @@ from .legacy_views import *
 __all__ = [
     # RAG Views
     'chat_with_ollama',
+    'chat_with_ollama_stream',
+    'rag_search_stream',
+    'chat_with_ollama_async',
+    'rag_search_async',
+    'vector_search_async',
     'comprehensive_rag_search',
     'vector_search',
     'upload_pdf_enhanced',
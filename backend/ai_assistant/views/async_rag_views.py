@@ -0,0 +1,158 @@
+"""
+Async RAG Views Module
+
+Async variants of the chat, RAG search and vector search endpoints (see
+async_rag.py). DRF's api_view is sync-only, so these are plain Django async
+views that authenticate with the configured DRF authentication classes and
+return the same payloads as their sync counterparts in rag_views.py.
+"""
+
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from ..services.rag_service import RAGService
+
+logger = logging.getLogger(__name__)
+
+# Initialize service
+rag_service = RAGService()
+
+
+def _authenticate(request):
+    """User and parsed body of a request, as DRF would see them (runs in a worker thread)"""
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    return drf_request.user, drf_request.data
+
+
+def _json_response(data, status_code: int = status.HTTP_200_OK) -> JsonResponse:
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def _error_response(error_message: str, status_code: int = status.HTTP_400_BAD_REQUEST) -> JsonResponse:
+    """Same body as base_views.error_response"""
+    return _json_response({
+        'error': error_message,
+        'timestamp': timezone.now().isoformat()
+    }, status_code)
+
+
+def _service_response(result, view_name: str) -> JsonResponse:
+    """Same body as base_views.success_response / error_response for a service result"""
+    if not result['success']:
+        return _error_response(result['message'])
+
+    logger.info(f"{view_name} - Response: {result['message']}")
+    response_data = {
+        'message': result['message'],
+        'timestamp': timezone.now().isoformat()
+    }
+    if result['data']:
+        response_data.update(result['data'])
+    return _json_response(response_data)
+
+
+async def _authenticated_request(request, view_name: str):
+    """(user, data, None) for an authenticated request, else (None, None, error response)"""
+    try:
+        user, data = await sync_to_async(_authenticate)(request)
+    except exceptions.APIException as e:
+        return None, None, _error_response(str(e.detail), e.status_code)
+
+    if not user or not user.is_authenticated:
+        return None, None, _error_response('Authentication credentials were not provided.', status.HTTP_401_UNAUTHORIZED)
+
+    logger.info(f"{view_name} - User: {user}, Method: {request.method}")
+    return user, data, None
+
+
+@csrf_exempt
+@require_POST
+async def chat_with_ollama_async(request):
+    """chat_with_ollama without holding a worker thread while the model generates"""
+    try:
+        user, data, error = await _authenticated_request(request, 'chat_with_ollama_async')
+        if error:
+            return error
+
+        prompt = data.get('prompt', '').strip()
+        if not prompt:
+            return _error_response('Prompt is required')
+
+        # Get generation parameters
+        generation_params = {
+            'max_tokens': data.get('max_tokens'),
+            'temperature': data.get('temperature'),
+            'top_p': data.get('top_p'),
+            'top_k': data.get('top_k'),
+            'repeat_penalty': data.get('repeat_penalty'),
+            'num_ctx': data.get('num_ctx')
+        }
+
+        result = await rag_service.achat_with_ollama(prompt, user, **generation_params)
+        return _service_response(result, 'chat_with_ollama_async')
+
+    except Exception as e:
+        logger.error(f"chat_with_ollama_async - Error: {str(e)}")
+        return _json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def rag_search_async(request):
+    """rag_search without holding a worker thread while the model generates"""
+    try:
+        user, data, error = await _authenticated_request(request, 'rag_search_async')
+        if error:
+            return error
+
+        query = data.get('query', '').strip()
+        if not query:
+            return _error_response('Query is required')
+
+        # Get search parameters
+        top_k = int(data.get('top_k', 0)) or None
+        search_mode = data.get('search_mode', 'comprehensive')
+
+        result = await rag_service.arag_search(query, user, search_mode, top_k)
+        return _service_response(result, 'rag_search_async')
+
+    except Exception as e:
+        logger.error(f"rag_search_async - Error: {str(e)}")
+        return _json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_POST
+async def vector_search_async(request):
+    """vector_search served from an async view"""
+    try:
+        user, data, error = await _authenticated_request(request, 'vector_search_async')
+        if error:
+            return error
+
+        query = data.get('query', '').strip()
+        if not query:
+            return _error_response('Query is required')
+
+        # Get search parameters
+        top_k = int(data.get('top_k', 0)) or None
+        search_mode = data.get('search_mode', 'comprehensive')
+
+        result = await rag_service.avector_search(query, user, search_mode, top_k)
+        return _service_response(result, 'vector_search_async')
+
+    except Exception as e:
+        logger.error(f"vector_search_async - Error: {str(e)}")
+        return _json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
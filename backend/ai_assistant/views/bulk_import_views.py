@@ -19,11 +19,24 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from ..models import UploadedFile, DocumentFile
+from ..models import UploadedFile, DocumentFile, BulkImportJob
 from ..automatic_file_processor import automatic_file_processor
+from ..bulk_import import start_bulk_import, get_progress
+from ..folder_sync import FolderSync, FolderSyncError, sync_folder
 
 logger = logging.getLogger(__name__)
 
+# Supported file types
+SUPPORTED_EXTENSIONS = [
+    '.pdf', '.doc', '.docx', '.txt', '.rtf', '.html', '.mhtml', '.md',
+    '.xls', '.xlsx', '.csv',
+    '.ppt', '.pptx',
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp',
+    '.mp3', '.wav', '.flac', '.aac', '.ogg',
+    '.mp4', '.avi', '.mov', '.wmv', '.webm',
+    '.zip', '.rar', '.7z', '.tar', '.gz'
+]
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -32,9 +45,20 @@ def scan_folder(request):
     Scan a folder and discover supported files
     
     QUALITY FOCUS: Scan recursively, find all supported file types
+    
+    Backed by the folder's manifest (folder_sync.py): only directories that
+    changed since the last sync are listed and only changed files hashed.
+    With sync=true, new and modified files are imported (bulk import job)
+    and records of deleted files are removed; full_rescan=true also lists
+    unchanged directories (catches files rewritten in place). A sync that
+    would delete most of the folder is refused (409) unless
+    allow_mass_delete=true.
     """
     try:
         folder_path = request.data.get('folder_path', '')
+        sync = str(request.data.get('sync', 'false')).lower() == 'true'
+        full_rescan = str(request.data.get('full_rescan', 'false')).lower() == 'true'
+        allow_mass_delete = str(request.data.get('allow_mass_delete', 'false')).lower() == 'true'
         
         if not folder_path:
             return Response(
@@ -48,44 +72,51 @@ def scan_folder(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Supported file types
-        supported_extensions = [
-            '.pdf', '.doc', '.docx', '.txt', '.rtf', '.html', '.mhtml', '.md',
-            '.xls', '.xlsx', '.csv',
-            '.ppt', '.pptx',
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp',
-            '.mp3', '.wav', '.flac', '.aac', '.ogg',
-            '.mp4', '.avi', '.mov', '.wmv', '.webm',
-            '.zip', '.rar', '.7z', '.tar', '.gz'
-        ]
+        folder = FolderSync(folder_path, extensions=SUPPORTED_EXTENSIONS)
+        
+        if sync:
+            try:
+                summary = sync_folder(
+                    folder_path, user=request.user, extensions=SUPPORTED_EXTENSIONS,
+                    full=full_rescan, allow_mass_delete=allow_mass_delete
+                )
+            except FolderSyncError as e:
+                return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+            return Response({
+                'success': True,
+                'folder_path': folder_path,
+                'sync': summary
+            })
+        
+        # Preview only: the manifest advances when the folder is synced
+        scan = folder.scan(full=full_rescan, hash_new=False)
         
         discovered_files = []
         total_size = 0
         
-        # Scan recursively
-        for root, dirs, files in os.walk(folder_path):
-            for filename in files:
-                file_path = os.path.join(root, filename)
-                file_ext = Path(filename).suffix.lower()
-                
-                if file_ext in supported_extensions:
-                    file_size = os.path.getsize(file_path)
-                    total_size += file_size
-                    
-                    discovered_files.append({
-                        'filename': filename,
-                        'file_path': file_path,
-                        'file_size': file_size,
-                        'file_extension': file_ext,
-                        'relative_path': os.path.relpath(file_path, folder_path)
-                    })
+        for path, entry in sorted(scan['entries'].items()):
+            total_size += entry.size
+            discovered_files.append({
+                'filename': os.path.basename(path),
+                'file_path': folder.absolute_path(path),
+                'file_size': entry.size,
+                'file_extension': Path(path).suffix.lower(),
+                'relative_path': path
+            })
         
         return Response({
             'success': True,
             'folder_path': folder_path,
             'file_count': len(discovered_files),
             'total_size': total_size,
-            'files': discovered_files
+            'files': discovered_files,
+            'changes': {
+                'new': [entry.path for entry in scan['new']],
+                'modified': [entry.path for entry in scan['modified']],
+                'moved': [entry.path for entry in scan['moved']],
+                'deleted': [entry.path for entry in scan['deleted']],
+            },
+            'scan_stats': scan['stats']
         })
         
     except Exception as e:
@@ -109,6 +140,9 @@ def bulk_import_files(request):
     - Detailed logging at every step
     - Recovery mechanisms
     - Progress reporting
+    
+    Imported files are processed by a BulkImportJob (per-file Celery tasks,
+    smallest files first); poll bulk/jobs/<id>/ for its progress.
     """
     import traceback
     
@@ -132,6 +166,9 @@ def bulk_import_files(request):
         
         logger.info(f"Starting bulk import of {len(files_to_import)} files for user {request.user.username}")
         
+        imported_file_ids = []
+        job = None
+        
         with transaction.atomic():
             for idx, file_info in enumerate(files_to_import, 1):
                 file_path = file_info.get('file_path')
@@ -186,8 +223,9 @@ def bulk_import_files(request):
                         file_hash=file_hash,
                         file_size=file_size,
                         uploaded_by=request.user,
-                        processing_status='pending'
+                        processing_status='queued'  # Dispatched by the bulk import job below
                     )
+                    imported_file_ids.append(uploaded_file.id)
                     
                     logger.info(f"Created UploadedFile record for {filename} (ID: {uploaded_file.id})")
                     
@@ -222,8 +260,7 @@ def bulk_import_files(request):
                             'type': 'documentfile_creation_error'
                         })
                     
-                    # Trigger automatic processing (will be handled by signal)
-                    # automatic_file_processor.process_file_fully(uploaded_file.id)
+                    # Processing is dispatched by the bulk import job after the loop
                     
                     results['successful'] += 1
                     
@@ -268,12 +305,17 @@ def bulk_import_files(request):
                         'error': str(e)
                     })
                     continue
+            
+            # Fan out into per-file tasks once the records are committed
+            if imported_file_ids:
+                job = start_bulk_import(imported_file_ids, user=request.user)
         
         logger.info(f"Bulk import completed: {results['successful']} successful, {results['failed']} failed, {results['skipped']} skipped")
         
         return Response({
             'success': True,
-            'results': results
+            'results': results,
+            'bulk_import_job_id': job.id if job else None
         })
         
     except Exception as e:
@@ -347,6 +389,7 @@ def bulk_import_status(request):
         stats = {
             'total': UploadedFile.objects.count(),
             'pending': UploadedFile.objects.filter(processing_status='pending').count(),
+            'queued': UploadedFile.objects.filter(processing_status='queued').count(),
             'metadata_extracting': UploadedFile.objects.filter(processing_status='metadata_extracting').count(),
             'chunking': UploadedFile.objects.filter(processing_status='chunking').count(),
             'embedding': UploadedFile.objects.filter(processing_status='embedding').count(),
@@ -364,7 +407,7 @@ def bulk_import_status(request):
             ).count(),
             'document_files_processing': DocumentFile.objects.filter(
                 uploaded_file__isnull=False,
-                uploaded_file__processing_status__in=['pending', 'metadata_extracting', 'chunking', 'embedding']
+                uploaded_file__processing_status__in=['pending', 'queued', 'metadata_extracting', 'chunking', 'embedding']
             ).count()
         }
         
@@ -382,6 +425,42 @@ def bulk_import_status(request):
         )
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulk_import_progress(request, job_id=None):
+    """
+    Aggregated progress of a bulk import job
+    
+    Without job_id, returns the most recent jobs
+    """
+    try:
+        if job_id is not None:
+            try:
+                job = BulkImportJob.objects.get(id=job_id)
+            except BulkImportJob.DoesNotExist:
+                return Response(
+                    {'error': f'Bulk import job {job_id} not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response({
+                'success': True,
+                'job': get_progress(job)
+            })
+        
+        jobs = BulkImportJob.objects.all()[:20]
+        return Response({
+            'success': True,
+            'jobs': [get_progress(job) for job in jobs]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting bulk import progress: {e}", exc_info=True)
+        return Response(
+            {'error': f'Failed to get progress: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 def _calculate_file_hash(file_path: str) -> str:
     """Calculate SHA256 hash of file for deduplication"""
     sha256 = hashlib.sha256()
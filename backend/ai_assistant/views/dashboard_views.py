@@ -33,7 +33,10 @@ def dashboard_stats(request):
 
         # Chunks
         total_chunks = DocumentChunk.objects.count()
-        chunks_with_embeddings = DocumentChunk.objects.exclude(embedding__isnull=True).count()
+        # Shared-vector duplicates are searchable through their canonical chunk
+        chunks_with_embeddings = DocumentChunk.objects.exclude(
+            embedding__isnull=True, canonical_chunk__isnull=True
+        ).count()
         pending_chunks = max(0, total_chunks - chunks_with_embeddings)
 
         # RAG Queries
@@ -15,6 +15,10 @@ from rest_framework import status
 
 from ..models import PDFDocument, WebLink, KnowledgeShare, QueryHistory, UploadedFile, DocumentFile, DocumentChunk
 from ..serializers import PDFDocumentSerializer, WebLinkSerializer, KnowledgeShareSerializer, QueryHistorySerializer
+from ..cache_codec import cache_codec
+from ..single_flight import single_flight
+from ..semantic_cache import semantic_cache
+from ..context_packer import context_packer
 from django.core.cache import cache
 from django.utils import timezone
 from django.db.models import Count, Q
@@ -258,6 +262,14 @@ def get_performance_stats(request):
         
         stats = {
             'cache': cache_stats,
+            # Search result cache size/latency per key family (this worker process)
+            'cache_families': cache_codec.get_metrics(),
+            # Coalesced / stale-served RAG queries per key family (this worker process)
+            'single_flight': single_flight.get_metrics(),
+            # Answers reused for semantically equivalent queries per RAG tier (this worker process)
+            'semantic_cache': semantic_cache.get_metrics(),
+            # RAG context token budget vs tokens packed per tier (this worker process)
+            'context_packing': context_packer.get_metrics(),
             'database': db_stats,
             'recent_queries_24h': recent_queries,
             'timestamp': timezone.now()
@@ -15,7 +15,8 @@ from django.core.cache import cache
 from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
 from django.db.models import Q
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
@@ -34,6 +35,7 @@ from ..rag_service import EnhancedRAGService
 from ..improved_rag_service import enhanced_rag_service
 from ..advanced_rag_service import advanced_rag_service
 from ..comprehensive_rag_service import comprehensive_rag_service
+from ..llm_streaming import EventStreamRenderer, event_stream_response
 from ..serializers import (
     PDFDocumentSerializer, WebLinkSerializer, 
     KnowledgeShareSerializer, QueryHistorySerializer, DocumentSerializer
@@ -112,6 +114,58 @@ def rag_search(request):
         return BaseViewMixin.handle_error(e, 'rag_search')
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chat_with_ollama_stream(request):
+    """Chat endpoint streaming the answer as Server-Sent Events ('token'..., 'done')"""
+    try:
+        BaseViewMixin.log_request(request, 'chat_with_ollama_stream')
+        
+        prompt = request.data.get('prompt', '').strip()
+        if not prompt:
+            return bad_request_response('Prompt is required')
+
+        # Get generation parameters
+        generation_params = {
+            'max_tokens': request.data.get('max_tokens'),
+            'temperature': request.data.get('temperature'),
+            'top_p': request.data.get('top_p'),
+            'top_k': request.data.get('top_k'),
+            'repeat_penalty': request.data.get('repeat_penalty'),
+            'num_ctx': request.data.get('num_ctx')
+        }
+        
+        events = rag_service.stream_chat_with_ollama(prompt, request.user, **generation_params)
+        return event_stream_response(events, 'chat_with_ollama_stream')
+        
+    except Exception as e:
+        return BaseViewMixin.handle_error(e, 'chat_with_ollama_stream')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def rag_search_stream(request):
+    """RAG search streaming sources first, then answer tokens, then the result as Server-Sent Events"""
+    try:
+        BaseViewMixin.log_request(request, 'rag_search_stream')
+        
+        query = request.data.get('query', '').strip()
+        if not query:
+            return bad_request_response('Query is required')
+        
+        # Get search parameters
+        top_k = int(request.data.get('top_k', 0)) or None
+        search_mode = request.data.get('search_mode', 'comprehensive')
+        
+        events = rag_service.stream_rag_search(query, request.user, search_mode, top_k)
+        return event_stream_response(events, 'rag_search_stream')
+        
+    except Exception as e:
+        return BaseViewMixin.handle_error(e, 'rag_search_stream')
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def advanced_rag_search(request):
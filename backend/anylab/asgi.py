@@ -3,6 +3,11 @@ ASGI config for anylab project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server to get non-blocking async RAG endpoints
+(ai_assistant/async_rag.py), e.g.:
+
+    gunicorn anylab.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -65,6 +65,14 @@ app.conf.update(
             'task': 'ai_assistant.tasks.scrape_ssb_weekly',
             'schedule': crontab(hour=2, minute=0, day_of_week=0),  # Every Sunday at 2 AM
         },
+        'prune-semantic-cache': {
+            'task': 'ai_assistant.tasks.prune_semantic_cache',
+            'schedule': 3600.0,  # Every hour
+        },
+        'resume-stalled-bulk-imports': {
+            'task': 'ai_assistant.tasks.resume_stalled_bulk_imports',
+            'schedule': 600.0,  # Every 10 minutes
+        },
     },
 )
 
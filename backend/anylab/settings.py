@@ -226,6 +226,10 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_WORKER_CONCURRENCY = 4
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
+BULK_IMPORT_CONCURRENCY = int(os.getenv('BULK_IMPORT_CONCURRENCY', '3'))  # Files of one bulk import processed at once (leaves a worker for uploads)
+BULK_IMPORT_STALL_TIMEOUT = int(os.getenv('BULK_IMPORT_STALL_TIMEOUT', '7200'))  # Seconds without progress before a job's queued files are dispatched again
+FOLDER_SYNC_MAX_DELETE_FRACTION = float(os.getenv('FOLDER_SYNC_MAX_DELETE_FRACTION', '0.5'))  # Folder syncs deleting more of the known files are refused
+FOLDER_SYNC_MASS_DELETE_MIN = int(os.getenv('FOLDER_SYNC_MASS_DELETE_MIN', '10'))  # ... once they delete at least this many files
 
 # Redis Configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
@@ -254,12 +258,51 @@ OLLAMA_NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', '1024'))  # Reduced from 2048 t
 OLLAMA_DEFAULT_MAX_TOKENS = int(os.getenv('OLLAMA_DEFAULT_MAX_TOKENS', '256'))  # Reduced from 512 to 256 tokens for faster response
 OLLAMA_TEMPERATURE = float(os.getenv('OLLAMA_TEMPERATURE', '0.3'))  # Lower temperature for more focused responses
 OLLAMA_SYSTEM_PROMPT = os.getenv('OLLAMA_SYSTEM_PROMPT', 'You are a helpful, expert assistant. Provide concise and accurate answers. Keep responses focused and to the point.')
+OLLAMA_ASYNC_MAX_CONNECTIONS = int(os.getenv('OLLAMA_ASYNC_MAX_CONNECTIONS', '256'))  # In-flight requests per process from async views
+OLLAMA_ASYNC_MAX_KEEPALIVE = int(os.getenv('OLLAMA_ASYNC_MAX_KEEPALIVE', '32'))  # Idle keep-alive connections kept to Ollama
+ASYNC_RETRIEVAL_THREADS = int(os.getenv('ASYNC_RETRIEVAL_THREADS', '8'))  # Concurrent retrievals (and DB connections) per process for async views
+# Token-budgeted RAG context packing
+OLLAMA_TOKENIZER = os.getenv('OLLAMA_TOKENIZER', 'Qwen/Qwen2.5-7B-Instruct')  # Hugging Face tokenizer (or tokenizer.json path) of OLLAMA_MODEL
+OLLAMA_TOKENIZER_RETRY_AFTER = int(os.getenv('OLLAMA_TOKENIZER_RETRY_AFTER', '600'))  # Seconds before retrying a failed load
+CONTEXT_PACKER_DUPLICATE_THRESHOLD = float(os.getenv('CONTEXT_PACKER_DUPLICATE_THRESHOLD', '0.8'))  # Skip chunks this much already packed
+CONTEXT_PACKER_MIN_CHUNK_TOKENS = int(os.getenv('CONTEXT_PACKER_MIN_CHUNK_TOKENS', '64'))  # Smallest truncated chunk worth packing
 
 # Cache TTL settings for AI responses
-EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL', '3600'))  # 1 hour
+EMBEDDING_CACHE_TTL = int(os.getenv('EMBEDDING_CACHE_TTL', '3600'))  # Legacy; vectors now live in the embedding store
 RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '1800'))  # 30 minutes
 SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '3600'))  # 1 hour
 
+# Single-flight coalescing of identical in-flight RAG queries (single_flight.py)
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', '360'))  # Longer than the slowest (comprehensive) generation
+SINGLE_FLIGHT_WAIT_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', '360'))  # Waiters compute themselves after this
+SINGLE_FLIGHT_STALE_TTL = int(os.getenv('SINGLE_FLIGHT_STALE_TTL', '3600'))  # Serve expired results this long while revalidating
+
+# Semantic answer cache (reuse answers to equivalent queries)
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))  # Min cosine similarity of the query embeddings
+SEMANTIC_CACHE_MIN_CHUNK_OVERLAP = float(os.getenv('SEMANTIC_CACHE_MIN_CHUNK_OVERLAP', '0.5'))  # Min Jaccard overlap of retrieved chunks
+SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', '86400'))  # Cached answers expire after a day
+SEMANTIC_CACHE_VERSION_TTL = int(os.getenv('SEMANTIC_CACHE_VERSION_TTL', '60'))  # How often the corpus fingerprint is re-read
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '20000'))  # Pruned hourly beyond this
+
+# Vector index (pgvector HNSW) search settings
+# ef_search trades recall for latency; it is never set below the query LIMIT
+VECTOR_INDEX_EF_SEARCH = int(os.getenv('VECTOR_INDEX_EF_SEARCH', '100'))
+VECTOR_INDEX_PROBES = int(os.getenv('VECTOR_INDEX_PROBES', '10'))  # Only used if an IVFFlat index is built
+
+# Hybrid search lexical channel (PostgreSQL full-text search on DocumentChunk.search_vector)
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv('HYBRID_LEXICAL_CANDIDATES', '20'))  # 0 disables the channel
+
+# Cross-encoder reranker (sentence-transformers)
+CROSS_ENCODER_MODEL = os.getenv('CROSS_ENCODER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-2-v2')
+CROSS_ENCODER_MODEL_VERSION = os.getenv('CROSS_ENCODER_MODEL_VERSION', '1')  # Bump to invalidate cached pair scores
+CROSS_ENCODER_PRELOAD = os.getenv('CROSS_ENCODER_PRELOAD', 'false').lower() == 'true'  # Load at worker startup
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv('CROSS_ENCODER_BATCH_SIZE', '16'))
+CROSS_ENCODER_TIME_BUDGET_MS = int(os.getenv('CROSS_ENCODER_TIME_BUDGET_MS', '1500'))  # Per request
+CROSS_ENCODER_CACHE_TTL = int(os.getenv('CROSS_ENCODER_CACHE_TTL', '86400'))  # Pair scores, 24 hours
+CROSS_ENCODER_RETRY_AFTER = int(os.getenv('CROSS_ENCODER_RETRY_AFTER', '600'))  # Seconds before retrying a failed load
+
 # File Processing Settings
 # Set to True to use Celery for async processing (recommended for production)
 # Set to False to use synchronous processing (faster for development)
@@ -279,6 +322,43 @@ EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '384'))
 EMBEDDING_PERFORMANCE_MODEL = os.getenv('EMBEDDING_PERFORMANCE_MODEL', 'BAAI/bge-m3')
 EMBEDDING_LIGHTWEIGHT_MODEL = os.getenv('EMBEDDING_LIGHTWEIGHT_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 
+# Local embedding server (manage.py run_embedding_server) shared by web and Celery workers
+# Set EMBEDDING_SERVER_URL to '' to always call Ollama directly
+EMBEDDING_SERVER_URL = os.getenv('EMBEDDING_SERVER_URL', 'http://127.0.0.1:8765')
+EMBEDDING_SERVER_HOST = os.getenv('EMBEDDING_SERVER_HOST', '127.0.0.1')
+EMBEDDING_SERVER_PORT = int(os.getenv('EMBEDDING_SERVER_PORT', '8765'))
+EMBEDDING_SERVER_BACKEND = os.getenv('EMBEDDING_SERVER_BACKEND', 'ollama')  # 'ollama' or 'sentence-transformers'
+EMBEDDING_SERVER_MODEL = os.getenv('EMBEDDING_SERVER_MODEL', 'bge-m3')
+EMBEDDING_SERVER_MAX_BATCH_SIZE = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH_SIZE', '64'))
+EMBEDDING_SERVER_MAX_WAIT_MS = int(os.getenv('EMBEDDING_SERVER_MAX_WAIT_MS', '10'))
+EMBEDDING_SERVER_RETRY_AFTER = int(os.getenv('EMBEDDING_SERVER_RETRY_AFTER', '30'))  # Seconds to bypass an unreachable server
+EMBEDDING_CLIENT_TIMEOUT = int(os.getenv('EMBEDDING_CLIENT_TIMEOUT', '120'))
+
+# Ingestion embedding batches adapt to observed latency within these bounds
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '50'))  # Initial size
+EMBEDDING_BATCH_MIN_SIZE = int(os.getenv('EMBEDDING_BATCH_MIN_SIZE', '8'))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '256'))
+EMBEDDING_BATCH_TARGET_SECONDS = float(os.getenv('EMBEDDING_BATCH_TARGET_SECONDS', '4'))
+EMBEDDING_BATCH_MAX_CHARS = int(os.getenv('EMBEDDING_BATCH_MAX_CHARS', '150000'))  # Text per request
+INGEST_PIPELINE_BUFFER_CHUNKS = int(os.getenv('INGEST_PIPELINE_BUFFER_CHUNKS', '256'))  # Chunks extracted ahead of embedding
+INGEST_PIPELINE_PENDING_BATCHES = int(os.getenv('INGEST_PIPELINE_PENDING_BATCHES', '2'))  # Embedded batches waiting to be written
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', '0'))  # Page-range extraction processes, 0 = CPU count
+PDF_EXTRACT_MAX_WORKERS = int(os.getenv('PDF_EXTRACT_MAX_WORKERS', '4'))  # Cap per process; every Celery child / web worker has its own pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '64'))  # Smaller PDFs are extracted in-process
+CHUNK_DEDUP_ENABLED = os.getenv('CHUNK_DEDUP_ENABLED', 'True').lower() == 'true'  # Reuse stored vectors for identical chunk text
+CHUNK_DEDUP_SHARED_VECTORS = os.getenv('CHUNK_DEDUP_SHARED_VECTORS', 'False').lower() == 'true'  # Duplicates reference one stored vector
+
+# Durable embedding store (PostgreSQL + in-process LRU), keyed by model, version and text hash
+EMBEDDING_STORE_ENABLED = os.getenv('EMBEDDING_STORE_ENABLED', 'True').lower() == 'true'
+EMBEDDING_MODEL_VERSION = os.getenv('EMBEDDING_MODEL_VERSION', '1')  # Bump when the embedding model changes
+EMBEDDING_STORE_LRU_SIZE = int(os.getenv('EMBEDDING_STORE_LRU_SIZE', '4096'))  # Vectors kept in process (~4 KB each)
+CACHE_VECTOR_DTYPE = os.getenv('CACHE_VECTOR_DTYPE', 'float32')  # float32 or float16 for vectors kept in the cache
+CACHE_SIZE_SAMPLE_EVERY = int(os.getenv('CACHE_SIZE_SAMPLE_EVERY', '20'))  # Measure cached entry size on every Nth write (0 = never)
+
+# Bulk embedding backfill (manage.py add_embeddings)
+EMBEDDING_BACKFILL_BATCH_SIZE = int(os.getenv('EMBEDDING_BACKFILL_BATCH_SIZE', '256'))  # Chunks per embed request and bulk UPDATE
+EMBEDDING_BACKFILL_WORKERS = int(os.getenv('EMBEDDING_BACKFILL_WORKERS', '4'))  # Batches embedded and written concurrently
+
 # Logging Configuration
 LOGGING = {
     'version': 1,